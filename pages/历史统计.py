@@ -0,0 +1,69 @@
+# pages/历史统计.py
+# 学习历史页面：按天统计学习时长、暂停占比和提示音间隔分布 (数据来自 学习历史.py 的 Parquet 历史记录)。
+import datetime
+import time
+
+import streamlit as st
+
+from 学习历史 import daily_summary, history_signature, load_history, prompt_intervals
+
+st.title("学习历史")
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _load_range(start_time, end_time, signature):
+    # signature 只作为缓存键：历史有新文件时重新读取
+    sessions, prompts = load_history(start_time, end_time)
+    return sessions, daily_summary(sessions), prompt_intervals(prompts)
+
+
+today = datetime.date.today()
+date_range = st.date_input("日期范围", value=(today - datetime.timedelta(days=29), today), max_value=today)
+if not isinstance(date_range, (tuple, list)) or len(date_range) != 2:
+    st.info("请选择开始和结束日期。")
+    st.stop()
+start_date, end_date = date_range
+start_time = time.mktime(start_date.timetuple()) # 本地时间当天 0 点
+end_time = time.mktime((end_date + datetime.timedelta(days=1)).timetuple())
+
+try:
+    sessions, daily, intervals = _load_range(start_time, end_time, history_signature())
+except ImportError:
+    st.error("查看学习历史需要安装 pyarrow 和 pandas: pip install pyarrow pandas")
+    st.stop()
+
+if sessions.empty:
+    st.info("这个日期范围内没有已结束的会话。")
+    st.stop()
+
+study_minutes = sessions['elapsed_time'].sum() / 60
+paused_minutes = sessions['paused_duration'].sum() / 60
+col1, col2, col3 = st.columns(3)
+col1.metric("会话数", len(sessions))
+col2.metric("学习时长", f"{study_minutes / 60:.1f} 小时")
+col3.metric("暂停占比", f"{paused_minutes / (study_minutes + paused_minutes):.1%}" if study_minutes + paused_minutes else "0%")
+
+st.subheader("每天学习时长 (分钟)")
+st.bar_chart(daily[['study_minutes', 'paused_minutes']])
+
+st.subheader("每天暂停占比")
+st.line_chart(daily['pause_ratio'])
+
+st.subheader("提示音间隔分布 (分钟)")
+interval_minutes = intervals['interval_minutes'].dropna()
+if interval_minutes.empty:
+    st.caption("没有足够的提示音记录。")
+else:
+    counts = interval_minutes.round(1).value_counts().sort_index()
+    st.bar_chart(counts.rename('次数'))
+    drift = intervals['drift_seconds'].dropna()
+    if not drift.empty:
+        st.caption(f"实际响起时间相对计划: 平均 {drift.mean():+.3f} 秒，最大 {drift.abs().max():.3f} 秒")
+
+with st.expander("会话明细"):
+    details = sessions.sort_values('start_time', ascending=False).assign(
+        开始=lambda df: df['start_time'].map(lambda ts: datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M')),
+        学习分钟=lambda df: (df['elapsed_time'] / 60).round(1),
+        暂停分钟=lambda df: (df['paused_duration'] / 60).round(1),
+    )
+    st.dataframe(details[['开始', 'result', '学习分钟', '暂停分钟', 'play_count', 'runner']], hide_index=True)
@@ -1,15 +1,26 @@
 # web.py (修改后 - v8: 解决 SyntaxError: 'return' outside function)
 import streamlit as st
 import time
-import datetime
-import threading
 import os
 import math
-# 注意：pygame.mixer 的初始化和使用主要在线程中进行，但 Streamlit 主线程需要知道音频路径是否存在
-# 所以我们主要在主线程（UI）中进行路径检查和转换，然后将转换后的绝对路径传递给线程
-import pygame # 保留导入，虽然主要在线程使用，但为了代码完整性和潜在的初始化检查
-
-from 学习函数 import run_audio_timer  # 导入后端函数
+import sqlite3
+# 注意：pygame.mixer 的初始化和使用都在计时调度器中进行，页面只做路径检查和转换，
+# 然后将转换后的绝对路径传递给调度器。页面不导入 pygame，冷启动时不加载 SDL
+
+from 学习函数 import get_live_status_values  # 导入后端函数
+# 计时调度器：默认是进程级共享的 TimerScheduler (所有会话共用一个调度线程)；
+# 设置环境变量 STUDY_TIMER_BACKEND 时连接独立的计时后台服务 (见 计时服务.py)，本进程只保存状态副本
+from 计时服务 import get_timer_backend, refresh_timer_backend
+from 日志存储 import LogStore, LogView # 固定容量的环形日志存储和增量渲染视图
+from 时间记录 import TimeRecords # array('d') 存储的时间记录，带格式化缓存和间隔统计
+from 会话持久化 import get_journal # SQLite (WAL) 会话日志，进程重启后恢复进行中的会话
+from 时钟 import get_clock # 默认时钟：time() 是 Unix 时间戳，monotonic() 用于计时
+from 运行指标 import RERUN_DURATION, start_metrics_server # Prometheus 指标 (设置 STUDY_TIMER_METRICS_PORT 时导出)
+from 状态快照 import TimerStatus, read_status # 带版本号的实时状态，UI 读取一致的快照
+from 文件监视 import file_exists, get_file_metadata, resolve_path # 路径解析和文件存在性缓存 (文件变化时由目录监视失效)
+
+_rerun_started = time.perf_counter() # 本次脚本运行的开始时间，结尾记录到 rerun 耗时直方图
+start_metrics_server() # 每个进程只启动一次；没有设置 STUDY_TIMER_METRICS_PORT 时不启动
 
 # --- 获取当前脚本所在的目录 ---
 # 这段代码必须在文件的顶部，确保 __file__ 指向当前的 web.py 文件
@@ -25,16 +36,9 @@ def get_absolute_path_relative_to_script(path):
     将一个路径转换为基于当前脚本所在目录的绝对路径。
     如果输入的 path 本身就是绝对路径，则直接返回。
     如果输入的 path 是 None 或空字符串，返回 None。
+    首尾空白会被移除；结果在 文件监视.resolve_path 中按路径缓存，每次 rerun 不再重新拼接。
     """
-    # 使用 strip() 移除首尾空白，防止用户不小心输入空格
-    cleaned_path = path.strip() if isinstance(path, str) else None
-    if not cleaned_path: # 处理 None、空字符串或只有空白的情况
-        return None
-    if os.path.isabs(cleaned_path): # 如果输入已经是绝对路径，直接返回
-        return cleaned_path
-    # 如果是相对路径，与脚本目录拼接，生成绝对路径
-    # os.path.normpath 会清理路径中的冗余分隔符等
-    return os.path.normpath(os.path.join(SCRIPT_DIR, cleaned_path))
+    return resolve_path(path, SCRIPT_DIR)
 
 # --- Streamlit 应用标题和说明 (主区域) ---
 st.title("高效学习法")
@@ -48,33 +52,18 @@ if 'is_running' not in st.session_state:
 if 'is_paused' not in st.session_state:
     st.session_state.is_paused = False
 if 'log_messages' not in st.session_state:
-    st.session_state.log_messages = [] # 存储日志
+    st.session_state.log_messages = LogStore() # 存储日志 (固定容量的环形缓冲区)
 if 'time_records' not in st.session_state:
-    st.session_state.time_records = [] # 存储提示音时间
-if 'timer_thread' not in st.session_state:
-    st.session_state.timer_thread = None # 线程对象
-if 'stop_event' not in st.session_state:
-     st.session_state.stop_event = threading.Event() # 停止事件对象
-if 'pause_event' not in st.session_state:
-     st.session_state.pause_event = threading.Event() # 暂停事件对象
+    st.session_state.time_records = TimeRecords() # 存储提示音时间
+if 'timer_session_id' not in st.session_state:
+    st.session_state.timer_session_id = None # 在共享调度器中注册的会话 ID
 if 'last_status' not in st.session_state: # 存储上次任务结束时的最终状态文字，用于下次启动前的显示
     st.session_state.last_status = None
 
-# status_data: 实时状态字典，由线程更新，UI读取显示
-# 确保 status_data 及其所有键始终存在，即使是 None 或 0
-if 'status_data' not in st.session_state or not isinstance(st.session_state.status_data, dict):
-    st.session_state.status_data = {
-        'elapsed_time': 0.0, # 实际运行时间 (秒)
-        'remaining_time': 0.0, # 常规计时阶段剩余时间 (秒)
-        'play_count': 0, # 常规提示音播放次数
-        'current_status': '空闲', # 初始状态描述
-        # 线程内部状态：'idle', 'starting', 'running', 'paused', 'stopping', 'finishing_regular', 'finishing', 'finished'
-        'thread_status': 'idle',
-        'start_time': None, # 任务开始的系统时间戳
-        'paused_duration': 0.0, # 累计暂停时长 (秒)
-        'pause_start_time': None, # 当前暂停开始的系统时间戳 (线程内部使用)
-        'current_pause_duration_display': 0.0 # 当前这次暂停已持续的时长 (秒，线程实时更新)
-    }
+# status_data: 实时状态 (TimerStatus，字段和默认值见 状态快照.py)，由调度器更新，UI 读取一致的快照显示
+# 字段固定，所有键始终存在；调度器成组写入，UI 不会看到只更新了一半的状态
+if 'status_data' not in st.session_state or not isinstance(st.session_state.status_data, TimerStatus):
+    st.session_state.status_data = TimerStatus()
 # 确保默认的路径配置也保存在 session state 中，方便下次加载
 # 默认值可以是相对路径
 if 'regular_sound_path' not in st.session_state:
@@ -93,6 +82,61 @@ if 'volume_control' not in st.session_state:
      st.session_state.volume_control = 0.1
 
 
+# --- 会话日志：进程重启后恢复进行中的会话 ---
+# 会话的 key 保存在页面地址的查询参数中 (?session=...)，Streamlit 重启后浏览器重新连接时地址不变，
+# 新的 session_state 是空的，据此从会话日志中重放事件并在调度器中重新注册会话。
+def get_session_journal():
+    """返回共享的会话日志；数据库不可用 (例如只读文件系统) 时返回 None，计时照常进行但不持久化。"""
+    try:
+        return get_journal()
+    except sqlite3.Error:
+        return None
+
+
+if 'resume_checked' not in st.session_state:
+    st.session_state.resume_checked = True # 每个浏览器会话只尝试恢复一次
+    session_key = st.query_params.get('session')
+    attached = get_timer_backend().find_by_journal_key(session_key) if session_key else None
+    journal = get_session_journal() if session_key and attached is None else None
+    saved_state = journal.load(session_key) if journal is not None else None
+    if attached is not None:
+        # 只是刷新了页面，会话仍在本进程的调度器中运行，直接接管它的日志和状态
+        (st.session_state.timer_session_id, st.session_state.log_messages,
+         st.session_state.time_records, st.session_state.status_data) = attached
+        st.session_state.is_running = True
+        st.session_state.is_paused = st.session_state.status_data.get('thread_status') == 'paused'
+    elif saved_state is not None and not saved_state.finished:
+        params = saved_state.params
+        st.session_state.regular_sound_path = params['regular_sound_path']
+        st.session_state.final_sound_path = params['final_sound_path']
+        st.session_state.min_interval_minutes = params['min_interval_minutes']
+        st.session_state.max_interval_minutes = params['max_interval_minutes']
+        st.session_state.total_duration_minutes = params['total_duration_minutes']
+        st.session_state.final_duration_seconds = params['final_duration_seconds']
+        st.session_state.volume_control = params['volume_control']
+        for played_time, scheduled_time in zip(saved_state.prompt_times, saved_state.scheduled_times):
+            st.session_state.time_records.append(played_time, scheduled=scheduled_time)
+        st.session_state.status_data = TimerStatus(saved_state.to_status_data())
+        st.session_state.is_running = True
+        st.session_state.is_paused = saved_state.pause_start_time is not None
+        st.session_state.timer_session_id = get_timer_backend().register(
+            params['min_interval_minutes'],
+            params['max_interval_minutes'],
+            params['regular_sound_path'],
+            params['total_duration_minutes'],
+            params['final_sound_path'],
+            params['final_duration_seconds'],
+            params['volume_control'],
+            st.session_state.log_messages,
+            st.session_state.time_records,
+            st.session_state.status_data,
+            seed=params.get('seed'),
+            journal=journal.recorder(session_key)
+        )
+    elif session_key:
+        del st.query_params['session'] # 会话已经结束、不存在或会话日志不可用
+
+
 # --- 时间格式化辅助函数 ---
 def format_seconds_to_minutes_seconds(seconds):
     """将秒数转换为 'MM分钟 SS秒' 的格式"""
@@ -103,6 +147,28 @@ def format_seconds_to_minutes_seconds(seconds):
     # 确保显示整数
     return f"{int(minutes)}分钟 {int(remaining_seconds)}秒"
 
+
+# --- 间隔规划：按当前配置模拟大量会话，侧边栏显示预计的提示音次数和间隔 (见 间隔规划.py) ---
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_interval_plan_lines(min_interval_minutes, max_interval_minutes, total_duration_minutes, prompt_length_seconds):
+    """模拟结果的说明文字 (固定随机种子，同一配置每次显示相同的结果)；配置无效时返回空列表。"""
+    from 间隔规划 import format_plan, plan_intervals
+
+    try:
+        plan = plan_intervals(min_interval_minutes, max_interval_minutes, total_duration_minutes,
+                              prompt_length_seconds=prompt_length_seconds, seed=0)
+    except ValueError:
+        return []
+    return format_plan(plan)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def get_prompt_length_seconds(path, mtime_ns):
+    """常规提示音的时长 (只读 WAV 文件头)；mtime_ns 只作为缓存键，文件被替换后重新读取。"""
+    from 间隔规划 import wav_length_seconds
+
+    return wav_length_seconds(path)
+
 # --- 配置区域 (侧边栏) ---
 with st.sidebar:
     st.header("配置")
@@ -119,9 +185,9 @@ with st.sidebar:
 
     # 检查转换后的路径是否存在，如果不存在给予警告
     # 注意：这里只检查转换后的路径，因为这是程序实际使用的路径
-    # 同时检查 resolved_path 是否是 None 或空字符串
-    regular_file_valid_and_exists = (resolved_regular_path_input is not None) and os.path.exists(resolved_regular_path_input)
-    final_file_valid_and_exists = (resolved_final_path_input is not None) and os.path.exists(resolved_final_path_input)
+    # 同时检查 resolved_path 是否是 None 或空字符串 (file_exists 对 None 返回 False)
+    regular_file_valid_and_exists = file_exists(resolved_regular_path_input)
+    final_file_valid_and_exists = file_exists(resolved_final_path_input)
     # 文件都有效且存在才认为配置有效
     files_exist_config = regular_file_valid_and_exists and final_file_valid_and_exists
 
@@ -154,6 +220,15 @@ with st.sidebar:
     st.session_state.final_duration_seconds = final_duration_seconds_input
     st.session_state.volume_control = volume_control_input
 
+    # 预计提示音次数和间隔 (配置不变时直接使用缓存的结果)
+    regular_metadata = get_file_metadata().stat(resolved_regular_path_input) if regular_file_valid_and_exists else None
+    plan_lines = get_interval_plan_lines(
+        min_interval_minutes_input, max_interval_minutes_input, total_duration_minutes_input,
+        get_prompt_length_seconds(regular_metadata.real_path, regular_metadata.mtime_ns) if regular_metadata else 0.0
+    )
+    if plan_lines:
+        st.caption("预计 (按当前配置模拟):\n\n" + "\n\n".join(f"- {line}" for line in plan_lines))
+
     st.markdown("---") # 分隔线
     st.markdown("[学习法视频](https://www.bilibili.com/video/BV1naLozQEBq/?spm_id_from=333.1007.tianma.6-4-22.click&vd_source=18f6d720bb29eddd4e2fb962fd7d9535)")
 
@@ -168,12 +243,16 @@ resolved_regular_path_session = get_absolute_path_relative_to_script(regular_pat
 resolved_final_path_session = get_absolute_path_relative_to_script(final_path_session)
 
 # 检查转换后的路径是否存在且有效
-files_exist_session = (resolved_regular_path_session is not None) and os.path.exists(resolved_regular_path_session) and \
-                      (resolved_final_path_session is not None) and os.path.exists(resolved_final_path_session)
+# file_exists 的结果被缓存，文件没有变化时这里没有文件系统调用
+files_exist_session = file_exists(resolved_regular_path_session) and file_exists(resolved_final_path_session)
 
 
 # 只有在非运行状态下才显示文件不存在错误，避免运行时覆盖线程状态
 # 使用 thread_status 来更准确判断是否是“运行中”或“已结束但未清理”的状态
+if st.session_state.timer_session_id is not None:
+    # 页面心跳：超过宽限时间没有心跳的会话 (标签页已关闭) 会被休眠，见 会话回收.py
+    get_timer_backend().touch(st.session_state.timer_session_id)
+refresh_timer_backend() # 使用计时后台服务时拉取最新状态 (同一进程的所有会话共用一次请求)
 thread_current_status_check = st.session_state.status_data.get('thread_status', 'idle')
 if thread_current_status_check in ['idle', 'finished']: # 只在空闲或已完成状态显示文件错误
     # 只有当用户输入了路径但文件不存在或路径无效时才显示错误
@@ -200,25 +279,17 @@ with col1:
         # 启动新任务前的状态清理和设置
         st.session_state.is_running = True # UI 层面标记运行中
         st.session_state.is_paused = False # UI 层面标记非暂停
-        st.session_state.log_messages = [] # 清空之前的日志
-        st.session_state.time_records = [] # 清空之前的记录
-        # 创建新的事件对象，确保是未设置状态
-        st.session_state.stop_event = threading.Event()
-        st.session_state.pause_event = threading.Event()
+        st.session_state.log_messages = LogStore() # 清空之前的日志
+        st.session_state.time_records = TimeRecords() # 清空之前的记录
         st.session_state.last_status = None # 清空上次任务的结束状态显示
 
         # --- 初始化本次运行的实时状态数据 ---
-        st.session_state.status_data = {
-            'elapsed_time': 0.0, # 实际运行时间从0开始
-            'remaining_time': st.session_state.total_duration_minutes * 60.0, # 初始剩余时间为总时长
-            'play_count': 0,
-            'current_status': '正在启动...', # 告知用户 UI 正在启动
-            'thread_status': 'starting', # 告知线程是新启动
-            'start_time': time.time(), # 记录任务开始的系统时间戳
-            'paused_duration': 0.0, # 累计暂停时长从0开始
-            'pause_start_time': None, # 没有当前暂停
-            'current_pause_duration_display': 0.0 # 实时暂停时长显示为0
-        }
+        st.session_state.status_data = TimerStatus(
+            remaining_time=st.session_state.total_duration_minutes * 60.0, # 初始剩余时间为总时长
+            current_status='正在启动...', # 告知用户 UI 正在启动
+            thread_status='starting', # 告知线程是新启动
+            start_time=get_clock().time(), # 记录任务开始的时间戳 (Unix 时间，会写入会话日志)
+        ) # 其余字段 (运行时间、次数、暂停时长) 从默认值 0 开始
 
         # --- 在传递路径给线程前，将其转换为基于脚本目录的绝对路径 ---
         regular_sound_path_for_thread = get_absolute_path_relative_to_script(st.session_state.regular_sound_path)
@@ -228,51 +299,55 @@ with col1:
         # 如果文件无效或不存在，显示错误并设置状态，然后退出当前按钮逻辑，但不使用 return
         file_error_message = None # 存储文件错误信息
 
-        if not regular_sound_path_for_thread or not os.path.exists(regular_sound_path_for_thread):
+        if not file_exists(regular_sound_path_for_thread):
              file_error_message = f"启动错误：常规提示音文件 '{st.session_state.regular_sound_path}' 无效或不存在 (实际检查: '{regular_sound_path_for_thread if regular_sound_path_for_thread else '路径无效或为空'}')。"
              st.error(file_error_message + " 请检查侧边栏的路径设置。")
              st.session_state.log_messages.append(file_error_message)
-             st.session_state.status_data['current_status'] = '启动失败: 文件未找到或路径无效'
-             st.session_state.status_data['thread_status'] = 'idle' # 启动失败，回到空闲
+             with st.session_state.status_data.writing():
+                 st.session_state.status_data['current_status'] = '启动失败: 文件未找到或路径无效'
+                 st.session_state.status_data['thread_status'] = 'idle' # 启动失败，回到空闲
              st.session_state.is_running = False
              # 不在这里调用 st.rerun() 或 return
 
-        elif not final_sound_path_for_thread or not os.path.exists(final_sound_path_for_thread):
+        elif not file_exists(final_sound_path_for_thread):
              file_error_message = f"启动错误：结束提示音文件 '{st.session_state.final_sound_path}' 无效或不存在 (实际检查: '{final_sound_path_for_thread if final_sound_path_for_thread else '路径无效或为空'}')。"
              st.error(file_error_message + " 请检查侧边栏的路径设置。")
              st.session_state.log_messages.append(file_error_message)
-             st.session_state.status_data['current_status'] = '启动失败: 文件未找到或路径无效'
-             st.session_state.status_data['thread_status'] = 'idle' # 启动失败，回到空闲
+             with st.session_state.status_data.writing():
+                 st.session_state.status_data['current_status'] = '启动失败: 文件未找到或路径无效'
+                 st.session_state.status_data['thread_status'] = 'idle' # 启动失败，回到空闲
              st.session_state.is_running = False
              # 不在这里调用 st.rerun() 或 return
 
 
-        # --- 如果文件检查通过，则创建并启动线程 ---
+        # --- 如果文件检查通过，则在共享调度器中注册会话 ---
         # 只有当 file_error_message 仍然是 None 时，表示没有文件错误
         if file_error_message is None:
-            st.session_state.log_messages.append("文件路径检查通过，正在启动线程...") # 添加日志
-            st.session_state.status_data['current_status'] = '正在启动线程...' # 更新状态
-
-            # 创建并启动线程，传递转换后的绝对路径
-            st.session_state.timer_thread = threading.Thread(
-                target=run_audio_timer,
-                args=(
-                    st.session_state.min_interval_minutes,
-                    st.session_state.max_interval_minutes,
-                    regular_sound_path_for_thread, # <--- 使用转换后的绝对路径
-                    st.session_state.total_duration_minutes,
-                    final_sound_path_for_thread,   # <--- 使用转换后的绝对路径
-                    st.session_state.final_duration_seconds,
-                    st.session_state.volume_control,
-                    st.session_state.log_messages, # 传递日志列表 (列表是可变对象，线程中修改会反映到主线程)
-                    st.session_state.time_records, # 传递记录列表 (同上)
-                    st.session_state.stop_event, # 传递停止事件
-                    st.session_state.pause_event, # 传递暂停事件
-                    st.session_state.status_data # 传递状态字典 (同上)
-                )
+            st.session_state.log_messages.append("文件路径检查通过，正在启动计时...") # 添加日志
+            st.session_state.status_data['current_status'] = '正在启动计时...' # 更新状态
+
+            # 会话日志记录器：事件写入 SQLite，key 写入页面地址，进程重启后可以恢复
+            journal = get_session_journal()
+            recorder = journal.new_session() if journal is not None else None
+            if recorder is not None:
+                st.query_params['session'] = recorder.session_key
+
+            # 注册会话，传递转换后的绝对路径。不再为每个会话创建线程，由调度线程统一驱动
+            # 启动失败时返回 None，错误信息已写入日志，status_data['thread_status'] 为 'finished'
+            st.session_state.timer_session_id = get_timer_backend().register(
+                st.session_state.min_interval_minutes,
+                st.session_state.max_interval_minutes,
+                regular_sound_path_for_thread, # <--- 使用转换后的绝对路径
+                st.session_state.total_duration_minutes,
+                final_sound_path_for_thread,   # <--- 使用转换后的绝对路径
+                st.session_state.final_duration_seconds,
+                st.session_state.volume_control,
+                st.session_state.log_messages, # 传递日志列表 (列表是可变对象，调度线程中修改会反映到主线程)
+                st.session_state.time_records, # 传递记录列表 (同上)
+                st.session_state.status_data, # 传递状态字典 (同上)
+                journal=recorder
             )
-            st.session_state.timer_thread.start()
-            # 启动后立即重新运行以更新UI显示状态，状态会从 'starting' 变为 'running'
+            # 启动后立即重新运行以更新UI显示状态
             # 这个 rerun 是为了让 UI 立即反映线程状态的改变并进入刷新循环
             st.rerun()
         # else: # 如果有文件错误，就什么也不做，让 Streamlit 自然地结束当前的 rerun，显示错误
@@ -281,22 +356,20 @@ with col1:
 
 # 结束计时按钮
 with col2:
-    # 只有当线程状态不是 'idle' 或 'finished' 时，结束按钮才可用 (表示正在运行、暂停、启动或结束过程中)
-    can_end = thread_current_status not in ['idle', 'finished']
+    # 只有当线程状态不是 'idle'、'finished' 或 'hibernated' 时，结束按钮才可用 (表示正在运行、暂停、启动或结束过程中)
+    # 休眠的会话已经不在调度器中，在下面的休眠处理块中恢复或放弃
+    can_end = thread_current_status not in ['idle', 'finished', 'hibernated']
     if st.button("结束计时", disabled=not can_end):
-        # 告诉线程停止
-        st.session_state.stop_event.set()
-        # 如果当前是暂停状态，也清除暂停标志，确保线程能及时看到停止信号并退出暂停等待
-        if st.session_state.is_paused: # 检查 UI 标志即可
-             st.session_state.pause_event.clear()
-             st.session_state.is_paused = False # UI 标记不再暂停状态
-
+        st.session_state.is_paused = False # UI 标记不再暂停状态
         st.session_state.log_messages.append(f"\n--- 用户请求结束于 {time.strftime('%Y-%m-%d %H:%M:%S')} ---") # 立即添加结束日志
         # 更新 UI 显示状态，告诉用户正在结束
-        # 线程最终会更新 thread_status 和 current_status 到 stopping/stopped/finished
-        st.session_state.status_data['current_status'] = "接收到结束请求，正在终止..."
-        st.session_state.status_data['thread_status'] = 'stopping' # 标记线程状态为 stopping
-        # Streamlit 会在下次 rerun 时检测到线程结束并进行 cleanup
+        with st.session_state.status_data.writing():
+            st.session_state.status_data['current_status'] = "接收到结束请求，正在终止..."
+            st.session_state.status_data['thread_status'] = 'stopping' # 标记线程状态为 stopping
+        # 告诉调度器停止会话，调度器会立即把 thread_status 更新为 finished
+        # 注意必须在上面写入 'stopping' 之后调用，否则 'finished' 会被覆盖
+        get_timer_backend().cancel(st.session_state.timer_session_id)
+        # Streamlit 会在下次 rerun 时检测到会话结束并进行 cleanup
         st.rerun() # 强制刷新 UI 显示结束请求状态
 
 # 暂停计时按钮
@@ -304,11 +377,10 @@ with col3:
     # 只有当线程实际状态是 'running' 时，暂停按钮才可用
     can_pause = thread_current_status == 'running'
     if st.button("暂停计时", disabled=not can_pause):
-        # 告诉线程暂停
-        st.session_state.pause_event.set()
         st.session_state.is_paused = True # UI 标记为暂停状态
         st.session_state.log_messages.append(f"\n--- 用户请求暂停于 {time.strftime('%Y-%m-%d %H:%M:%S')} ---") # 立即添加暂停日志
-        # 线程会在检测到 pause_event 后自己更新 status_data['current_status'] 和 ['thread_status'] 为 paused
+        # 告诉调度器暂停，调度器会更新 status_data['current_status'] 和 ['thread_status'] 为 paused
+        get_timer_backend().pause(st.session_state.timer_session_id)
         # UI 状态描述将由下面的显示逻辑根据 thread_status 来决定
         st.rerun() # 强制刷新 UI 显示暂停状态
 
@@ -317,76 +389,17 @@ with col4:
     # 只有当线程实际状态是 'paused' 时，继续按钮才可用
     can_continue = thread_current_status == 'paused'
     if st.button("继续计时", disabled=not can_continue):
-        # 告诉线程继续
-        st.session_state.pause_event.clear()
         st.session_state.is_paused = False # UI 标记为非暂停状态
         st.session_state.log_messages.append(f"\n--- 用户请求继续于 {time.strftime('%Y-%m-%d %H:%M:%S')} ---") # 立即添加继续日志
-        # 线程会在检测到 pause_event.clear() 后自己更新 status_data['current_status'] 和 ['thread_status'] 为 running
+        # 告诉调度器继续，调度器会更新 status_data['current_status'] 和 ['thread_status'] 为 running
+        get_timer_backend().resume(st.session_state.timer_session_id)
         # UI 状态描述将由下面的显示逻辑根据 thread_status 来决定
         st.rerun() # 强制刷新 UI 显示继续状态
 
 
-# --- 实时状态显示 (主区域) ---
-st.header("实时状态")
-
-# 从 status_data 中读取所有需要显示的信息
-thread_status = st.session_state.status_data.get('thread_status', 'idle')
-current_status_text_from_thread = st.session_state.status_data.get('current_status', 'N/A')
-elapsed_time_sec = st.session_state.status_data.get('elapsed_time', 0.0)
-remaining_time_sec = st.session_state.status_data.get('remaining_time', 0.0)
-play_count = st.session_state.status_data.get('play_count', 0)
-paused_duration_cumulative_sec = st.session_state.status_data.get('paused_duration', 0.0)
-current_pause_duration_realtime_sec = st.session_state.status_data.get('current_pause_duration_display', 0.0)
-
-# --- 根据 thread_status 决定最终显示的状态文本和时间/计数数值 ---
-display_status_text = "未知状态" # 默认值
-display_elapsed_time_sec = elapsed_time_sec
-display_remaining_time_sec = remaining_time_sec
-display_play_count = play_count
-display_paused_duration_sec = paused_duration_cumulative_sec # 默认显示累计暂停时长
-
-if thread_status == 'idle':
-    # 线程处于空闲状态 (刚启动或上次任务已处理完并清理)
-    if st.session_state.last_status:
-        display_status_text = f"上次运行状态: {st.session_state.last_status}"
-    else:
-        display_status_text = "空闲，等待开始..."
-    # 在空闲状态下，时间/计数显示为0或总时长
-    display_elapsed_time_sec = 0.0
-    display_play_count = 0
-    display_paused_duration_sec = 0.0
-    # 剩余时间显示配置的总时长，如果配置存在
-    if 'total_duration_minutes' in st.session_state:
-         display_remaining_time_sec = st.session_state.total_duration_minutes * 60.0
-    else:
-         display_remaining_time_sec = 0.0 # 如果配置也不存在，显示0
-
-elif thread_status == 'paused':
-    # 线程处于暂停状态，显示实时暂停时长
-    display_status_text = f"已暂停 ({format_seconds_to_minutes_seconds(current_pause_duration_realtime_sec)})"
-    # paused_duration_cumulative_sec 已经是累计值
-
-# 对于所有其他状态 ('starting', 'running', 'stopping', 'finishing_regular', 'finishing', 'finished')
-else:
-    # 直接显示线程报告的 current_status 文本
-    display_status_text = current_status_text_from_thread
-    # 线程在这些状态下会更新 elapsed_time, remaining_time, play_count, paused_duration
-
-
-# --- 显示所有状态信息 ---
-st.write(f"**当前状态:** {display_status_text}")
-st.write(f"**实际已运行时间:** {format_seconds_to_minutes_seconds(display_elapsed_time_sec)}")
-st.write(f"**常规计时阶段剩余:** {format_seconds_to_minutes_seconds(display_remaining_time_sec)}")
-st.write(f"**常规提示音已响次数:** {display_play_count}")
-st.write(f"**累计暂停时长:** {format_seconds_to_minutes_seconds(display_paused_duration_sec)}")
-
-
-# --- 自动刷新逻辑和线程结束处理 ---
-# 检查 Streamlit UI 是否认为程序在运行 (通过检查 thread_status 不是 idle 或 finished)
-is_actively_running = thread_current_status not in ['idle', 'finished']
-
-# 检查 Streamlit UI 认为它在运行 (is_running == True)，但线程已经死了 (timer_thread is None or not is_alive())
-# 并且线程内部状态已经标记为 'finished'
+# --- 线程结束处理 ---
+# 检查 Streamlit UI 认为它在运行 (is_running == True)，但会话已经在调度器中结束
+# 并且会话状态已经标记为 'finished'
 # 这个块处理线程任务完成或停止后的 UI 清理和重置
 if st.session_state.is_running and thread_current_status == 'finished':
      # 线程已完成或被停止，且线程自己在 finally 里将 status_data['thread_status'] 设为 'finished'
@@ -394,7 +407,9 @@ if st.session_state.is_running and thread_current_status == 'finished':
      # --- 进行 Streamlit UI 状态的全面重置以回到空闲状态 ---
      st.session_state.is_running = False # UI 不再标记运行中
      st.session_state.is_paused = False # UI 不再标记暂停
-     st.session_state.timer_thread = None # 清理线程对象，确保下次可以重新创建
+     st.session_state.timer_session_id = None # 清理会话 ID，确保下次可以重新注册
+     if 'session' in st.query_params:
+         del st.query_params['session'] # 会话已结束，刷新页面时不再恢复
 
      # 从 status_data 中获取线程写入的最终状态和时间信息
      final_status_message = st.session_state.status_data.get('current_status', '任务结束')
@@ -403,64 +418,245 @@ if st.session_state.is_running and thread_current_status == 'finished':
 
      st.session_state.last_status = final_status_message # 存储最终状态，用于下次启动前的空闲显示
 
-     # 清理事件对象，创建新的，为下次运行做准备
-     st.session_state.stop_event = threading.Event()
-     st.session_state.pause_event = threading.Event()
-
      # Log final messages
-     # 检查最后几条日志，避免重复添加结束标记
-     # 取日志列表的后20条进行检查，避免列表过长
-     if "--- 任务处理结束于" not in "\n".join(st.session_state.log_messages[-20:]):
-         st.session_state.log_messages.append(f"--- 任务处理结束于 {time.strftime('%Y-%m-%d %H:%M:%S')} ---")
+     # 检查最后20条日志，避免重复添加结束标记 (按 code 索引检查，O(1))
+     if not st.session_state.log_messages.seen_recently('task_end', 20):
+         st.session_state.log_messages.append(f"--- 任务处理结束于 {time.strftime('%Y-%m-%d %H:%M:%S')} ---", code='task_end')
          st.session_state.log_messages.append(f"最终状态: {final_status_message}")
          st.session_state.log_messages.append(f"最终实际运行时间: {format_seconds_to_minutes_seconds(final_elapsed_time)}")
          st.session_state.log_messages.append(f"总累计暂停时长: {format_seconds_to_minutes_seconds(final_paused_duration)}")
 
      # 将 status_data 中的关键字段重置为初始的空闲值，确保 UI 在线程结束后能干净地回到初始状态。
      # 注意：status_data 中的这些值在上面已经读取并用于最终日志/显示了，这里只是重置它们以便下次干净启动
-     st.session_state.status_data['thread_status'] = 'idle' # <-- 重设为 idle
-     st.session_state.status_data['current_status'] = '空闲' # 匹配 thread_status
-     st.session_state.status_data['elapsed_time'] = 0.0
-     # st.session_state.status_data['remaining_time'] = 0.0 # 这个在 idle 状态显示总时长，所以不用在这里重设为0
-     st.session_state.status_data['play_count'] = 0
-     st.session_state.status_data['paused_duration'] = 0.0
-     st.session_state.status_data['pause_start_time'] = None
-     st.session_state.status_data['current_pause_duration_display'] = 0.0
+     with st.session_state.status_data.writing(): # 一次发布，局部刷新不会读到重置了一半的状态
+         st.session_state.status_data['thread_status'] = 'idle' # <-- 重设为 idle
+         st.session_state.status_data['current_status'] = '空闲' # 匹配 thread_status
+         st.session_state.status_data['elapsed_time'] = 0.0
+         # st.session_state.status_data['remaining_time'] = 0.0 # 这个在 idle 状态显示总时长，所以不用在这里重设为0
+         st.session_state.status_data['play_count'] = 0
+         st.session_state.status_data['paused_duration'] = 0.0
+         st.session_state.status_data['pause_start_time'] = None
+         st.session_state.status_data['current_pause_duration_display'] = 0.0
+         st.session_state.status_data.pop('timeline', None) # 上次会话的时间线不再需要
 
      # 任务结束且清理完成后，强制刷新 UI 回到空闲状态
      # 这个 rerun 是必须的，它确保 UI 状态在线程结束后立即更新
      st.rerun()
 
 
-elif is_actively_running and st.session_state.timer_thread and st.session_state.timer_thread.is_alive():
-    # 线程仍在运行 (包括暂停，stopping, finishing等)，说明任务还在进行中
-    # 为了实时更新显示，每隔一段时间强制 Streamlit 重新运行整个脚本
-    # 注意：Streamlit 0.84+ 可以使用 st.script_runner.script_requests.RerunData(rerun_data) 或 st.experimental_rerun()
-    # 但 time.sleep() + st.rerun() 是更通用的方式，确保 Streamlit 有足够时间读取线程更新的状态
-    time.sleep(0.5) # 每隔0.5秒刷新一次 UI
-    st.rerun() # 强制 Streamlit 重新运行脚本
+# --- 休眠处理 ---
+# 标签页长时间没有查看时，会话被回收线程休眠：计时保持暂停，声道和缓冲已经释放，会话日志中仍是未结束的会话
+if st.session_state.is_running and thread_current_status == 'hibernated':
+    st.info("这个会话长时间无人查看，已经休眠 (计时保持暂停)。可以从会话日志恢复，或者放弃这个会话。")
+    col_restore, col_discard = st.columns(2)
+    if col_restore.button("恢复会话"):
+        # 重新执行页面开头的恢复流程：按地址中的 ?session=... 重放会话日志，在暂停状态下重新注册
+        st.session_state.time_records = TimeRecords()
+        st.session_state.status_data = TimerStatus()
+        st.session_state.timer_session_id = None
+        del st.session_state['resume_checked']
+        st.rerun()
+    if col_discard.button("放弃会话"):
+        session_key = st.query_params.get('session')
+        journal = get_session_journal() if session_key else None
+        if journal is not None:
+            journal.record(session_key, 'finish', result='stopped') # 计时后台重启时不再恢复它
+        with st.session_state.status_data.writing():
+            st.session_state.status_data['current_status'] = "会话已放弃"
+            st.session_state.status_data['thread_status'] = 'finished'
+        st.rerun() # 由上面的结束处理块清理并回到空闲状态
+
+
+# --- 实时状态显示 (主区域) ---
+# 运行期间只局部刷新这一块 (st.fragment)，不再每 0.5 秒整页 rerun：
+# 侧边栏、文件检查、按钮、日志和记录只在用户操作或会话结束时才重新运行。
+# 面板画在 fragment 外创建的 st.empty() 占位里：状态版本、日志版本和记录条数与上次画的相同时
+# fragment 直接返回，占位保留上次的内容，不重新发送任何元素。
+LIVE_STATUS_REFRESH_SECONDS = 1.0 # 状态面板显示精度为秒，每秒刷新一次即可
+PAUSED_REFRESH_SECONDS = 5.0 # 暂停中只有暂停时长在变化，刷新得慢一些
+
+# 检查 Streamlit UI 是否认为程序在运行 (通过检查 thread_status 不是 idle、finished 或 hibernated)
+is_actively_running = thread_current_status not in ['idle', 'finished', 'hibernated']
+if not is_actively_running:
+    refresh_interval = None
+elif thread_current_status == 'paused':
+    refresh_interval = PAUSED_REFRESH_SECONDS
+else:
+    refresh_interval = LIVE_STATUS_REFRESH_SECONDS
+
+st.header("实时状态")
+status_placeholder = st.empty()
+
+
+def compute_live_status_lines(snapshot):
+    """根据状态快照生成状态面板的各行文字 (markdown)，返回 (行列表, thread_status)。"""
+
+    # 从快照中读取所有需要显示的信息 (同一个版本的一致状态)
+    thread_status = snapshot.thread_status
+    current_status_text_from_thread = snapshot.current_status
+    # 线程在等待期间不再频繁写入时间，实时的运行/剩余/暂停时长根据快照中的时间戳推算
+    elapsed_time_sec, remaining_time_sec, current_pause_duration_realtime_sec = get_live_status_values(snapshot)
+    play_count = snapshot.play_count
+    paused_duration_cumulative_sec = snapshot.paused_duration
+    next_prompt_eta_sec = None # 距离下一次常规提示音的秒数 (由时间线推算)
+
+    # 调度器在启动时编译好整条时间线，运行/暂停中的实时值直接由时间线和时钟推算，不依赖线程写入
+    timeline = snapshot.timeline
+    if timeline is not None and thread_status in ('running', 'paused'):
+        timeline_status = timeline.status_at(
+            snapshot.start_time,
+            paused_duration_cumulative_sec,
+            snapshot.pause_start_time
+        )
+        elapsed_time_sec = timeline_status['elapsed_time']
+        remaining_time_sec = timeline_status['remaining_time']
+        play_count = timeline_status['play_count']
+        next_prompt_eta_sec = timeline_status['next_prompt_eta']
+
+    # --- 根据 thread_status 决定最终显示的状态文本和时间/计数数值 ---
+    display_status_text = "未知状态" # 默认值
+    display_elapsed_time_sec = elapsed_time_sec
+    display_remaining_time_sec = remaining_time_sec
+    display_play_count = play_count
+    display_paused_duration_sec = paused_duration_cumulative_sec # 默认显示累计暂停时长
+
+    if thread_status == 'idle':
+        # 线程处于空闲状态 (刚启动或上次任务已处理完并清理)
+        if st.session_state.last_status:
+            display_status_text = f"上次运行状态: {st.session_state.last_status}"
+        else:
+            display_status_text = "空闲，等待开始..."
+        # 在空闲状态下，时间/计数显示为0或总时长
+        display_elapsed_time_sec = 0.0
+        display_play_count = 0
+        display_paused_duration_sec = 0.0
+        # 剩余时间显示配置的总时长，如果配置存在
+        if 'total_duration_minutes' in st.session_state:
+             display_remaining_time_sec = st.session_state.total_duration_minutes * 60.0
+        else:
+             display_remaining_time_sec = 0.0 # 如果配置也不存在，显示0
+
+    elif thread_status == 'paused':
+        # 线程处于暂停状态，显示实时暂停时长
+        display_status_text = f"已暂停 ({format_seconds_to_minutes_seconds(current_pause_duration_realtime_sec)})"
+        # paused_duration_cumulative_sec 已经是累计值
+
+    # 对于所有其他状态 ('starting', 'running', 'stopping', 'finishing_regular', 'finishing', 'finished', 'hibernated')
+    else:
+        # 直接显示线程报告的 current_status 文本
+        display_status_text = current_status_text_from_thread
+        # 线程在这些状态下会更新 elapsed_time, remaining_time, play_count, paused_duration
 
 
-# --- 日志输出 (折叠栏) ---
+    # --- 生成所有状态信息 ---
+    lines = [
+        f"**当前状态:** {display_status_text}",
+        f"**实际已运行时间:** {format_seconds_to_minutes_seconds(display_elapsed_time_sec)}",
+        f"**常规计时阶段剩余:** {format_seconds_to_minutes_seconds(display_remaining_time_sec)}",
+        f"**常规提示音已响次数:** {display_play_count}",
+    ]
+    if thread_status == 'running' and next_prompt_eta_sec is not None:
+        lines.append(f"**距离下一次常规提示音:** {format_seconds_to_minutes_seconds(next_prompt_eta_sec)}")
+    lines.append(f"**累计暂停时长:** {format_seconds_to_minutes_seconds(display_paused_duration_sec)}")
+    return lines, thread_status
+
+
+@RERUN_DURATION.timed(scope='live_status')
+def render_live_status():
+    """渲染实时状态面板。运行期间作为 fragment 定时局部刷新。"""
+    if st.session_state.timer_session_id is not None:
+        get_timer_backend().touch(st.session_state.timer_session_id) # 页面心跳
+    refresh_timer_backend()
+    status_data = st.session_state.status_data
+    snapshot = read_status(status_data)
+    # 状态版本没有变化时不重新画。运行和暂停中的时长随时钟变化 (显示精度为秒)，
+    # 所以这两个阶段还按显示的整秒数区分；其他阶段只有版本号变化时才重新画
+    live_second = None
+    if snapshot.thread_status == 'paused' and snapshot.pause_start_time is not None:
+        live_second = int(get_clock().time() - snapshot.pause_start_time)
+    elif snapshot.thread_status == 'running' and snapshot.start_time is not None:
+        live_second = int(get_clock().time() - snapshot.start_time - snapshot.paused_duration)
+    cache_key = (snapshot.version, live_second, st.session_state.last_status, st.session_state.get('total_duration_minutes'))
+    live_status_rendered = st.session_state.get('live_status_rendered')
+    # 整页 rerun 时占位是新建的 (空的)，必须重新画；局部刷新时占位不变，内容相同就不再发送
+    if (snapshot.version is not None and live_status_rendered is not None
+            and live_status_rendered[0] is status_placeholder and live_status_rendered[1] is status_data
+            and live_status_rendered[2] == cache_key):
+        return
+    lines, thread_status = compute_live_status_lines(snapshot)
+    st.session_state.live_status_rendered = (status_placeholder, status_data, cache_key)
+
+    # --- 显示所有状态信息 ---
+    with status_placeholder.container():
+        for line in lines:
+            st.write(line)
+
+    # 会话在局部刷新期间结束或休眠：触发一次整页 rerun，由上面的结束/休眠处理块做清理或显示恢复按钮
+    if st.session_state.is_running and thread_status in ('finished', 'hibernated'):
+        st.rerun(scope="app")
+
+
+# 只有会话进行中才定时刷新 (暂停中慢一些)；空闲时不设置 run_every，页面完全静止直到用户操作
+st.fragment(render_live_status, run_every=refresh_interval)()
+
+
+# --- 日志输出 (折叠栏) 和时间记录 ---
+# 同样作为 fragment 刷新；日志版本和记录条数都没有变化时直接返回。
+# 日志通过 LogView 只处理上次渲染之后新增的记录，时间记录由 TimeRecords 只格式化新增的条目
 st.header("日志")
-log_text = "\n".join(st.session_state.log_messages)
 # 使用 st.expander 创建折叠栏
 # expanded=True 表示默认展开，False 表示默认折叠
-with st.expander("查看程序日志", expanded=True):
+log_placeholder = st.expander("查看程序日志", expanded=True).empty()
+st.header("常规提示音响起时间记录")
+records_placeholder = st.empty()
+
+
+def render_time_records(time_records):
+    """常规提示音时间记录和间隔统计 (条数不变时复用拼接好的文本和统计)。"""
+    if time_records:
+        records_cache = st.session_state.get('records_markdown_cache')
+        if records_cache is None or records_cache[0] is not time_records or records_cache[1] != len(time_records):
+            # 使用 markdown 显示列表，每个元素一行
+            record_list_markdown = "\n".join([f"- {rec}" for rec in time_records.formatted()])
+            records_cache = (time_records, len(time_records), record_list_markdown, time_records.interval_stats())
+            st.session_state.records_markdown_cache = records_cache
+        st.markdown(records_cache[2])
+        interval_stats = records_cache[3]
+        if interval_stats is not None:
+            stats_text = (f"平均间隔: {format_seconds_to_minutes_seconds(interval_stats['gap_mean'])}，"
+                          f"间隔标准差: {math.sqrt(interval_stats['gap_var']):.1f} 秒")
+            if interval_stats['drift_mean'] is not None:
+                stats_text += f"，相对计划时间平均偏差: {interval_stats['drift_mean'] * 1000:.0f} 毫秒"
+            st.caption(stats_text)
+    else:
+        st.write("暂无时间记录。")
+
+
+@RERUN_DURATION.timed(scope='log')
+def render_log_and_records():
+    """渲染日志和常规提示音时间记录。"""
+    refresh_timer_backend()
+    log_store = st.session_state.log_messages
+    time_records = st.session_state.time_records
+    rendered = st.session_state.get('log_rendered')
+    if (rendered is not None and rendered[0] is log_placeholder and rendered[1] is log_store
+            and rendered[2] == log_store.version and rendered[3] is time_records and rendered[4] == len(time_records)):
+        return # 占位相同 (局部刷新) 且没有新日志和记录，保留上次画的内容
+    st.session_state.log_rendered = (log_placeholder, log_store, log_store.version, time_records, len(time_records))
+
+    log_view = st.session_state.get('log_view')
+    if log_view is None or log_view.store is not log_store:
+        log_view = LogView(log_store) # 开始新会话时日志存储会被替换
+        st.session_state.log_view = log_view
     # 使用 markdown 格式化日志，支持换行，并保持 pre-formatted 样式
-    # height 参数可以控制显示区域的高度
-    st.markdown(f"```\n{log_text}\n```", help="程序输出日志")
+    log_placeholder.markdown(f"```\n{log_view.text()}\n```", help="程序输出日志")
 
+    # --- 时间记录 (主区域) ---
+    with records_placeholder.container():
+        render_time_records(time_records)
 
-# --- 时间记录 (主区域) ---
-st.header("常规提示音响起时间记录")
-if st.session_state.time_records:
-    formatted_records = [
-        datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
-        for ts in st.session_state.time_records
-    ]
-    # 使用 markdown 显示列表，每个元素一行
-    record_list_markdown = "\n".join([f"- {rec}" for rec in formatted_records])
-    st.markdown(record_list_markdown)
-else:
-    st.write("暂无时间记录。")
\ No newline at end of file
+
+st.fragment(render_log_and_records, run_every=refresh_interval)()
+
+# 整页 rerun 的耗时 (st.rerun / st.stop 提前结束的运行不计入)
+RERUN_DURATION.observe(time.perf_counter() - _rerun_started, scope='app')
@@ -0,0 +1,81 @@
+# conftest.py
+# 测试共用的 fixture：虚拟时钟、只记录事件的音频后端、临时的会话日志和学习历史目录。
+# 所有测试都不需要声卡、pygame、pyarrow 或 Streamlit。
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+import 学习历史
+from 会话持久化 import SessionJournal
+from 时钟 import VirtualClock
+from 状态快照 import TimerStatus
+from 音频后端 import NullAudioBackend
+
+# 仓库自带的提示音：常规音是 PCM WAV (NullAudioBackend 能读出时长)，结束音的时长未知 (按 maxtime 播放)
+REGULAR_SOUND = os.path.join(REPO_DIR, '剑鸣2秒.wav')
+FINAL_SOUND = os.path.join(REPO_DIR, 'Eyecatch.wav')
+
+
+@pytest.fixture(autouse=True)
+def history_dir(tmp_path, monkeypatch):
+    """结束的会话写入临时目录，不写仓库里的 .history。"""
+    history = 学习历史.SessionHistory(str(tmp_path / 'history'))
+    monkeypatch.setattr(学习历史, '_history', history)
+    yield history
+    history.flush(timeout=5)
+
+
+@pytest.fixture
+def clock():
+    return VirtualClock()
+
+
+@pytest.fixture
+def audio(clock):
+    return NullAudioBackend(clock)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = SessionJournal(str(tmp_path / 'sessions.sqlite3'), flush_interval=0.01)
+    yield journal
+    journal.close()
+
+
+@pytest.fixture
+def timer_params():
+    """一个 10 分钟、每 1-2 分钟响一次、结束音 5 秒的会话 (与 register / run_audio_timer 的参数同名)。"""
+    return {
+        'min_interval_minutes': 1,
+        'max_interval_minutes': 2,
+        'regular_sound_path': REGULAR_SOUND,
+        'total_duration_minutes': 10,
+        'final_sound_path': FINAL_SOUND,
+        'final_duration_seconds': 5,
+        'volume_control': 0.5,
+    }
+
+
+@pytest.fixture
+def new_status(clock):
+    """返回一个函数，生成页面启动会话时的 status_data (thread_status 为 'starting'，start_time 为当前虚拟时间)。"""
+    return lambda: TimerStatus(thread_status='starting', current_status='正在启动...', start_time=clock.time())
+
+
+@pytest.fixture
+def drive():
+    """
+    推动使用 VirtualClock 的 TimerScheduler 运行，直到 predicate() 为真。
+    每一步由 advance_to_next_deadline() 精确落在截止时间上，结果与真实时钟下没有延迟时相同。
+    """
+    def run(scheduler, predicate):
+        while not predicate():
+            if scheduler.advance_to_next_deadline() is None:
+                raise AssertionError("调度器已没有等待中的截止时间，但没有到达预期状态")
+
+    return run
@@ -0,0 +1,153 @@
+# 会话日志的记录和重放：run_audio_timer / TimerScheduler 写入的事件重放后得到相同的状态，
+# 调度器用重放的状态和原来的随机种子从断点继续。
+import pytest
+
+from 会话持久化 import SessionState
+from 学习函数 import create_control_events, run_audio_timer
+from 计时调度器 import TimerScheduler
+from 日志存储 import LogStore
+from 时间记录 import TimeRecords
+
+
+def test_state_replays_events():
+    state = SessionState('key')
+    state.apply(100.0, 'start', {'start_time': 100.0, 'total_duration_minutes': 10, 'seed': 5})
+    state.apply(160.0, 'prompt', {'scheduled': 159.5})
+    state.apply(200.0, 'pause', {})
+    state.apply(260.0, 'resume', {})
+    state.apply(300.0, 'pause', {})
+    state.apply(300.0, 'hibernate', {})
+
+    assert state.params['seed'] == 5
+    assert state.start_time == 100.0
+    assert state.play_count == 1
+    assert state.prompt_times == [160.0]
+    assert state.scheduled_times == [159.5]
+    assert state.paused_duration == 60.0
+    assert state.pause_start_time == 300.0
+    assert state.hibernated
+    assert not state.finished
+
+    status_data = state.to_status_data()
+    assert status_data['thread_status'] == 'resuming'
+    assert status_data['remaining_time'] == 600
+    assert status_data['current_status'] == '已暂停...'
+
+    state.apply(400.0, 'restore', {})
+    state.apply(400.0, 'resume', {})
+    state.apply(500.0, 'finish', {'result': 'stopped'})
+    assert not state.hibernated
+    assert state.paused_duration == 160.0
+    assert state.pause_start_time is None
+    assert state.result == 'stopped'
+
+
+def test_load_requires_start_event(journal):
+    assert journal.load('missing') is None
+    journal.record('orphan', 'pause', ts=1.0)
+    assert journal.load('orphan') is None
+
+
+def test_thread_session_replays(timer_params, clock, audio, journal, new_status):
+    recorder = journal.new_session()
+    stop_event, pause_event = create_control_events()
+    status_data = new_status()
+    time_records = TimeRecords()
+    clock.call_later(150, pause_event.set)
+    clock.call_later(450, pause_event.clear)
+    result = run_audio_timer(
+        log_list=LogStore(), time_records=time_records, stop_event=stop_event, pause_event=pause_event,
+        status_data=status_data, journal=recorder, clock=clock, audio_backend=audio, **timer_params
+    )
+    state = journal.load(recorder.session_key)
+
+    assert result == state.result == "completed"
+    assert state.start_time == status_data['start_time']
+    assert state.params['total_duration_minutes'] == timer_params['total_duration_minutes']
+    assert state.paused_duration == pytest.approx(300)
+    assert state.play_count == status_data['play_count']
+    assert state.prompt_times == list(time_records)
+    assert [scheduled for _, scheduled in time_records.since(0)] == state.scheduled_times
+    assert journal.unfinished_sessions(max_age_seconds=float('inf')) == []
+
+
+def test_scheduler_resumes_from_journal(timer_params, clock, audio, journal, new_status, drive):
+    # 第一个"进程"：运行到第二次提示音之后暂停，然后进程退出 (调度器不再推进)
+    recorder = journal.new_session()
+    scheduler = TimerScheduler(clock=clock, audio_backend=audio)
+    status_data = new_status()
+    start_time = status_data['start_time']
+    time_records = TimeRecords()
+    session_id = scheduler.register(
+        log_list=LogStore(), time_records=time_records, status_data=status_data,
+        seed=99, journal=recorder, **timer_params
+    )
+    timeline = status_data['timeline']
+    drive(scheduler, lambda: len(time_records) == 2)
+    clock.advance(10)
+    assert scheduler.pause(session_id)
+    clock.advance(50)
+    assert journal.unfinished_sessions(max_age_seconds=float('inf')) == [recorder.session_key]
+
+    # 第二个"进程"：重放会话日志，用原来的种子重新注册
+    state = journal.load(recorder.session_key)
+    assert state.play_count == 2
+    assert state.pause_start_time == pytest.approx(start_time + timeline.prompt_offsets[1] + 10)
+    restored = TimerScheduler(clock=clock, audio_backend=audio)
+    restored_status = new_status()
+    restored_status.update(state.to_status_data())
+    restored_records = TimeRecords()
+    for played_time, scheduled_time in zip(state.prompt_times, state.scheduled_times):
+        restored_records.append(played_time, scheduled=scheduled_time)
+    restored_id = restored.register(
+        log_list=LogStore(), time_records=restored_records, status_data=restored_status,
+        seed=state.params['seed'], journal=journal.recorder(recorder.session_key),
+        **{name: state.params[name] for name in timer_params}
+    )
+
+    assert restored_status['timeline'].prompt_offsets == timeline.prompt_offsets
+    assert restored_status['thread_status'] == 'paused' # 重启前处于暂停状态，恢复后仍然暂停
+    assert restored.resume(restored_id)
+    assert restored_status['paused_duration'] == pytest.approx(50)
+    drive(restored, lambda: restored_status['thread_status'] == 'finished' and journal.load(recorder.session_key).finished)
+
+    state = journal.load(recorder.session_key)
+    assert state.result == "completed"
+    assert state.play_count == len(timeline)
+    # 第二次提示音之后的截止时间整体推迟了暂停的 50 秒
+    expected = [start_time + offset for offset in timeline.prompt_offsets[:2]]
+    expected += [start_time + 50 + offset for offset in timeline.prompt_offsets[2:]]
+    assert state.prompt_times == pytest.approx(expected)
+    assert list(restored_records) == pytest.approx(expected)
+    assert journal.unfinished_sessions(max_age_seconds=float('inf')) == []
+
+
+def test_hibernated_session_restores(timer_params, clock, audio, journal, new_status, drive):
+    recorder = journal.new_session()
+    scheduler = TimerScheduler(clock=clock, audio_backend=audio)
+    status_data = new_status()
+    session_id = scheduler.register(
+        log_list=LogStore(), time_records=TimeRecords(), status_data=status_data,
+        seed=3, journal=recorder, **timer_params
+    )
+    clock.advance(30)
+    assert scheduler.hibernate(session_id)
+
+    assert not scheduler.is_active(session_id)
+    assert status_data['thread_status'] == 'hibernated'
+    assert audio.active_leases() == 0
+    state = journal.load(recorder.session_key)
+    assert state.hibernated and not state.finished
+    assert state.pause_start_time == pytest.approx(status_data['start_time'] + 30)
+
+    restored_status = new_status()
+    restored_status.update(state.to_status_data())
+    restored_id = scheduler.register(
+        log_list=LogStore(), time_records=TimeRecords(), status_data=restored_status,
+        seed=state.params['seed'], journal=journal.recorder(recorder.session_key), **timer_params
+    )
+    assert restored_status['thread_status'] == 'paused'
+    assert not journal.load(recorder.session_key).hibernated
+    assert scheduler.cancel(restored_id)
+    drive(scheduler, lambda: journal.load(recorder.session_key).finished)
+    assert journal.load(recorder.session_key).result == "stopped"
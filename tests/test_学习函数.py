@@ -0,0 +1,147 @@
+# 用 VirtualClock + NullAudioBackend 在单个线程中跑完 run_audio_timer (和 asyncio 版本) 的整个会话 (几毫秒)。
+import asyncio
+
+import pytest
+
+from 学习函数 import create_async_control_events, create_control_events, run_audio_timer, run_audio_timer_async
+from 日志存储 import LogStore
+from 时间记录 import TimeRecords
+from 音频后端 import NullLease
+
+
+def _run(params, clock, audio, status_data, stop_event=None, pause_event=None, journal=None):
+    if stop_event is None:
+        stop_event, pause_event = create_control_events()
+    log_list = LogStore()
+    time_records = TimeRecords()
+    result = run_audio_timer(
+        log_list=log_list, time_records=time_records, stop_event=stop_event, pause_event=pause_event,
+        status_data=status_data, journal=journal, clock=clock, audio_backend=audio, **params
+    )
+    return result, log_list, time_records
+
+
+def test_completes_full_session(timer_params, clock, audio, new_status):
+    status_data = new_status()
+    start_time = status_data['start_time']
+    result, _, time_records = _run(timer_params, clock, audio, status_data)
+
+    assert result == "completed"
+    assert status_data['thread_status'] == 'finished'
+    assert status_data['current_status'] == "任务完成"
+    total_seconds = timer_params['total_duration_minutes'] * 60
+    # 10 分钟、间隔 1-2 分钟：至少 4 次，最多 9 次常规提示音
+    assert 4 <= len(time_records) <= 9
+    assert status_data['play_count'] == len(time_records)
+    assert audio.play_count == len(time_records) + 1 # 加上结束音
+    gaps = [b - a for a, b in zip([start_time] + list(time_records), time_records)]
+    assert all(60 <= gap <= 120 for gap in gaps)
+    # 虚拟时钟没有调度延迟：每次都在计划时间准时响起
+    assert time_records.drifts() == pytest.approx([0.0] * len(time_records))
+    # 常规阶段结束 (或最后一次提示音播完) 后再播放 5 秒结束音
+    assert clock.time() >= start_time + total_seconds + timer_params['final_duration_seconds']
+    assert audio.active_leases() == 0
+
+
+def test_pause_time_is_excluded(timer_params, clock, audio, new_status):
+    stop_event, pause_event = create_control_events()
+    status_data = new_status()
+    start_time = status_data['start_time']
+    clock.call_later(150, pause_event.set)
+    clock.call_later(450, pause_event.clear)
+    result, log_list, time_records = _run(timer_params, clock, audio, status_data, stop_event, pause_event)
+
+    assert result == "completed"
+    assert status_data['paused_duration'] == pytest.approx(300)
+    assert status_data['pause_start_time'] is None
+    # 暂停期间不响提示音，暂停只整体推迟后面的截止时间
+    assert not any(start_time + 150 < played < start_time + 450 for played in time_records)
+    assert time_records.drifts() == pytest.approx([0.0] * len(time_records))
+    assert clock.time() >= start_time + 600 + 300 + timer_params['final_duration_seconds']
+    assert any("本次暂停时长: 300.00 秒" in message for message in log_list)
+
+
+def test_stop_while_waiting(timer_params, clock, audio, new_status):
+    stop_event, pause_event = create_control_events()
+    status_data = new_status()
+    start_time = status_data['start_time']
+    clock.call_later(200, stop_event.set)
+    result, _, time_records = _run(timer_params, clock, audio, status_data, stop_event, pause_event)
+
+    assert result == "stopped"
+    assert status_data['thread_status'] == 'finished'
+    assert status_data['current_status'] == "任务已停止"
+    assert clock.time() == pytest.approx(start_time + 200)
+    assert all(played <= start_time + 200 for played in time_records)
+    assert audio.active_leases() == 0
+
+
+def test_stop_while_paused(timer_params, clock, audio, new_status):
+    stop_event, pause_event = create_control_events()
+    status_data = new_status()
+    clock.call_later(30, pause_event.set)
+    clock.call_later(90, stop_event.set)
+    result, _, time_records = _run(timer_params, clock, audio, status_data, stop_event, pause_event)
+
+    assert result == "stopped"
+    assert len(time_records) == 0
+    assert status_data['pause_start_time'] is None
+    assert audio.active_leases() == 0
+
+
+def test_missing_sound_file(timer_params, clock, audio, new_status, tmp_path):
+    params = dict(timer_params, regular_sound_path=str(tmp_path / 'missing.wav'))
+    status_data = new_status()
+    result, log_list, _ = _run(params, clock, audio, status_data)
+
+    assert result == "error"
+    assert status_data['thread_status'] == 'finished'
+    assert any("找不到常规提示音文件" in message for message in log_list)
+    assert audio.play_count == 0
+
+
+
+def _run_async(params, clock, audio, status_data, stop_event=None, pause_event=None):
+    if stop_event is None:
+        stop_event, pause_event = create_async_control_events()
+    log_list = LogStore()
+    time_records = TimeRecords()
+    result = asyncio.run(run_audio_timer_async(
+        log_list=log_list, time_records=time_records, stop_event=stop_event, pause_event=pause_event,
+        status_data=status_data, clock=clock, audio_backend=audio, **params
+    ))
+    return result, log_list, time_records
+
+
+def test_async_runner_matches_thread_runner(timer_params, clock, audio, new_status):
+    stop_event, pause_event = create_async_control_events()
+    status_data = new_status()
+    start_time = status_data['start_time']
+    clock.call_later(150, pause_event.set)
+    clock.call_later(450, pause_event.clear)
+    result, _, time_records = _run_async(timer_params, clock, audio, status_data, stop_event, pause_event)
+
+    assert result == "completed"
+    assert status_data['current_status'] == "任务完成"
+    assert status_data['paused_duration'] == pytest.approx(300)
+    assert status_data['play_count'] == len(time_records) >= 4
+    assert not any(start_time + 150 < played < start_time + 450 for played in time_records)
+    assert time_records.drifts() == pytest.approx([0.0] * len(time_records))
+    assert audio.play_count == len(time_records) + 1
+    assert audio.active_leases() == 0
+
+
+def test_async_runner_survives_unexpected_play_error(timer_params, clock, audio, new_status, monkeypatch):
+    def broken_play(self, sound_handle, maxtime=0):
+        raise ValueError("声道已损坏")
+
+    monkeypatch.setattr(NullLease, 'play', broken_play)
+    status_data = new_status()
+    result, log_list, time_records = _run_async(timer_params, clock, audio, status_data)
+
+    # 与线程版本相同：常规提示音出错时继续计时，结束音出错时以 error 结束
+    assert result == "error"
+    assert len(time_records) == 0
+    assert any("播放常规音频时发生未知错误：声道已损坏" in message for message in log_list)
+    assert any("播放结束音频时发生未知错误：声道已损坏" in message for message in log_list)
+    assert audio.active_leases() == 0
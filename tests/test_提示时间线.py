@@ -0,0 +1,54 @@
+import pytest
+
+from 提示时间线 import compile_timeline
+
+
+def test_same_seed_same_timeline():
+    first = compile_timeline(5, 10, 90, 20, prompt_length_seconds=2.0, seed=42)
+    second = compile_timeline(5, 10, 90, 20, prompt_length_seconds=2.0, seed=42)
+    other = compile_timeline(5, 10, 90, 20, prompt_length_seconds=2.0, seed=43)
+
+    assert first.prompt_offsets == second.prompt_offsets
+    assert (first.final_start, first.final_end) == (second.final_start, second.final_end)
+    assert first.prompt_offsets != other.prompt_offsets
+
+
+def test_random_seed_is_recorded():
+    timeline = compile_timeline(5, 10, 90, 20)
+    replay = compile_timeline(5, 10, 90, 20, seed=timeline.seed)
+
+    assert replay.prompt_offsets == timeline.prompt_offsets
+
+
+def test_offsets_follow_interval_rules():
+    timeline = compile_timeline(5, 10, 90, 20, prompt_length_seconds=2.0, seed=1)
+    offsets = (0.0,) + timeline.prompt_offsets
+    gaps = [b - a for a, b in zip(offsets, offsets[1:])]
+
+    assert all(300 <= gap <= 600 for gap in gaps)
+    assert timeline.prompt_offsets[-1] < 90 * 60
+    # 结束音在常规时长结束、且最后一次提示音播完之后开始
+    assert timeline.final_start == max(90 * 60, timeline.prompt_offsets[-1] + 2.0)
+    assert timeline.final_end == timeline.final_start + 20
+
+
+def test_status_at_excludes_pauses():
+    timeline = compile_timeline(1, 2, 10, 5, seed=3)
+    start = 1000.0
+    first = timeline.prompt_offsets[0]
+
+    status = timeline.status_at(start, paused_duration=60, now=start + 60 + first + 0.5)
+    assert status['elapsed_time'] == pytest.approx(first + 0.5)
+    assert status['play_count'] == 1
+    assert status['phase'] == 'running'
+
+    # 暂停期间实际运行时间停在暂停开始的那一刻
+    paused = timeline.status_at(start, 0.0, pause_start_time=start + 30, now=start + 500)
+    assert paused['elapsed_time'] == pytest.approx(30)
+    assert paused['play_count'] == 0
+    assert paused['next_prompt_eta'] == pytest.approx(first - 30)
+
+    finished = timeline.status_at(start, 0.0, now=start + timeline.final_end)
+    assert finished['phase'] == 'finished'
+    assert finished['remaining_time'] == 0.0
+    assert finished['play_count'] == len(timeline)
@@ -0,0 +1,51 @@
+import types
+
+from 文件监视 import FileMetadataCache, _ChangeHandler
+
+
+def _event(event_type, path, is_directory=False):
+    return types.SimpleNamespace(event_type=event_type, src_path=str(path), is_directory=is_directory, dest_path='')
+
+
+def _cache(monkeypatch):
+    cache = FileMetadataCache()
+    monkeypatch.setattr(cache, '_watch', lambda directory: True) # 不依赖 watchdog，事件由测试直接分发
+    changed = []
+    cache.add_listener(changed.append)
+    return cache, _ChangeHandler(cache), changed
+
+
+def test_events_for_other_files_are_dropped(tmp_path, monkeypatch):
+    cache, handler, changed = _cache(monkeypatch)
+    sound = tmp_path / 'prompt.wav'
+    sound.write_bytes(b'RIFF')
+    assert cache.stat(str(sound)).size == 4
+    generation = cache._generation
+
+    # 同一目录下的会话日志、套接字等文件的写入
+    for name in ('sessions.sqlite3-wal', '.timer_backend.sock', '.history'):
+        handler.dispatch(_event('modified', tmp_path / name))
+    assert changed == []
+    assert cache._generation == generation
+    assert cache.stats()['entries'] == 1
+
+
+def test_cached_file_change_invalidates(tmp_path, monkeypatch):
+    cache, handler, changed = _cache(monkeypatch)
+    sound = tmp_path / 'prompt.wav'
+    sound.write_bytes(b'RIFF')
+    cache.stat(str(sound))
+    missing = tmp_path / 'final.wav'
+    assert cache.stat(str(missing)) is None # "不存在" 也是缓存的结果
+
+    sound.write_bytes(b'RIFFWAVE')
+    handler.dispatch(_event('modified', sound))
+    assert changed == [str(sound)]
+    assert cache.stat(str(sound)).size == 8
+
+    missing.write_bytes(b'RIFF')
+    handler.dispatch(_event('created', missing))
+    assert cache.exists(str(missing))
+
+    handler.dispatch(_event('deleted', tmp_path, is_directory=True)) # 目录被删除：其中所有文件失效
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,65 @@
+from 日志存储 import LogStore, LogView, log_once
+
+
+def test_wraps_around_at_capacity():
+    store = LogStore(capacity=5)
+    for i in range(12):
+        store.append(f"消息 {i}")
+
+    assert len(store) == 5
+    assert store.version == 12
+    assert list(store) == [f"消息 {i}" for i in range(7, 12)]
+    assert [record.seq for record in store.records()] == [8, 9, 10, 11, 12]
+
+
+def test_since_returns_only_new_records():
+    store = LogStore(capacity=5)
+    for i in range(12):
+        store.append(f"消息 {i}")
+
+    assert [record.message for record in store.since(10)] == ["消息 10", "消息 11"]
+    assert store.since(12) == []
+    # 已经被挤出缓冲区的记录取不到，只返回仍在缓冲区中的部分
+    assert [record.seq for record in store.since(0)] == [8, 9, 10, 11, 12]
+
+
+def test_level_is_inferred():
+    store = LogStore()
+    store.append("错误：找不到文件")
+    store.append("警告：音量无效")
+    store.append("程序已启动。")
+
+    assert [record.level for record in store.records()] == ['error', 'warning', 'info']
+
+
+def test_log_once_dedupes_within_window():
+    store = LogStore()
+    log_once(store, 'file-missing', "找不到文件", window=3)
+    log_once(store, 'file-missing', "找不到文件", window=3)
+    assert list(store) == ["找不到文件"]
+
+    store.extend(["其他 1", "其他 2", "其他 3"])
+    log_once(store, 'file-missing', "找不到文件", window=3)
+    assert list(store).count("找不到文件") == 2
+
+
+def test_log_once_on_plain_list():
+    log_list = []
+    log_once(log_list, 'file-missing', "找不到文件", window=2)
+    log_once(log_list, 'file-missing', "找不到文件", window=2)
+    log_list.extend(["其他 1", "其他 2"])
+    log_once(log_list, 'file-missing', "找不到文件", window=2)
+
+    assert log_list == ["找不到文件", "其他 1", "其他 2", "找不到文件"]
+
+
+def test_log_view_formats_incrementally():
+    store = LogStore(capacity=3)
+    view = LogView(store)
+    store.extend(["a", "b"])
+    text = view.text()
+    assert text == "a\nb"
+    assert view.text() is text # 没有新记录时返回缓存的文本
+
+    store.extend(["c", "d"])
+    assert view.text() == "b\nc\nd"
@@ -0,0 +1,25 @@
+import time
+
+import pytest
+
+from 时钟 import SystemClock, VirtualClock, monotonic_at
+
+
+def test_system_clock_persists_unix_time():
+    clock = SystemClock()
+    before = time.time()
+    assert before <= clock.time() <= time.time()
+    assert clock.monotonic() == pytest.approx(time.monotonic(), abs=1.0)
+
+
+def test_monotonic_at_converts_persisted_timestamp():
+    clock = SystemClock()
+    start_time = clock.time() - 90 # 例如会话日志中 90 秒前的开始时间
+    assert clock.monotonic() - monotonic_at(clock, start_time) == pytest.approx(90, abs=0.5)
+
+
+def test_virtual_clock_readings_agree():
+    clock = VirtualClock(start=1000.0)
+    clock.advance(5)
+    assert clock.time() == clock.monotonic() == 1005.0
+    assert monotonic_at(clock, 1000.0) == 1000.0
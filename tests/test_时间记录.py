@@ -0,0 +1,65 @@
+import datetime
+
+import pytest
+
+from 时间记录 import TimeRecords, append_record
+
+
+def test_since_returns_records_after_index():
+    records = TimeRecords()
+    records.append(100.0, scheduled=99.5)
+    records.append(200.0)
+    records.append(300.0, scheduled=300.25)
+
+    assert records.since(0) == [(100.0, 99.5), (200.0, None), (300.0, 300.25)]
+    assert records.since(1) == [(200.0, None), (300.0, 300.25)]
+    assert records.since(3) == []
+
+
+def test_drifts_skip_records_without_schedule():
+    records = TimeRecords()
+    records.append(100.0, scheduled=99.5)
+    records.append(200.0)
+    records.append(300.0, scheduled=300.25)
+
+    assert records.drifts() == pytest.approx([0.5, -0.25])
+
+
+def test_list_compatible():
+    records = TimeRecords()
+    assert not records
+    append_record(records, 100.0, scheduled=100.0)
+    append_record(records, 160.0)
+
+    assert len(records) == 2
+    assert records[-1] == 160.0
+    assert list(records) == [100.0, 160.0]
+
+    plain = []
+    append_record(plain, 100.0, scheduled=99.0)
+    assert plain == [100.0]
+
+
+def test_formatted_only_formats_new_records():
+    records = TimeRecords(time_format='%H:%M:%S')
+    records.append(0.0)
+    formatted = records.formatted()
+    assert formatted == [datetime.datetime.fromtimestamp(0.0).strftime('%H:%M:%S')]
+
+    records.append(61.0)
+    assert records.formatted() is formatted
+    assert formatted[1] == datetime.datetime.fromtimestamp(61.0).strftime('%H:%M:%S')
+
+
+def test_interval_stats():
+    pytest.importorskip('numpy')
+    records = TimeRecords()
+    for timestamp, scheduled in ((100.0, 99.0), (160.0, 161.0), (280.0, None)):
+        records.append(timestamp, scheduled=scheduled)
+
+    stats = records.interval_stats()
+    assert stats['count'] == 3
+    assert stats['gap_mean'] == pytest.approx(90.0)
+    assert stats['gap_var'] == pytest.approx(900.0)
+    assert stats['drift_mean'] == pytest.approx(0.0)
+    assert stats['drift_max'] == pytest.approx(1.0)
@@ -0,0 +1,90 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from 状态快照 import TimerStatus, read_status, status_batch
+
+
+def test_snapshot_is_cached_until_changed():
+    status = TimerStatus()
+    first = status.snapshot()
+    assert status.snapshot() is first
+
+    status['play_count'] = 0 # 值没有变化，版本号不变
+    assert status.version == first.version
+    assert status.snapshot() is first
+
+    status['play_count'] = 1
+    second = status.snapshot()
+    assert second is not first
+    assert second.version > first.version
+    assert second['play_count'] == 1
+
+
+def test_batch_publishes_once():
+    status = TimerStatus()
+    version = status.version
+    with status_batch(status):
+        status['elapsed_time'] = 10.0
+        status['remaining_time'] = 50.0
+        with status.writing(): # 可以嵌套
+            status['thread_status'] = 'running'
+
+    assert status.version == version + 2 # 一次写入：开始和结束各加 1
+    assert not status.version & 1
+
+
+def test_unknown_field_and_delete():
+    status = TimerStatus(thread_status='running')
+    with pytest.raises(KeyError):
+        status['unknown'] = 1
+    del status['thread_status']
+    assert status['thread_status'] == 'idle'
+    assert status.get('unknown', 'x') == 'x'
+
+
+def test_read_status_accepts_plain_dict():
+    snapshot = read_status({'play_count': 3})
+    assert snapshot.version is None
+    assert snapshot['play_count'] == 3
+    assert snapshot['thread_status'] == 'idle'
+
+
+def test_snapshots_are_consistent_under_concurrent_writes():
+    # 写入方每次把三个字段一起更新，满足 elapsed + remaining == 600 且 play_count == elapsed；
+    # 读取方不加锁，读到的每个快照都必须满足这个关系 (不会看到只更新了一半的状态)
+    status = TimerStatus(elapsed_time=0.0, remaining_time=600.0, play_count=0)
+    stop = threading.Event()
+
+    def writer(offset):
+        i = 0
+        while not stop.is_set():
+            i += 1
+            value = float((i * 2 + offset) % 600)
+            with status_batch(status):
+                status['elapsed_time'] = value
+                status['remaining_time'] = 600.0 - value
+                status['play_count'] = int(value)
+
+    threads = [threading.Thread(target=writer, args=(offset,)) for offset in (0, 1)]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5) # 频繁切换线程，让读取尽量落在写入中间
+    for thread in threads:
+        thread.start()
+    try:
+        versions = set()
+        deadline = time.monotonic() + 5
+        while len(versions) < 200 and time.monotonic() < deadline:
+            snapshot = status.snapshot()
+            assert snapshot.version % 2 == 0
+            assert snapshot.elapsed_time + snapshot.remaining_time == 600.0
+            assert snapshot.play_count == int(snapshot.elapsed_time)
+            versions.add(snapshot.version)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        sys.setswitchinterval(switch_interval)
+    assert len(versions) > 1 # 读取期间确实发生了写入
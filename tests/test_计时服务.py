@@ -0,0 +1,156 @@
+# TimerBackend / RemoteScheduler 通过临时 Unix 域套接字往返：命令转给后台的调度器，
+# 页面一侧的本地副本 (日志、时间记录、状态) 拉取后与后台完全一致。
+import os
+import socket
+import tempfile
+import threading
+
+import pytest
+
+from 计时服务 import (
+    MAX_REQUEST_BYTES, RemoteScheduler, TimerBackend, TimerBackendClient, TimerBackendError,
+    check_listen_address, create_server
+)
+from 计时调度器 import TimerScheduler
+from 日志存储 import LogStore
+from 时间记录 import TimeRecords
+from 状态快照 import TimerStatus
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="需要 Unix 域套接字")
+
+
+@pytest.fixture
+def backend(clock, audio):
+    return TimerBackend(scheduler=TimerScheduler(clock=clock, audio_backend=audio))
+
+
+@pytest.fixture
+def address(backend):
+    # Unix 套接字路径有长度限制 (约 100 字节)，pytest 的 tmp_path 可能太长
+    with tempfile.TemporaryDirectory() as directory:
+        address = 'unix:' + os.path.join(directory, 'backend.sock')
+        server = create_server(address, backend)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield address
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+@pytest.fixture
+def remote(address):
+    client = TimerBackendClient(address, timeout=5)
+    yield RemoteScheduler(client)
+    client.close()
+
+
+def _register(remote, params, clock, seed=11):
+    log_list, time_records = LogStore(), TimeRecords()
+    status_data = TimerStatus(thread_status='starting', current_status='正在启动...', start_time=clock.time())
+    session_id = remote.register(
+        log_list=log_list, time_records=time_records, status_data=status_data, seed=seed, **params
+    )
+    return session_id, log_list, time_records, status_data
+
+
+def _hosted(backend):
+    (hosted,) = backend._sessions.values()
+    return hosted
+
+
+def test_round_trip_to_completion(timer_params, clock, audio, backend, remote, drive):
+    session_id, log_list, time_records, status_data = _register(remote, timer_params, clock)
+    hosted = _hosted(backend)
+
+    assert session_id is not None
+    assert status_data['thread_status'] == 'running'
+    assert status_data['timeline'].prompt_offsets == hosted.status_data['timeline'].prompt_offsets
+    assert remote.is_active(session_id)
+    assert remote.session_counts() == {'running': 1, 'paused': 0, 'finishing': 0}
+
+    clock.advance(30)
+    assert remote.pause(session_id)
+    assert status_data['thread_status'] == 'paused'
+    assert status_data['pause_start_time'] == pytest.approx(status_data['start_time'] + 30)
+    clock.advance(45)
+    assert remote.resume(session_id)
+    assert status_data['thread_status'] == 'running'
+    assert status_data['paused_duration'] == pytest.approx(45)
+
+    drive(backend.scheduler, lambda: hosted.status_data['thread_status'] == 'finished' and audio.active_leases() == 0)
+    remote.refresh(force=True)
+
+    assert status_data['thread_status'] == 'finished'
+    assert status_data['current_status'] == "任务完成"
+    assert list(log_list) == list(hosted.log_list)
+    assert time_records.since(0) == hosted.time_records.since(0)
+    assert len(time_records) == len(status_data['timeline'])
+    assert not remote.is_active(session_id)
+
+
+def test_cancel_and_heartbeat(timer_params, clock, backend, remote):
+    session_id, _, _, status_data = _register(remote, timer_params, clock)
+    scheduler = backend.scheduler
+
+    clock.advance(100)
+    assert scheduler.idle_sessions(60) == [_hosted(backend).session_id]
+    # 心跳随下一次拉取一起发送
+    assert remote.touch(session_id)
+    remote.refresh(force=True)
+    assert scheduler.idle_sessions(60) == []
+
+    assert remote.cancel(session_id)
+    assert status_data['thread_status'] == 'finished'
+    assert status_data['current_status'] == "任务已停止"
+    assert not remote.cancel(session_id)
+    assert not remote.touch(session_id) # 同步完最终状态后不再拉取
+
+
+def test_find_by_journal_key(timer_params, clock, backend, remote, journal):
+    backend.journal = journal
+    recorder = journal.new_session()
+    status_data = TimerStatus(thread_status='starting', start_time=clock.time())
+    local_id = remote.register(
+        log_list=LogStore(), time_records=TimeRecords(), status_data=status_data, seed=5, journal=recorder,
+        **timer_params
+    )
+
+    # 同一个 Streamlit 进程中刷新页面：返回已有的本地副本
+    assert remote.find_by_journal_key(recorder.session_key)[0] == local_id
+    # 另一个 Streamlit 进程：从后台完整同步一次
+    other = RemoteScheduler(TimerBackendClient(remote.client.address, timeout=5))
+    try:
+        found_id, found_logs, _, found_status = other.find_by_journal_key(recorder.session_key)
+        assert found_status['start_time'] == status_data['start_time']
+        assert found_status['timeline'].prompt_offsets == status_data['timeline'].prompt_offsets
+        assert list(found_logs) == list(_hosted(backend).log_list)
+        assert other.find_by_journal_key('missing') is None
+    finally:
+        other.client.close()
+    assert journal.load(recorder.session_key).params['seed'] == 5
+
+
+def test_errors(remote, address):
+    client = remote.client
+    with pytest.raises(TimerBackendError):
+        client.call('no_such_op')
+    with pytest.raises(TimerBackendError):
+        client.call('start') # 缺少参数
+    assert client.call('ping')['pid'] == os.getpid() # 出错后连接仍然可用
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(address[len('unix:'):])
+        sock.sendall(b'x' * (MAX_REQUEST_BYTES + 2) + b'\n')
+        assert b'"ok": false' in sock.makefile('rb').readline()
+
+
+def test_listen_address_must_be_loopback():
+    assert check_listen_address('tcp:127.0.0.1:9470')[1] == ('127.0.0.1', 9470)
+    assert check_listen_address('localhost:9470')[1] == ('localhost', 9470)
+    for address in ('tcp:0.0.0.0:9470', '192.168.1.10:9470', 'example.com:9470'):
+        with pytest.raises(ValueError):
+            check_listen_address(address)
@@ -0,0 +1,147 @@
+# TimerScheduler 端到端：conftest.drive 用 advance_to_next_deadline() 把虚拟时钟推进到每个截止时间。
+import pytest
+
+from 提示时间线 import compile_timeline
+from 时钟 import SystemClock
+from 计时调度器 import TimerScheduler
+from 日志存储 import LogStore
+from 时间记录 import TimeRecords
+
+
+def _register(scheduler, params, status_data, seed=7, journal=None):
+    log_list = LogStore()
+    time_records = TimeRecords()
+    session_id = scheduler.register(
+        log_list=log_list, time_records=time_records, status_data=status_data, seed=seed, journal=journal, **params
+    )
+    return session_id, log_list, time_records
+
+
+def _finished(status_data, audio):
+    # 声道在释放调度器的锁之后才归还
+    return lambda: status_data['thread_status'] == 'finished' and audio.active_leases() == 0
+
+
+def test_runs_session_to_completion(timer_params, clock, audio, new_status, drive):
+    scheduler = TimerScheduler(clock=clock, audio_backend=audio)
+    status_data = new_status()
+    start_time = status_data['start_time']
+    session_id, _, time_records = _register(scheduler, timer_params, status_data)
+    timeline = status_data['timeline']
+
+    drive(scheduler, _finished(status_data, audio))
+
+    assert not scheduler.is_active(session_id)
+    assert status_data['current_status'] == "任务完成"
+    assert status_data['play_count'] == len(timeline) == len(time_records)
+    assert list(time_records) == pytest.approx([start_time + offset for offset in timeline.prompt_offsets])
+    assert time_records.drifts() == pytest.approx([0.0] * len(time_records))
+    assert clock.time() == pytest.approx(start_time + timeline.final_end)
+    assert audio.play_count == len(timeline) + 1
+
+
+def test_seed_reproduces_timeline(timer_params, clock, audio, new_status):
+    scheduler = TimerScheduler(clock=clock, audio_backend=audio)
+    first, second = new_status(), new_status()
+    _register(scheduler, timer_params, first, seed=1234)
+    _register(scheduler, timer_params, second, seed=1234)
+    prompt_length = audio.load_sound(timer_params['regular_sound_path'], 1.0).get_length()
+    expected = compile_timeline(
+        timer_params['min_interval_minutes'], timer_params['max_interval_minutes'],
+        timer_params['total_duration_minutes'], timer_params['final_duration_seconds'],
+        prompt_length_seconds=prompt_length, seed=1234
+    )
+
+    assert first['timeline'].prompt_offsets == second['timeline'].prompt_offsets == expected.prompt_offsets
+    assert first['timeline'].final_end == expected.final_end
+
+
+def test_pause_and_resume_shift_deadlines(timer_params, clock, audio, new_status, drive):
+    scheduler = TimerScheduler(clock=clock, audio_backend=audio)
+    status_data = new_status()
+    start_time = status_data['start_time']
+    session_id, _, time_records = _register(scheduler, timer_params, status_data)
+    timeline = status_data['timeline']
+
+    clock.advance(30) # 第一次提示音最早在 60 秒，这段时间调度线程没有要处理的截止时间
+    assert scheduler.pause(session_id)
+    assert not scheduler.pause(session_id)
+    assert status_data['thread_status'] == 'paused'
+    assert status_data['elapsed_time'] == pytest.approx(30)
+    assert status_data['pause_start_time'] == pytest.approx(start_time + 30)
+    assert scheduler.session_counts() == {'running': 0, 'paused': 1, 'finishing': 0}
+
+    clock.advance(100)
+    assert scheduler.resume(session_id)
+    assert status_data['thread_status'] == 'running'
+    assert status_data['paused_duration'] == pytest.approx(100)
+    assert status_data['pause_start_time'] is None
+
+    drive(scheduler, _finished(status_data, audio))
+
+    assert status_data['current_status'] == "任务完成"
+    assert list(time_records) == pytest.approx([start_time + 100 + offset for offset in timeline.prompt_offsets])
+    assert time_records.drifts() == pytest.approx([0.0] * len(time_records))
+    assert clock.time() == pytest.approx(start_time + 100 + timeline.final_end)
+
+
+def test_cancel_stops_session(timer_params, clock, audio, new_status, drive):
+    scheduler = TimerScheduler(clock=clock, audio_backend=audio)
+    status_data = new_status()
+    session_id, _, time_records = _register(scheduler, timer_params, status_data)
+    first_prompt = status_data['timeline'].prompt_offsets[0]
+
+    drive(scheduler, lambda: len(time_records) == 1)
+    assert scheduler.cancel(session_id)
+
+    assert not scheduler.cancel(session_id)
+    assert not scheduler.is_active(session_id)
+    assert status_data['thread_status'] == 'finished'
+    assert status_data['current_status'] == "任务已停止"
+    assert status_data['play_count'] == 1
+    assert clock.time() == pytest.approx(status_data['start_time'] + first_prompt)
+    assert audio.active_leases() == 0
+
+
+def test_sessions_do_not_share_state(timer_params, clock, audio, new_status, drive):
+    scheduler = TimerScheduler(clock=clock, audio_backend=audio)
+    sessions = [new_status() for _ in range(5)]
+    ids = [_register(scheduler, timer_params, status_data, seed=seed)[0] for seed, status_data in enumerate(sessions)]
+    assert audio.active_leases() == 5
+
+    scheduler.cancel(ids[0])
+    drive(scheduler, lambda: all(status_data['thread_status'] == 'finished' for status_data in sessions)
+          and audio.active_leases() == 0)
+
+    assert sessions[0]['current_status'] == "任务已停止"
+    assert all(status_data['current_status'] == "任务完成" for status_data in sessions[1:])
+    assert all(status_data['play_count'] == len(status_data['timeline']) for status_data in sessions[1:])
+
+
+def test_missing_sound_file_fails_registration(timer_params, clock, audio, new_status, tmp_path):
+    scheduler = TimerScheduler(clock=clock, audio_backend=audio)
+    status_data = new_status()
+    params = dict(timer_params, final_sound_path=str(tmp_path / 'missing.wav'))
+    session_id, log_list, _ = _register(scheduler, params, status_data)
+
+    assert session_id is None
+    assert status_data['thread_status'] == 'finished'
+    assert any("找不到结束提示音文件" in message for message in log_list)
+    assert audio.active_leases() == 0
+
+
+def test_advance_to_next_deadline(timer_params, clock, audio, new_status):
+    scheduler = TimerScheduler(clock=clock, audio_backend=audio)
+    assert scheduler.advance_to_next_deadline() is None # 没有会话
+
+    status_data = new_status()
+    start_time = status_data['start_time']
+    _, _, time_records = _register(scheduler, timer_params, status_data)
+    first = status_data['timeline'].prompt_offsets[0]
+
+    assert scheduler.advance_to_next_deadline() == pytest.approx(start_time + first)
+    assert list(time_records) == pytest.approx([start_time + first]) # 返回时已经处理完到期的会话
+    assert clock.time() == pytest.approx(start_time + first)
+
+    with pytest.raises(RuntimeError):
+        TimerScheduler(clock=SystemClock(), audio_backend=audio).advance_to_next_deadline()
@@ -0,0 +1,36 @@
+import wave
+
+import pytest
+
+from conftest import REGULAR_SOUND
+from 音频后端 import AudioBackendError, WavFileAudioBackend
+
+
+def test_wav_backend_writes_in_background(clock, tmp_path):
+    backend = WavFileAudioBackend(str(tmp_path / 'out'), clock=clock)
+    lease = backend.acquire()
+    sound = backend.load_sound(REGULAR_SOUND, 0.5)
+
+    lease.play(sound, maxtime=1000)
+    assert backend.flush(timeout=5)
+
+    (output,) = (tmp_path / 'out').iterdir()
+    assert output.name == '0001-001-剑鸣2秒.wav'
+    with wave.open(str(output), 'rb') as wav:
+        assert wav.getnframes() == wav.getframerate() # 按 maxtime 截断为 1 秒
+    lease.release()
+
+
+def test_wav_backend_reports_write_error_on_next_play(clock, tmp_path):
+    blocker = tmp_path / 'out'
+    blocker.write_text('不是目录')
+    backend = WavFileAudioBackend(str(blocker), clock=clock)
+    lease = backend.acquire()
+    sound = backend.load_sound(REGULAR_SOUND, 0.5)
+
+    lease.play(sound) # 只排进队列，不在调用方的线程里写文件
+    assert backend.flush(timeout=5)
+    with pytest.raises(AudioBackendError):
+        lease.play(sound)
+    lease.play(sound) # 错误只报告一次
+    lease.release()
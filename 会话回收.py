@@ -0,0 +1,101 @@
+# 会话回收.py
+# 浏览器标签页关闭后，调度器中的会话仍会一直运行到结束 (最长 90 分钟以上)，
+# 期间占用一个声道，并持有会话的日志、时间记录和状态。没有人会再看这些内容。
+# 页面每次运行 (包括运行中每秒一次的局部刷新) 都向调度器发送一次心跳 (touch)。
+# 回收线程定期检查，超过宽限时间没有心跳的会话按设置处理:
+#   - hibernate (默认): 暂停并从调度器中移除，归还声道并释放音频句柄。
+#     会话日志中它仍是暂停中的未结束会话，页面重新打开 (?session=...) 时从暂停处恢复；
+#     没有会话日志的会话无法恢复，改为停止。
+#   - stop: 与"结束计时"相同。
+#
+# 环境变量:
+#   STUDY_TIMER_ORPHAN_GRACE_SECONDS  宽限时间 (秒)，默认 600；0 表示不回收
+#   STUDY_TIMER_ORPHAN_ACTION         hibernate (默认) 或 stop
+import os
+import threading
+
+from 运行指标 import register_liveness_gauge
+
+DEFAULT_GRACE_SECONDS = 600
+# 超过这个时间没有心跳的会话算作"无人查看" (只用于统计)。
+# 浏览器会限制后台标签页的定时器，局部刷新可能一分钟才运行一次，所以不能取得太短
+DISCONNECT_SECONDS = 90
+REAPER_ACTIONS = ('hibernate', 'stop')
+
+
+class SessionReaper:
+    """
+    定期休眠或停止超过 grace_seconds 秒没有心跳的会话。
+
+    scheduler 需要提供 idle_sessions()、liveness_counts()、hibernate() 和 cancel()
+    (计时调度器.TimerScheduler)。interval 为 None 时按宽限时间的 1/4 检查 (1 到 60 秒之间)。
+    """
+
+    def __init__(self, scheduler, grace_seconds=DEFAULT_GRACE_SECONDS, action='hibernate', interval=None):
+        if action not in REAPER_ACTIONS:
+            raise ValueError(f"无法识别的回收方式: {action!r} (可用: {'、'.join(REAPER_ACTIONS)})")
+        if grace_seconds <= 0:
+            raise ValueError(f"宽限时间必须大于 0: {grace_seconds}")
+        self.scheduler = scheduler
+        self.grace_seconds = grace_seconds
+        self.action = action
+        self.interval = interval if interval is not None else min(60.0, max(1.0, grace_seconds / 4))
+        self.reaped = 0 # 已回收的会话数
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="SessionReaper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def run_once(self):
+        """检查一次，返回这次回收的会话数。"""
+        reaped = 0
+        for session_id in self.scheduler.idle_sessions(self.grace_seconds):
+            if self.action == 'hibernate':
+                reaped += self.scheduler.hibernate(session_id)
+            else:
+                reaped += self.scheduler.cancel(session_id)
+        self.reaped += reaped
+        return reaped
+
+    def liveness_counts(self):
+        """返回 {'live': n, 'orphaned': n}：仍有页面在查看的和已经没有页面查看 (还没回收) 的会话数。"""
+        return self.scheduler.liveness_counts(min(DISCONNECT_SECONDS, self.grace_seconds))
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+
+_reaper = None
+_reaper_lock = threading.Lock()
+
+
+def start_session_reaper(scheduler, grace_seconds=None, action=None):
+    """
+    为页面使用的调度器启动进程内唯一的回收线程 (重复调用返回同一个)。
+    grace_seconds / action 为 None 时从环境变量读取；宽限时间为 0 时不回收，返回 None。
+
+    命令行计时和性能基准的会话没有页面心跳，不能使用回收线程。
+
+    异常:
+        ValueError: 环境变量或参数无效。
+    """
+    global _reaper
+    with _reaper_lock:
+        if _reaper is None:
+            if grace_seconds is None:
+                grace_seconds = float(os.environ.get('STUDY_TIMER_ORPHAN_GRACE_SECONDS', DEFAULT_GRACE_SECONDS))
+            if action is None:
+                action = os.environ.get('STUDY_TIMER_ORPHAN_ACTION', 'hibernate').strip()
+            if grace_seconds <= 0:
+                return None
+            _reaper = SessionReaper(scheduler, grace_seconds, action).start()
+            register_liveness_gauge(_reaper.liveness_counts) # 运行指标：抓取时读取有人/无人查看的会话数
+        return _reaper
@@ -0,0 +1,280 @@
+# 会话持久化.py
+# 只追加的会话日志 (SQLite，WAL 模式)，让进行中的学习会话在 Streamlit 进程重启或重新部署后可以继续。
+# 只在发生事件时写入 (开始、暂停、继续、常规提示音、休眠、恢复、结束)，每个事件一行，不随 UI 刷新写盘；
+# 写入由后台线程批量提交，调用方 (调度线程持有锁时也会调用) 不会被磁盘 I/O 阻塞。
+# 重启后按事件重放得到 start_time / paused_duration / play_count 等状态，计时从断点继续。
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_JOURNAL_PATH = os.path.join(SCRIPT_DIR, 'sessions.sqlite3')
+
+# 后台线程最多每隔这么多秒提交一次；开始和结束事件立即提交
+JOURNAL_FLUSH_INTERVAL_SECONDS = 1.0
+_IMMEDIATE_KINDS = frozenset(('start', 'finish'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_key TEXT NOT NULL,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (session_key, id);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_key TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL,
+    result TEXT
+);
+"""
+
+
+class SessionState:
+    """
+    重放事件得到的会话状态。
+
+    params 是 'start' 事件记录的配置 (与 run_audio_timer / TimerScheduler.register 的参数同名)，
+    其余字段与 status_data 中的同名键含义相同。
+    """
+
+    __slots__ = (
+        'session_key', 'params', 'start_time', 'paused_duration', 'pause_start_time',
+        'play_count', 'prompt_times', 'scheduled_times', 'result', 'last_event_time', 'hibernated'
+    )
+
+    def __init__(self, session_key):
+        self.session_key = session_key
+        self.params = {}
+        self.start_time = None
+        self.paused_duration = 0.0
+        self.pause_start_time = None # 重启前处于暂停状态时为暂停开始时间
+        self.play_count = 0
+        self.prompt_times = [] # 常规提示音实际响起的时间
+        self.scheduled_times = [] # 对应的计划时间 (未知时为 None)
+        self.result = None # None 表示会话没有正常结束
+        self.last_event_time = None
+        self.hibernated = False # 无人查看被休眠 (见 会话回收.py)，之后还没有重新打开过
+
+    @property
+    def finished(self):
+        return self.result is not None
+
+    def apply(self, ts, kind, data):
+        """应用一个事件。事件只追加，所以按 id 顺序重放即可得到最终状态。"""
+        self.last_event_time = ts
+        if kind == 'start':
+            self.params = data
+            self.start_time = data.get('start_time', ts)
+        elif kind == 'pause':
+            self.pause_start_time = ts
+        elif kind == 'resume':
+            if self.pause_start_time is not None:
+                self.paused_duration += ts - self.pause_start_time
+            self.pause_start_time = None
+        elif kind == 'prompt':
+            self.play_count += 1
+            self.prompt_times.append(ts)
+            self.scheduled_times.append(data.get('scheduled'))
+        elif kind == 'hibernate':
+            self.hibernated = True
+        elif kind == 'restore':
+            self.hibernated = False
+        elif kind == 'finish':
+            self.result = data.get('result', 'stopped')
+
+    def to_status_data(self, total_duration_seconds=None):
+        """生成可以直接传给 run_audio_timer / TimerScheduler.register 的 status_data。"""
+        if total_duration_seconds is None:
+            total_duration_seconds = self.params.get('total_duration_minutes', 0) * 60
+        paused = self.pause_start_time is not None
+        return {
+            'elapsed_time': 0.0,
+            'remaining_time': total_duration_seconds,
+            'play_count': self.play_count,
+            'current_status': '已暂停...' if paused else '正在恢复...',
+            'thread_status': 'resuming', # 不是 'starting'，不会再记录一次开始日志和 start 事件
+            'start_time': self.start_time,
+            'paused_duration': self.paused_duration,
+            'pause_start_time': self.pause_start_time,
+            'current_pause_duration_display': 0.0
+        }
+
+
+class SessionRecorder:
+    """绑定到单个会话的记录器，传给 run_audio_timer(journal=...) 或 TimerScheduler.register(journal=...)。"""
+
+    __slots__ = ('journal', 'session_key', 'started')
+
+    def __init__(self, journal, session_key, started=False):
+        self.journal = journal
+        self.session_key = session_key
+        self.started = started # 日志中是否已经有 start 事件 (恢复的会话为 True)
+
+    def record(self, kind, ts=None, **data):
+        if kind == 'start':
+            self.started = True
+        self.journal.record(self.session_key, kind, ts, **data)
+
+
+class SessionJournal:
+    """
+    SQLite (WAL) 会话日志。
+
+    record() 只把事件放进内存队列，后台线程每 JOURNAL_FLUSH_INTERVAL_SECONDS 秒把队列中的事件
+    在一个事务里写入；开始/结束事件会立即唤醒后台线程。WAL 模式下读取 (load / unfinished_sessions)
+    不会阻塞写入。进程崩溃时最多丢失最近一个提交间隔内的暂停/继续/提示音事件。
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, flush_interval=JOURNAL_FLUSH_INTERVAL_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._condition = threading.Condition()
+        self._pending = [] # (session_key, ts, kind, data_json)
+        self._queued = 0 # 累计进入队列的事件数
+        self._written = 0 # 累计已提交的事件数
+        self._flush_requested = False # 开始/结束事件或 flush() 要求立即提交
+        self._closed = False
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        self._thread = threading.Thread(target=self._run, name="SessionJournal", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # WAL 下 NORMAL 已保证崩溃后数据库一致
+        return conn
+
+    # --- 写入 ---
+    def new_session(self):
+        """创建一个新的会话记录器 (start 事件由 run_audio_timer / 调度器在启动时写入)。"""
+        return SessionRecorder(self, uuid.uuid4().hex)
+
+    def recorder(self, session_key):
+        """返回已有会话的记录器，用于恢复会话后继续记录。"""
+        return SessionRecorder(self, session_key, started=True)
+
+    def record(self, session_key, kind, ts=None, **data):
+        """追加一个事件 (不等待写盘)。"""
+        if ts is None:
+            ts = time.time()
+        with self._condition:
+            if self._closed:
+                return
+            self._pending.append((session_key, ts, kind, json.dumps(data, ensure_ascii=False) if data else None))
+            self._queued += 1
+            if kind in _IMMEDIATE_KINDS:
+                self._flush_requested = True
+                self._condition.notify()
+
+    def flush(self, timeout=None):
+        """等待目前已进入队列的事件全部提交，返回是否在 timeout 内完成。"""
+        with self._condition:
+            target = self._queued
+            self._flush_requested = True
+            self._condition.notify()
+            return self._condition.wait_for(lambda: self._written >= target or self._closed, timeout)
+
+    def close(self):
+        """提交剩余事件并停止后台线程。"""
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                with self._condition:
+                    # 空闲时一直阻塞；第一个事件到达后再最多等 flush_interval 秒，把期间的事件合并成一个事务
+                    self._condition.wait_for(lambda: self._pending or self._closed)
+                    self._condition.wait_for(lambda: self._flush_requested or self._closed, self.flush_interval)
+                    batch, self._pending = self._pending, []
+                    self._flush_requested = False
+                    closed = self._closed
+                if batch:
+                    try:
+                        self._write_batch(conn, batch)
+                    except sqlite3.Error:
+                        pass # 磁盘错误时丢弃这一批，不能让后台线程退出 (flush() 会一直等待)
+                    with self._condition:
+                        self._written += len(batch)
+                        self._condition.notify_all()
+                if closed:
+                    return
+        finally:
+            conn.close()
+
+    def _query(self, sql, params):
+        # 读取使用独立的短连接，WAL 模式下不会阻塞后台线程的写入
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        with conn: # 一个事务
+            conn.executemany("INSERT INTO events (session_key, ts, kind, data) VALUES (?, ?, ?, ?)", batch)
+            for session_key, ts, kind, data in batch:
+                if kind == 'start':
+                    conn.execute("INSERT OR IGNORE INTO sessions (session_key, started) VALUES (?, ?)", (session_key, ts))
+                elif kind == 'finish':
+                    result = json.loads(data).get('result') if data else None
+                    conn.execute("UPDATE sessions SET finished = ?, result = ? WHERE session_key = ?", (ts, result, session_key))
+
+    # --- 读取 ---
+    def load(self, session_key):
+        """
+        重放 session_key 的全部事件。
+
+        返回:
+            SessionState | None: 没有这个会话 (或还没有 start 事件) 时返回 None。
+        """
+        self.flush()
+        rows = self._query("SELECT ts, kind, data FROM events WHERE session_key = ? ORDER BY id", (session_key,))
+        if not rows or rows[0][1] != 'start':
+            return None
+        state = SessionState(session_key)
+        for ts, kind, data in rows:
+            state.apply(ts, kind, json.loads(data) if data else {})
+        return state
+
+    def unfinished_sessions(self, max_age_seconds=24 * 3600):
+        """返回 max_age_seconds 内开始、但没有 finish 事件的会话 key (从新到旧)。"""
+        self.flush()
+        rows = self._query(
+            "SELECT session_key FROM sessions WHERE finished IS NULL AND started >= ? ORDER BY started DESC",
+            (time.time() - max_age_seconds,)
+        )
+        return [row[0] for row in rows]
+
+
+def record_event(journal, kind, ts=None, **data):
+    """journal 为 None 时什么都不做，方便 run_audio_timer 等函数把记录器作为可选参数。"""
+    if journal is not None:
+        journal.record(kind, ts, **data)
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """返回进程内共享的 SessionJournal (首次调用时创建)。"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = SessionJournal()
+        return _journal
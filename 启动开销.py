@@ -0,0 +1,153 @@
+# 启动开销.py
+# 控制冷启动开销：
+#   - lazy_import(): 返回一个模块代理，第一次访问属性时才真正导入 (pygame 在导入时会加载 SDL 并打印欢迎信息)。
+#   - 导入耗时报告：在干净的子进程中用 `python -X importtime` 测量各个入口的导入耗时，
+#     按模块列出累计耗时最高的部分，并和预算比较。
+#
+# 用法:
+#   python 启动开销.py                 # 报告全部入口
+#   python 启动开销.py timer_backend   # 只报告计时后端
+#   python 启动开销.py --top 20 --check  # 超出预算时退出码为 1
+import importlib
+import os
+import sys
+import threading
+import types
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 各入口需要导入的模块和冷启动预算 (毫秒)，预算只统计导入，不包括 mixer 初始化等运行期开销
+STARTUP_TARGETS = {
+    # run_audio_timer / 调度器所在的后端，不应在导入时加载 pygame
+    'timer_backend': (['学习函数', '计时调度器'], 100),
+    # 命令行入口在参数解析之前只导入标准库
+    'cli': (['命令行计时'], 50),
+    # Streamlit 页面的依赖 (页面脚本本身会执行 st.* 调用，不能直接导入)
+    'streamlit_worker': (['streamlit', '学习函数', '计时调度器', '日志存储', '时间记录'], 1500),
+}
+
+
+class LazyModule(types.ModuleType):
+    """
+    延迟导入的模块代理。
+    第一次访问属性 (例如 pygame.mixer、pygame.error) 时才导入真正的模块，之后直接转发。
+    except pygame.error 这样的写法只有在异常真正发生时才会求值，所以也不会提前触发导入。
+    """
+
+    def __init__(self, name, before_import=None):
+        super().__init__(name)
+        object.__setattr__(self, '_lazy_module', None)
+        object.__setattr__(self, '_lazy_lock', threading.Lock())
+        object.__setattr__(self, '_lazy_before_import', before_import)
+
+    def _load(self):
+        module = self._lazy_module
+        if module is None:
+            with self._lazy_lock:
+                module = self._lazy_module
+                if module is None:
+                    if self._lazy_before_import is not None:
+                        self._lazy_before_import()
+                    module = importlib.import_module(self.__name__)
+                    object.__setattr__(self, '_lazy_module', module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def is_loaded(self):
+        return self._lazy_module is not None
+
+
+def _hide_pygame_prompt():
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+
+def lazy_import(name):
+    """
+    返回 name 模块的延迟代理；如果模块已经导入过，直接返回真正的模块。
+    pygame 会在真正导入前设置 PYGAME_HIDE_SUPPORT_PROMPT，不再打印欢迎信息。
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    before_import = _hide_pygame_prompt if name == 'pygame' else None
+    return LazyModule(name, before_import)
+
+
+def measure_import_time(modules, python=None):
+    """
+    在新的子进程中导入 modules，解析 -X importtime 的输出。
+
+    返回:
+        tuple: (total_ms, rows)。rows 是 [(模块名, 自身耗时 ms, 累计耗时 ms)]，按导入顺序排列；
+               total_ms 是 modules 中各顶层模块累计耗时之和。
+    异常:
+        RuntimeError: 子进程导入失败 (例如缺少依赖)。
+    """
+    import subprocess # 后端模块导入本文件只为了 lazy_import，报告相关的依赖在用到时才导入
+
+    code = "; ".join(f"import {module}" for module in modules)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    completed = subprocess.run(
+        [python or sys.executable, '-X', 'importtime', '-c', code],
+        cwd=SCRIPT_DIR, env=env, capture_output=True, text=True
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append((name[1:].rstrip(), int(self_us) / 1000, int(cumulative_us) / 1000)) # 名称前的缩进表示嵌套层级
+    if completed.returncode != 0:
+        last_line = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else ''
+        raise RuntimeError(f"导入 {', '.join(modules)} 失败: {last_line}")
+
+    top_level = set(modules)
+    total_ms = sum(cumulative for name, _, cumulative in rows if name in top_level) # 只统计没有缩进的顶层模块
+    return total_ms, rows
+
+
+def format_report(target, modules, budget_ms, total_ms, rows, top=15):
+    """生成一个入口的文字报告：总耗时、预算、累计耗时最高的 top 个模块。"""
+    status = "OK" if total_ms <= budget_ms else "超出预算"
+    lines = [f"[{target}] {' + '.join(modules)}: {total_ms:.1f} ms (预算 {budget_ms} ms, {status})"]
+    lines.append(f"  {'累计 ms':>9}  {'自身 ms':>9}  模块")
+    for name, self_ms, cumulative_ms in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        lines.append(f"  {cumulative_ms:9.1f}  {self_ms:9.1f}  {name.strip()}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="测量各入口的冷启动导入耗时")
+    parser.add_argument('targets', nargs='*', help=f"要测量的入口 ({', '.join(STARTUP_TARGETS)})，默认全部")
+    parser.add_argument('--top', type=int, default=15, help="每个入口列出的模块数，默认 15")
+    parser.add_argument('--check', action='store_true', help="有入口超出预算或导入失败时退出码为 1")
+    args = parser.parse_args(argv)
+    for target in args.targets:
+        if target not in STARTUP_TARGETS:
+            parser.error(f"未知的入口: {target}")
+
+    over_budget = False
+    for target in args.targets or list(STARTUP_TARGETS):
+        modules, budget_ms = STARTUP_TARGETS[target]
+        try:
+            total_ms, rows = measure_import_time(modules)
+        except RuntimeError as e:
+            print(f"[{target}] {e}")
+            over_budget = True
+            continue
+        print(format_report(target, modules, budget_ms, total_ms, rows, args.top))
+        print()
+        if total_ms > budget_ms:
+            over_budget = True
+    return 1 if args.check and over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
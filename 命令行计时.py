@@ -0,0 +1,225 @@
+# 命令行计时.py
+# 不依赖 Streamlit 的命令行入口，适合内存较小的设备 (例如展台电脑) 直接运行计时器。
+# 只导入 run_audio_timer 需要的模块 (pygame、日志去重、mixer 服务)，不导入 streamlit / pandas / pyarrow。
+#
+# 用法:
+#   python 命令行计时.py --min 3 --max 5 --total 90
+#   python 命令行计时.py --daemon --pid-file /tmp/学习计时.pid --log-file /tmp/学习计时.log
+# 运行中: SIGINT / SIGTERM 停止 (会跳过结束提示音)，SIGUSR1 暂停/继续。
+import argparse
+import os
+import signal
+import sys
+import threading
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 与 streamlit_高效学习.py 中 session_state 的默认值保持一致
+DEFAULT_REGULAR_SOUND = '剑鸣2秒.wav'
+DEFAULT_FINAL_SOUND = 'Eyecatch.wav'
+
+
+class PrintLog(list):
+    """
+    边追加边打印的日志列表。
+    仍然是 list，所以 run_audio_timer 和 log_once 的用法不变；只保留最近 max_lines 条，内存不随运行时长增长。
+    """
+
+    def __init__(self, stream, max_lines=200):
+        super().__init__()
+        self.stream = stream
+        self.max_lines = max_lines
+
+    def append(self, message):
+        super().append(message)
+        if len(self) > self.max_lines:
+            del self[:len(self) - self.max_lines]
+        self.stream.write(message + "\n")
+        self.stream.flush()
+
+
+def resolve_path(path):
+    """相对路径按本脚本所在目录解析 (与 Streamlit 页面的规则相同)。"""
+    path = path.strip()
+    if os.path.isabs(path):
+        return path
+    return os.path.abspath(os.path.join(SCRIPT_DIR, path))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="随机间隔学习提示音 (命令行版本)")
+    parser.add_argument('--min', dest='min_interval_minutes', type=float, default=3, help="最小常规提示音间隔 (分钟)，默认 3")
+    parser.add_argument('--max', dest='max_interval_minutes', type=float, default=5, help="最大常规提示音间隔 (分钟)，默认 5")
+    parser.add_argument('--total', dest='total_duration_minutes', type=float, default=90, help="常规提示音总运行时长 (分钟)，默认 90")
+    parser.add_argument('--regular-sound', default=DEFAULT_REGULAR_SOUND, help="常规提示音文件路径")
+    parser.add_argument('--final-sound', default=DEFAULT_FINAL_SOUND, help="结束提示音文件路径")
+    parser.add_argument('--final-duration', dest='final_duration_seconds', type=float, default=10, help="结束提示音播放时长 (秒)，默认 10")
+    parser.add_argument('--volume', type=float, default=0.1, help="音量 0.0 - 1.0，默认 0.1")
+    parser.add_argument('--daemon', action='store_true', help="转入后台运行 (仅 POSIX)")
+    parser.add_argument('--pid-file', help="后台运行时写入进程号的文件")
+    parser.add_argument('--log-file', help="日志输出文件 (后台运行时默认丢弃日志)")
+    parser.add_argument('--audio', default=os.environ.get('STUDY_TIMER_AUDIO', 'pygame'),
+                        help="音频后端: pygame (默认)、null (不输出声音，只记录播放事件) 或 wav:<目录> (每次播放写一个 WAV 文件)")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="在 127.0.0.1 的这个端口上以 Prometheus 格式导出运行指标 (/metrics)，默认 0 表示不导出")
+    return parser
+
+
+def validate_args(parser, args):
+    """检查参数，错误时通过 parser.error() 退出 (退出码 2)。"""
+    if args.min_interval_minutes <= 0:
+        parser.error("--min 必须大于 0")
+    if args.max_interval_minutes <= args.min_interval_minutes:
+        parser.error("--max 必须大于 --min")
+    if args.total_duration_minutes <= 0:
+        parser.error("--total 必须大于 0")
+    if args.final_duration_seconds < 0:
+        parser.error("--final-duration 不能小于 0")
+    if not 0.0 <= args.volume <= 1.0:
+        parser.error("--volume 必须在 0.0 到 1.0 之间")
+    if not 0 <= args.metrics_port <= 65535:
+        parser.error("--metrics-port 必须在 0 到 65535 之间")
+    if args.audio not in ('pygame', 'null') and not (args.audio.startswith('wav:') and args.audio[4:]):
+        parser.error(f"无法识别的 --audio: {args.audio} (可用: pygame、null、wav:<目录>)")
+    if args.daemon and not hasattr(os, 'fork'):
+        parser.error("--daemon 只支持 POSIX 系统")
+    for option, path in (('--regular-sound', args.regular_sound_path), ('--final-sound', args.final_sound_path)):
+        if not os.path.exists(path):
+            parser.error(f"{option} 文件不存在: {path}")
+
+
+def daemonize(pid_file=None, log_file=None):
+    """
+    标准的两次 fork 转入后台：脱离控制终端，标准输入输出重定向到 log_file (或 /dev/null)。
+    返回后调用者已经在后台的孙进程中运行。
+    """
+    if os.fork() > 0:
+        os._exit(0)
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+
+    os.chdir('/')
+    os.umask(0o022)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    if log_file:
+        out = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    else:
+        out = devnull
+    os.dup2(out, 1)
+    os.dup2(out, 2)
+
+    if pid_file:
+        with open(pid_file, 'w') as f:
+            f.write(f"{os.getpid()}\n")
+
+
+def install_signal_handlers(stop_event, pause_event):
+    """SIGINT / SIGTERM 停止计时，SIGUSR1 在暂停和继续之间切换。"""
+    def handle_stop(signum, frame):
+        stop_event.set()
+
+    def handle_toggle_pause(signum, frame):
+        if pause_event.is_set():
+            pause_event.clear()
+        else:
+            pause_event.set()
+
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, handle_toggle_pause)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    args.regular_sound_path = resolve_path(args.regular_sound)
+    args.final_sound_path = resolve_path(args.final_sound)
+    validate_args(parser, args)
+
+    if args.log_file:
+        args.log_file = os.path.abspath(args.log_file)
+    if args.audio.startswith('wav:'):
+        args.audio = 'wav:' + os.path.abspath(args.audio[4:]) # 后台运行时工作目录会切换到 /
+    if args.pid_file:
+        args.pid_file = os.path.abspath(args.pid_file)
+    if args.daemon:
+        daemonize(args.pid_file, args.log_file)
+        log_stream = sys.stdout
+    elif args.log_file:
+        log_stream = open(args.log_file, 'a', encoding='utf-8')
+    else:
+        log_stream = sys.stdout
+
+    # 在 fork 之后才导入后端 (pygame 更是在第一次使用音频时才导入)：后台进程不继承父进程的 SDL 状态
+    from 学习函数 import create_control_events, run_audio_timer
+    from 时钟 import get_clock
+    from 运行指标 import start_metrics_server
+    from 音频后端 import create_audio_backend
+
+    if args.metrics_port:
+        if start_metrics_server(args.metrics_port) is None:
+            print(f"警告：无法在端口 {args.metrics_port} 上导出运行指标 (端口被占用?)", file=log_stream)
+
+    audio_backend = create_audio_backend(args.audio)
+    stop_event, pause_event = create_control_events()
+    install_signal_handlers(stop_event, pause_event)
+    log_list = PrintLog(log_stream)
+    time_records = []
+    status_data = {
+        'elapsed_time': 0.0,
+        'remaining_time': args.total_duration_minutes * 60,
+        'play_count': 0,
+        'current_status': '正在启动...',
+        'thread_status': 'starting',
+        'start_time': get_clock().time(),
+        'paused_duration': 0.0,
+        'pause_start_time': None,
+        'current_pause_duration_display': 0.0
+    }
+    result = {}
+
+    def target():
+        result['status'] = run_audio_timer(
+            args.min_interval_minutes,
+            args.max_interval_minutes,
+            args.regular_sound_path,
+            args.total_duration_minutes,
+            args.final_sound_path,
+            args.final_duration_seconds,
+            args.volume,
+            log_list,
+            time_records,
+            stop_event,
+            pause_event,
+            status_data,
+            audio_backend=audio_backend
+        )
+
+    # 计时在工作线程中运行，主线程只负责等待和响应信号
+    # (信号处理函数在主线程执行并会 notify 控制事件的 Condition，不能让主线程自己在这个 Condition 上等待)
+    worker = threading.Thread(target=target, name="audio-timer", daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(1.0)
+    finally:
+        audio_backend.flush(timeout=5) # wav 后端在后台写文件
+        if args.daemon and args.pid_file:
+            try:
+                os.remove(args.pid_file)
+            except OSError:
+                pass
+        if log_stream is not sys.stdout:
+            log_stream.close()
+
+    status = result.get('status', 'error')
+    return 1 if status == 'error' else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
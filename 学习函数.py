@@ -2,10 +2,239 @@
 import time
 import random
 import os
-import pygame
 import threading
-import datetime
 import math # 导入 math 用于 floor
+# asyncio / concurrent.futures 只在 asyncio 版本中使用，在函数内部导入，
+# 命令行入口 (命令行计时.py) 使用线程版本时不需要付出它们的导入开销 (约 70 毫秒)
+
+from 音频后端 import get_audio_backend # 音频输出 (默认 pygame 的共享 mixer 和解码缓存；也可以是只记录事件的 null 或 WAV 文件)
+from 日志存储 import log_once # 按 code 去重追加日志 (LogStore 时为 O(1))
+from 会话持久化 import record_event # 可选的会话日志 (进程重启后恢复会话)
+from 时间记录 import append_record # 记录提示音时间 (TimeRecords 时同时记录计划时间)
+from 状态快照 import status_batch # 把一组状态字段的更新合并成一次发布 (UI 不会读到只更新了一半的状态)
+from 文件监视 import file_exists # 提示音文件是否存在 (缓存结果，文件变化时由目录监视失效)
+from 学习历史 import record_session_history # 已结束会话写入历史记录 (Parquet，后台线程写入)
+from 时钟 import get_clock, monotonic_at # 默认的系统时钟 (测试时可以换成 时钟.VirtualClock)
+from 运行指标 import PAUSE_DURATION, PROMPT_LATENESS, PROMPTS_PLAYED, SESSIONS_FINISHED
+
+
+# --- 事件驱动的等待 (替代 0.1 秒轮询) ---
+class ControlEvent(threading.Event):
+    """
+    用法与 threading.Event 完全相同的控制事件。
+    区别在于 set()/clear() 之后会通知一个共享的 threading.Condition，
+    这样计时线程可以在这个 Condition 上一直阻塞到下一个截止时间或控制信号，
+    而不需要每 0.1 秒醒来检查一次标志。
+    """
+
+    def __init__(self, condition):
+        super().__init__()
+        self.condition = condition # 与另一个控制事件共享的 Condition
+
+    def set(self):
+        super().set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def clear(self):
+        super().clear()
+        with self.condition:
+            self.condition.notify_all()
+
+
+def create_control_events():
+    """
+    创建一对共享同一个 Condition 的 (stop_event, pause_event)。
+    把它们传给 run_audio_timer 时，线程会自动使用事件驱动的等待方式。
+    """
+    condition = threading.Condition()
+    return ControlEvent(condition), ControlEvent(condition)
+
+
+def wait_for_control(stop_event, pause_event, predicate, timeout=None, poll_interval=0.1, on_tick=None, clock=None):
+    """
+    阻塞直到 predicate() 为真 (控制信号到达) 或超时。
+
+    如果 stop_event 和 pause_event 是 create_control_events() 创建的 (共享同一个 Condition)，
+    则在 Condition 上阻塞，空闲时几乎没有唤醒；否则退回到原来的按 poll_interval 轮询的方式，
+    每次醒来时调用 on_tick() (用于在轮询模式下保持原来的实时状态更新)。
+
+    参数:
+        predicate (callable): 返回 True 表示应该停止等待。
+        timeout (float | None): 最长等待秒数，None 表示一直等待直到 predicate() 为真。
+        clock: 时钟 (见 时钟.py)，默认使用 get_clock()。VirtualClock 下等待只推进虚拟时间，不真正阻塞。
+
+    返回:
+        bool: True 表示被控制信号唤醒，False 表示等待超时。
+    """
+    if clock is None:
+        clock = get_clock()
+    condition = getattr(stop_event, 'condition', None)
+    if condition is not None and condition is getattr(pause_event, 'condition', None):
+        return clock.wait_for(condition, predicate, timeout)
+
+    # --- 轮询模式 (普通的 threading.Event) ---
+    deadline = None if timeout is None else clock.monotonic() + timeout
+    while not predicate():
+        if deadline is None:
+            step = poll_interval
+        else:
+            step = min(poll_interval, deadline - clock.monotonic())
+            if step <= 0:
+                return False
+        clock.sleep(step)
+        if on_tick is not None:
+            on_tick()
+    return True
+
+
+def get_live_status_values(status_data, now=None):
+    """
+    根据 status_data (或它的 StatusSnapshot) 中的时间戳推算当前的实际运行时间、剩余时间和本次暂停时长。
+
+    事件驱动模式下，线程只在状态变化 (开始等待、提示音、暂停、恢复等) 时写入 status_data，
+    等待期间不再每 0.5 秒写一次，所以 UI 需要用这个函数推算实时值。
+    在轮询模式下推算结果与线程写入的值一致。
+
+    返回:
+        tuple: (elapsed_time, remaining_time, current_pause_duration) 均为秒.
+    """
+    if now is None:
+        now = get_clock().time()
+    thread_status = status_data.get('thread_status')
+    elapsed_time = status_data.get('elapsed_time', 0.0)
+    remaining_time = status_data.get('remaining_time', 0.0)
+    current_pause_duration = status_data.get('current_pause_duration_display', 0.0)
+    start_time = status_data.get('start_time')
+
+    if thread_status == 'running' and start_time is not None:
+        live_elapsed_time = (now - start_time) - status_data.get('paused_duration', 0.0)
+        # 剩余时间 = 上次写入的剩余时间 - 上次写入之后又运行的时间
+        remaining_time = max(0.0, remaining_time - max(0.0, live_elapsed_time - elapsed_time))
+        elapsed_time = max(elapsed_time, live_elapsed_time)
+    elif thread_status == 'paused' and status_data.get('pause_start_time') is not None:
+        current_pause_duration = max(0.0, now - status_data['pause_start_time'])
+
+    return elapsed_time, remaining_time, current_pause_duration
+
+
+def log_session_start(
+    log_list,
+    min_interval_minutes,
+    max_interval_minutes,
+    regular_sound_path,
+    total_duration_minutes,
+    final_sound_path,
+    final_duration_seconds
+):
+    """记录会话启动时的说明信息 (run_audio_timer、run_audio_timer_async 和 计时调度器 共用)。"""
+    log_list.append("--------------------")
+    log_list.append(f"程序已启动。常规提示音将在累计运行 {total_duration_minutes} 分钟后停止。")
+    # 记录使用的文件路径，方便调试
+    log_list.append(f"常规提示音文件: '{regular_sound_path}'")
+    log_list.append(f"结束提示音文件: '{final_sound_path}'")
+    log_list.append(f"在此期间，每隔 {min_interval_minutes}-{max_interval_minutes} 分钟会响起常规提示音。")
+    log_list.append("闭眼休息10秒")
+    log_list.append(f"常规提示音停止后，将播放结束提示音，持续 {final_duration_seconds} 秒，然后程序结束。")
+    log_list.append("休息20分钟，补充钠钾离子，推荐喝电解质饮料。可以买那种电解质粉，加水冲泡后喝，性价比会高很多。")
+    log_list.append("--------------------")
+
+
+def check_sound_files(log_list, status_data, regular_sound_path, final_sound_path):
+    """
+    检查常规和结束提示音文件是否存在 (run_audio_timer、run_audio_timer_async 和 计时调度器 共用)。
+    找不到时记录错误并写入 status_data['current_status']。
+
+    返回:
+        bool: 两个文件都存在时为 True。
+    """
+    # 这里也检查 None 或空字符串，虽然主线程已经检查过，但多一层防御总是好的
+    for path, label in ((regular_sound_path, "常规"), (final_sound_path, "结束")):
+        if not path or not file_exists(path):
+            msg = f"错误：线程内部找不到{label}提示音文件 '{path}'。"
+            log_list.append(msg)
+            status_data['current_status'] = msg # 更新实时状态
+            return False
+    return True
+
+
+def resolve_volume(log_list, volume_control):
+    """
+    检查配置的音量 (run_audio_timer、run_audio_timer_async 和 计时调度器 共用)。
+    在 0.0 到 1.0 之间时原样使用，否则记录警告并使用默认音量 1.0。返回实际使用的音量。
+    """
+    if 0.0 <= volume_control <= 1.0:
+        # 避免频繁重复记录
+        log_once(log_list, 'volume_set', f"音量设置为 {volume_control:.2f} ({volume_control*100:.0f}%)。")
+        return volume_control
+    log_once(log_list, 'volume_invalid', f"警告：配置的音量值 {volume_control} 不在 0.0 到 1.0 的有效范围内。将使用默认音量。")
+    return 1.0
+
+
+def _begin_session(
+    log_list,
+    status_data,
+    journal,
+    min_interval_minutes,
+    max_interval_minutes,
+    regular_sound_path,
+    total_duration_minutes,
+    final_sound_path,
+    final_duration_seconds,
+    volume_control,
+    clock
+):
+    """
+    新启动的会话 (thread_status 为 'starting') 记录开始日志并向会话日志写入 start 事件；
+    从会话日志恢复的会话 (thread_status 为 'resuming') 只记录一条恢复信息。
+    """
+    thread_status = status_data.get('thread_status')
+    if thread_status == 'starting':
+        log_session_start(
+            log_list, min_interval_minutes, max_interval_minutes, regular_sound_path,
+            total_duration_minutes, final_sound_path, final_duration_seconds
+        )
+        record_event(
+            journal, 'start', ts=status_data['start_time'],
+            start_time=status_data['start_time'],
+            min_interval_minutes=min_interval_minutes,
+            max_interval_minutes=max_interval_minutes,
+            regular_sound_path=regular_sound_path,
+            total_duration_minutes=total_duration_minutes,
+            final_sound_path=final_sound_path,
+            final_duration_seconds=final_duration_seconds,
+            volume_control=volume_control
+        )
+    elif thread_status == 'resuming':
+        log_list.append(f"--- 已从会话日志恢复于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(clock.time()))}，计时从断点继续 ---")
+    else:
+        return
+    with status_batch(status_data):
+        status_data['thread_status'] = 'running' # 启动后立即设置为 running
+        status_data['current_status'] = "正在运行..." # 更新初始状态描述
+
+
+def _finish_status_data(status_data, status):
+    """
+    在计时结束时把 status_data 设置为最终状态 (run_audio_timer 和 run_audio_timer_async 共用)。
+    优先保留错误信息或已设置的停止/完成状态。
+    """
+    with status_batch(status_data):
+        if status_data['thread_status'] != 'finished': # 避免重复设置finished状态
+             if status == "completed" and not status_data['current_status'].startswith("错误"):
+                  status_data['current_status'] = "任务完成"
+             elif status == "stopped" and not status_data['current_status'].startswith("错误"):
+                  status_data['current_status'] = "任务已停止"
+             elif status == "error" and not status_data['current_status'].startswith("错误"):
+                  # 如果当前状态不是错误，并且最终状态是 error，设置一个通用错误信息
+                  if status_data['current_status'] not in ['正在启动...', '已接收停止信号，正在终止...', '结束音播放期间中止', '任务已停止']:
+                     status_data['current_status'] = "任务发生错误"
+                  # 如果是启动错误，错误信息已经在前面设置了，保持不变
+
+             status_data['thread_status'] = 'finished' # 标记线程内部状态为完成
+             status_data['pause_start_time'] = None # 清除暂停开始时间
+             status_data['current_pause_duration_display'] = 0.0 # 清除实时暂停时长显示
+
 
 # 将核心逻辑封装在一个函数中
 # 这个函数将在一个单独的线程中运行
@@ -21,7 +250,10 @@ def run_audio_timer(
     time_records, # 用于将时间记录传递给调用者 (Streamlit)
     stop_event, # 用于接收停止信号 (threading.Event)
     pause_event, # 用于接收暂停信号 (threading.Event)
-    status_data # 用于存储实时状态数据的字典
+    status_data, # 用于存储实时状态数据的字典
+    journal=None, # 可选的会话日志记录器 (会话持久化.SessionRecorder)
+    clock=None, # 时钟 (见 时钟.py)，默认 get_clock()；测试时传入 VirtualClock
+    audio_backend=None # 音频后端 (见 音频后端.py)，默认 get_audio_backend()
 ):
     """
     运行音频计时器逻辑。在单独的线程中调用。
@@ -34,18 +266,32 @@ def run_audio_timer(
         final_sound_path (str): 结束提示音文件 **绝对** 路径.
         final_duration_seconds (int): 结束提示音持续时长 (秒).
         volume_control (float): 音量 (0.0 - 1.0).
-        log_list (list): 用于存储日志消息的列表. (会在线程中被修改)
+        log_list (list | LogStore): 用于存储日志消息的列表或 日志存储.LogStore. (会在线程中被修改)
         time_records (list): 用于存储常规提示音响起的时间戳的列表. (会在线程中被修改)
         stop_event (threading.Event): 用于接收外部停止信号的事件对象. (会在主线程中被设置，线程中被检查)
         pause_event (threading.Event): 用于接收外部暂停信号的事件对象. (会在主线程中被设置/清除，线程中被检查/等待)
+                         如果这两个事件由 create_control_events() 创建，线程使用事件驱动的等待 (阻塞到下一个截止时间或控制信号)，
+                         否则使用原来的 0.1 秒轮询等待。
         status_data (dict): 用于存储并向主线程传递实时状态的字典。 (会在线程中被修改)
                          应包含 'elapsed_time', 'remaining_time', 'play_count', 'current_status', 'start_time',
                          'thread_status', 'paused_duration', 'pause_start_time', 'current_pause_duration_display' 键。
+                         从会话日志恢复时传入 SessionState.to_status_data() 的结果 (thread_status 为 'resuming')，
+                         计时按其中的 start_time / paused_duration / play_count 从断点继续；如果恢复前处于暂停状态，
+                         调用方需要同时设置 pause_event。
+        journal (SessionRecorder | None): 会话日志记录器，记录开始、暂停、继续、常规提示音和结束事件。
+        clock: 所有读取时间、睡眠和等待都通过这个时钟。写入状态和会话日志的时间戳用 clock.time() (Unix 时间)，
+                         已运行时间、暂停时长和等待用 clock.monotonic()，不受系统时间跳变影响；
+                         VirtualClock 下整个会话 (提示音、暂停、停止、结束音) 在几毫秒内模拟完成。
+        audio_backend: 声道租用、音频加载和播放都通过这个后端；NullAudioBackend 不初始化 SDL，适合无声卡的服务器和压力测试。
 
     返回:
         str: 表示任务完成状态的字符串 ("completed", "stopped", "error").
     """
 
+    if clock is None:
+        clock = get_clock()
+    audio = audio_backend if audio_backend is not None else get_audio_backend()
+
     # --- 将配置转换为秒 ---
     min_interval_seconds = min_interval_minutes * 60
     max_interval_seconds = max_interval_minutes * 60
@@ -53,8 +299,9 @@ def run_audio_timer(
 
     # 初始化状态变量
     status = "error" # 默认返回状态
-    regular_sound = None
+    regular_sound = None # 指向共享缓存中 Sound 的 SoundHandle
     final_sound = None
+    mixer_lease = None # 从 MixerService 租用的专用声道
 
     # 从 status_data 中读取当前状态，以支持从暂停恢复
     # 这些值是主线程传递进来的，包含了上次运行/暂停时的状态
@@ -62,152 +309,127 @@ def run_audio_timer(
     paused_duration = status_data.get('paused_duration', 0.0) # 累计暂停时长 (从上次结束或暂停时开始)
     pause_start_time = status_data.get('pause_start_time', None) # 当前暂停的开始系统时间 (如果从暂停中恢复，这里会有值)
     start_time = status_data.get('start_time') # 任务开始的系统时间 (第一次运行时在主线程设置)
+    # start_time / pause_start_time 是 Unix 时间 (写入会话日志，页面据此显示)，
+    # 本线程内的已运行时间和暂停时长用单调时钟计算：先把开始时间换算到单调时钟坐标
+    start_mono = monotonic_at(clock, start_time) if start_time is not None else None
+    pause_start_mono = None
 
     # 记录日志到 log_list
     # 首次启动线程时才记录这些初始信息 (通过检查 thread_status 是否是 'starting')
-    if status_data.get('thread_status') == 'starting':
-        log_list.append("--------------------")
-        log_list.append(f"程序已启动。常规提示音将在累计运行 {total_duration_minutes} 分钟后停止。")
-        # 记录使用的文件路径，方便调试
-        log_list.append(f"常规提示音文件: '{regular_sound_path}'")
-        log_list.append(f"结束提示音文件: '{final_sound_path}'")
-        log_list.append(f"在此期间，每隔 {min_interval_minutes}-{max_interval_minutes} 分钟会响起常规提示音。")
-        log_list.append("闭眼休息10秒")
-        log_list.append(f"常规提示音停止后，将播放结束提示音，持续 {final_duration_seconds} 秒，然后程序结束。")
-        log_list.append("休息20分钟，补充钠钾离子，推荐喝电解质饮料。可以买那种电解质粉，加水冲泡后喝，性价比会高很多。")
-        log_list.append("--------------------")
-        status_data['thread_status'] = 'running' # 启动后立即设置为 running
-        status_data['current_status'] = "正在运行..." # 更新初始状态描述
+    _begin_session(
+        log_list, status_data, journal, min_interval_minutes, max_interval_minutes, regular_sound_path,
+        total_duration_minutes, final_sound_path, final_duration_seconds, volume_control, clock
+    )
 
 
     try:
         # --- 检查文件是否存在 (在线程内部再次检查，更安全) ---
         # 注意：这里的路径已经是主线程转换并传递进来的绝对路径
-        # 这里也增加对 None 或空字符串的检查，虽然主线程已经做了，但多一层防御总是好的
-        if not regular_sound_path or not os.path.exists(regular_sound_path):
-            msg = f"错误：线程内部找不到常规提示音文件 '{regular_sound_path}'。"
-            log_list.append(msg)
-            status_data['current_status'] = msg # 更新实时状态
-            status = "error"
-            status_data['thread_status'] = 'finished' # 标记线程结束
-            return status # 立即退出线程
-
-        if not final_sound_path or not os.path.exists(final_sound_path):
-            msg = f"错误：线程内部找不到结束提示音文件 '{final_sound_path}'。"
-            log_list.append(msg)
-            status_data['current_status'] = msg # 更新实时状态
+        if not check_sound_files(log_list, status_data, regular_sound_path, final_sound_path):
             status = "error"
             status_data['thread_status'] = 'finished' # 标记线程结束
             return status # 立即退出线程
 
 
-        # --- 初始化 pygame mixer ---
+        # --- 从共享的 mixer 服务租用专用声道 ---
+        # mixer 在进程内只初始化一次，由所有会话共享；暂停/停止只影响本会话的声道
         try:
-             # 只有当 mixer 未初始化时才初始化，避免从暂停恢复时重复初始化
-             if not pygame.mixer.get_init():
-                 pygame.mixer.init()
+             mixer_lease = audio.acquire()
+             if mixer_lease.initialized_mixer:
                  log_list.append("pygame mixer 初始化成功。")
-             # else:
-                 # log_list.append("pygame mixer 已初始化。") # 从暂停恢复时会打印这个
 
-        except pygame.error as e:
-            msg = f"错误：无法初始化 pygame mixer: {e}"
+        except audio.error as e:
+            msg = f"错误：无法初始化音频输出 ({audio.name}): {e}"
             log_list.append(msg)
             status_data['current_status'] = msg # 更新实时状态
             status = "error"
             status_data['thread_status'] = 'finished' # 标记线程结束
-            return status # 立即退出线程
+            return status # 立即退出线程 (finally 中会归还声道)
+
+        # --- 确定音量 ---
+        # 音量保存在会话自己的 SoundHandle 里，播放时设置到专用声道上，不修改共享的 Sound
+        volume = resolve_volume(log_list, volume_control)
 
         # --- 提前加载音频文件 ---
         try:
-            # 如果音频对象已存在 (从暂停恢复)，则不重新加载
+            # 从进程级缓存获取解码后的共享 Sound，常用的默认提示音只解码一次
             # 这里加载为 Sound 对象，因为 Sound 更灵活，可以重复播放
             # mixer.music 适合播放背景音乐，Sound 适合短促的提示音
-            if regular_sound is None: # 只有当对象未创建时才创建
-                 regular_sound = pygame.mixer.Sound(regular_sound_path)
-            if final_sound is None: # 只有当对象未创建时才创建
-                 final_sound = pygame.mixer.Sound(final_sound_path)
+            regular_sound = audio.load_sound(regular_sound_path, volume)
+            final_sound = audio.load_sound(final_sound_path, volume, streaming=True)
 
-            # 首次加载成功才记录日志
-            if regular_sound is not None and final_sound is not None and "音频文件加载成功" not in "\n".join(log_list[-5:]): # 检查最近几条日志
-                 log_list.append("音频文件加载成功。")
+            # 首次加载成功才记录日志 (检查最近几条日志)
+            log_once(log_list, 'audio_loaded', "音频文件加载成功。")
 
-        except pygame.error as e:
+        except (audio.error, OSError) as e:
             msg = f"错误：无法加载音频文件: {e}"
             log_list.append(msg)
             status_data['current_status'] = msg # 更新实时状态
-            # 清理一下可能已经初始化的 mixer
-            if pygame.mixer.get_init():
-                 pygame.mixer.quit()
-                 log_list.append("pygame mixer 已关闭 (加载错误时)。")
             status = "error"
             status_data['thread_status'] = 'finished' # 标记线程结束
-            return status # 立即退出线程
-
-        # --- 设置音量 ---
-        # 每次线程启动或恢复时都设置一次音量
-        if 0.0 <= volume_control <= 1.0:
-            # 确保音频对象已经成功创建
-            if regular_sound:
-                regular_sound.set_volume(volume_control)
-            if final_sound:
-                final_sound.set_volume(volume_control)
-            if f"音量设置为 {volume_control:.2f}" not in "\n".join(log_list[-5:]): # 避免频繁重复记录
-                 log_list.append(f"音量设置为 {volume_control:.2f} ({volume_control*100:.0f}%)。")
-        else:
-            if "警告：配置的音量值" not in "\n".join(log_list[-5:]): # 避免频繁重复记录
-                 log_list.append(f"警告：配置的音量值 {volume_control} 不在 0.0 到 1.0 的有效范围内。将使用默认音量。")
-                 # 使用默认音量 (通常是 1.0)，但要确保音频对象存在
-                 if regular_sound:
-                     regular_sound.set_volume(1.0)
-                 if final_sound:
-                     final_sound.set_volume(1.0)
+            return status # 立即退出线程 (finally 中会归还声道)
 
 
-        last_status_update_time = time.time() # 用于控制状态更新频率
+        last_status_update_time = clock.monotonic() # 用于控制状态更新频率
+        # 下一个常规提示音的截止时间，以实际运行时间 (不含暂停) 为坐标。
+        # 每次提示音之后从上一个截止时间 (而不是播放结束的时刻) 再加一个随机间隔，播放延迟不会逐次累积；
+        # 暂停只会整体推迟截止时间，恢复后继续等待原来的间隔
+        next_prompt_offset = None
+        prompt_end_time = None # 最近一次常规提示音预计播放结束的时间 (单调时钟)
 
         # 主循环：只要没有收到停止信号
         # 注意：这里的循环条件只检查停止信号，达到总时长在循环内部判断并break
         while not stop_event.is_set():
 
             # 计算当前的实际运行时间
-            current_time = time.time() # 总是获取当前的系统时间
+            current_time = clock.time() # 总是获取当前的系统时间
 
             # --- 检查暂停状态 ---
             if pause_event.is_set():
                 # 如果是刚刚进入暂停状态
                 if status_data.get('thread_status') != 'paused':
-                    status_data['thread_status'] = 'paused'
-                    status_data['current_status'] = "已暂停..."
-                    # 记录本次暂停开始的系统时间
-                    pause_start_time = current_time # 使用当前的系统时间作为暂停开始时间
-                    status_data['pause_start_time'] = pause_start_time
-                    log_list.append(f"\n--- 计时已暂停于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current_time))} ---")
-                    # 清除实时的暂停时长显示，直到进入暂停等待循环
-                    status_data['current_pause_duration_display'] = 0.0
-                    # 停止当前可能还在播放的常规音
-                    pygame.mixer.stop()
-
-
-                # --- 暂停等待循环：在这里实时更新暂停时长 ---
-                last_pause_display_update_time = current_time # 用于控制暂停时长更新频率
-                while pause_event.is_set() and not stop_event.is_set():
-                    current_time_in_pause = time.time()
-                    # 当前这次暂停已经持续的时长
-                    current_pause_duration_in_progress = current_time_in_pause - pause_start_time
-
+                    with status_batch(status_data):
+                        status_data['thread_status'] = 'paused'
+                        status_data['current_status'] = "已暂停..."
+                        # 记录本次暂停开始的系统时间
+                        # 从会话日志恢复的暂停沿用原来的暂停开始时间，否则使用当前的系统时间
+                        if status_data.get('pause_start_time') is None:
+                            status_data['pause_start_time'] = current_time
+                            record_event(journal, 'pause', ts=current_time)
+                        pause_start_time = status_data['pause_start_time']
+                        pause_start_mono = monotonic_at(clock, pause_start_time)
+                        log_list.append(f"\n--- 计时已暂停于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current_time))} ---")
+                        # 清除实时的暂停时长显示，直到进入暂停等待循环
+                        status_data['current_pause_duration_display'] = 0.0
+                    # 停止当前可能还在播放的常规音 (只停本会话的声道)
+                    mixer_lease.stop()
+
+
+                # --- 暂停等待：阻塞到继续或停止信号 ---
+                # 事件驱动模式下整个暂停期间不会醒来，实时暂停时长由 UI 根据 pause_start_time 推算
+                last_pause_display_update_time = clock.monotonic() # 用于控制暂停时长更新频率 (仅轮询模式)
+
+                def _pause_tick():
+                    nonlocal last_pause_display_update_time
+                    current_time_in_pause = clock.monotonic()
                     # 实时更新暂停时长显示 (每隔一定时间)
                     if current_time_in_pause - last_pause_display_update_time > 0.5: # 每0.5秒更新
-                        status_data['current_pause_duration_display'] = current_pause_duration_in_progress
+                        status_data['current_pause_duration_display'] = current_time_in_pause - pause_start_mono
                         last_pause_display_update_time = current_time_in_pause
 
-                    time.sleep(0.1) # 短暂等待并检查标志
+                wait_for_control(
+                    stop_event, pause_event,
+                    lambda: stop_event.is_set() or not pause_event.is_set(),
+                    on_tick=_pause_tick,
+                    clock=clock
+                )
 
                 # 暂停等待结束，检查是停止还是继续
                 if stop_event.is_set():
                     log_list.append("\n收到停止信号，暂停中中止。")
-                    status_data['current_status'] = "已接收停止信号，正在终止..."
-                    status_data['thread_status'] = 'stopping' # 标记正在停止
+                    with status_batch(status_data):
+                        status_data['current_status'] = "已接收停止信号，正在终止..."
+                        status_data['thread_status'] = 'stopping' # 标记正在停止
                     status = "stopped" # 设置返回状态
                     break # 跳出主循环 (包括暂停等待循环和外层 while 循环)
 
@@ -215,16 +437,20 @@ def run_audio_timer(
                 if not pause_event.is_set(): # 此时 stop_event 也不是 set
                     # 计算本次暂停的时长并累加到总累计时长
                     # pause_start_time 在进入暂停时记录，现在用当前时间减去它
-                    current_pause_duration = time.time() - pause_start_time
+                    resume_time = clock.time()
+                    current_pause_duration = clock.monotonic() - pause_start_mono
+                    PAUSE_DURATION.observe(current_pause_duration, runner='thread')
                     paused_duration += current_pause_duration # 累加到总暂停时长
-                    status_data['paused_duration'] = paused_duration
-                    status_data['pause_start_time'] = None # 清除本次暂停开始时间
-                    status_data['current_pause_duration_display'] = 0.0 # 清除实时暂停时长显示
-                    status_data['thread_status'] = 'running' # 标记恢复运行
-                    log_list.append(f"\n--- 计时已恢复于 {time.strftime('%Y-%m-%d %H:%M:%S')} ---")
-                    log_list.append(f"本次暂停时长: {current_pause_duration:.2f} 秒 ({current_pause_duration/60:.2f} 分钟)")
-                    log_list.append(f"累计暂停时长: {paused_duration:.2f} 秒 ({paused_duration/60:.2f} 分钟)")
-                    status_data['current_status'] = "正在运行..." # 恢复运行状态描述
+                    record_event(journal, 'resume', ts=resume_time)
+                    with status_batch(status_data):
+                        status_data['paused_duration'] = paused_duration
+                        status_data['pause_start_time'] = None # 清除本次暂停开始时间
+                        status_data['current_pause_duration_display'] = 0.0 # 清除实时暂停时长显示
+                        status_data['thread_status'] = 'running' # 标记恢复运行
+                        log_list.append(f"\n--- 计时已恢复于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(clock.time()))} ---")
+                        log_list.append(f"本次暂停时长: {current_pause_duration:.2f} 秒 ({current_pause_duration/60:.2f} 分钟)")
+                        log_list.append(f"累计暂停时长: {paused_duration:.2f} 秒 ({paused_duration/60:.2f} 分钟)")
+                        status_data['current_status'] = "正在运行..." # 恢复运行状态描述
                     # 更新 start_time 以便从恢复的时间点开始计算elapsed_time (或者更简单：保持start_time不变，elapsed_time计算时减去paused_duration)
                     # 我们选择保持 start_time 不变，计算 elapsed_time = (current_time - start_time) - paused_duration
 
@@ -233,14 +459,15 @@ def run_audio_timer(
             # 计算实际运行时间 (排除暂停时间)
             # 只有在线程状态是 'running' 时，elapsed_time 和 remaining_time 才应该实时更新
             if status_data.get('thread_status') == 'running':
-                 current_time = time.time() # 再次获取当前时间，确保精确
-                 actual_elapsed_time = (current_time - start_time) - paused_duration
+                 current_time = clock.monotonic() # 再次获取当前时间，确保精确
+                 actual_elapsed_time = (current_time - start_mono) - paused_duration
                  remaining_regular_time = total_duration_seconds - actual_elapsed_time # 线程内部计算的剩余时间
 
                  # --- 实时更新状态数据 (每隔一定时间更新一次，避免过于频繁) ---
                  if current_time - last_status_update_time > 0.5: # 每0.5秒更新一次状态
-                     status_data['elapsed_time'] = actual_elapsed_time # 更新实际运行时间
-                     status_data['remaining_time'] = max(0.0, remaining_regular_time) # 剩余时间不能为负
+                     with status_batch(status_data):
+                         status_data['elapsed_time'] = actual_elapsed_time # 更新实际运行时间
+                         status_data['remaining_time'] = max(0.0, remaining_regular_time) # 剩余时间不能为负
                      last_status_update_time = current_time
                      # Streamlit 主线程通过 st.rerun() 来读取这些更新
 
@@ -248,19 +475,22 @@ def run_audio_timer(
                  # 检查是否已达到常规提示音的总运行时长 (使用实际运行时间)
                  if actual_elapsed_time >= total_duration_seconds:
                      log_list.append("常规提示音总运行时长已达到。准备播放结束提示音。")
-                     status_data['current_status'] = "常规计时结束，准备结束音..."
-                     status_data['thread_status'] = 'finishing_regular' # 标记常规阶段结束
-                     # 确保最终的时间数据在跳出循环前更新
-                     status_data['elapsed_time'] = total_duration_seconds # 达到总时长
-                     status_data['remaining_time'] = 0.0
+                     with status_batch(status_data):
+                         status_data['current_status'] = "常规计时结束，准备结束音..."
+                         status_data['thread_status'] = 'finishing_regular' # 标记常规阶段结束
+                         # 确保最终的时间数据在跳出循环前更新
+                         status_data['elapsed_time'] = total_duration_seconds # 达到总时长
+                         status_data['remaining_time'] = 0.0
                      break # 跳出 while 循环，进入结束处理阶段
 
-                 # --- 计算下一个随机等待时间 ---
+                 # --- 计算到下一个截止时间的等待时间 ---
                  # 只有在还有剩余常规时间的情况下才计算和等待
                  if remaining_regular_time > 0:
-                     wait_seconds = random.uniform(min_interval_seconds, max_interval_seconds)
-                     # 实际等待时间取计算出的随机时间和剩余常规时间中的最小值，确保不会超过总时长
-                     actual_sleep_duration = min(wait_seconds, remaining_regular_time)
+                     if next_prompt_offset is None:
+                         next_prompt_offset = actual_elapsed_time + random.uniform(min_interval_seconds, max_interval_seconds)
+                     # 实际等待时间取到截止时间的时长和剩余常规时间中的最小值，确保不会超过总时长；
+                     # 截止时间已经过去 (例如上一次播放被系统调度延迟) 时立即播放
+                     actual_sleep_duration = min(max(0.0, next_prompt_offset - actual_elapsed_time), remaining_regular_time)
                  else:
                      # 如果没有剩余常规时间，不应该再等待播放常规音了
                      actual_sleep_duration = 0
@@ -273,47 +503,51 @@ def run_audio_timer(
                      log_list.append(f"当前实际运行: {actual_elapsed_time:.2f} 秒 ({actual_elapsed_time/60:.2f} 分钟)")
                      log_list.append(f"常规提示音阶段剩余时间: {remaining_regular_time:.2f} 秒 ({remaining_regular_time/60:.2f} 分钟)")
                      log_list.append(f"下一个常规提示音将在约 {actual_sleep_duration:.2f} 秒 ({actual_sleep_duration/60:.2f} 分钟) 后尝试响起。")
-                     log_list.append(f"当前系统时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current_time))}")
+                     log_list.append(f"当前系统时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(clock.time()))}")
                      log_list.append(f"--------------------")
                      # 更新状态描述，显示等待时长
-                     status_data['current_status'] = f"等待常规提示音... ({math.floor(actual_sleep_duration)} 秒)"
-
-
-                     # --- 分小步等待，并随时检查停止和暂停事件 ---
-                     sleep_interval = 0.1 # 每隔0.1秒检查一次标志
-                     slept_duration = 0
-                     wait_start_time = time.time() # 记录本次等待开始的系统时间
-                     while slept_duration < actual_sleep_duration and not stop_event.is_set() and not pause_event.is_set():
-                         # 根据本次等待开始时间计算已经等待的时长
-                         slept_duration = time.time() - wait_start_time
-                         # 如果已经睡够了，直接 break (避免微小的时间差导致多睡)
-                         if slept_duration >= actual_sleep_duration:
-                              break
-
-                         # 计算下一次实际睡眠时长 (不能超过剩余的等待时长)
-                         current_sleep_step = min(sleep_interval, actual_sleep_duration - slept_duration)
-                         time.sleep(current_sleep_step)
-
-                         # 在等待过程中也实时更新时间信息 (只有在运行状态下)
-                         current_time_inner = time.time()
-                         actual_elapsed_time_inner = (current_time_inner - start_time) - paused_duration
-                         remaining_regular_time_inner = total_duration_seconds - actual_elapsed_time_inner
-
-                         # 检查是否需要更新状态数据
+                     with status_batch(status_data):
+                         status_data['current_status'] = f"等待常规提示音... ({math.floor(actual_sleep_duration)} 秒)"
+
+
+                         # 开始等待前写入一次时间信息，事件驱动模式下等待期间由 UI 推算实时值
+                         status_data['elapsed_time'] = actual_elapsed_time
+                         status_data['remaining_time'] = max(0.0, remaining_regular_time)
+                     last_status_update_time = current_time
+
+                     # --- 等待到截止时间，并随时响应停止和暂停事件 ---
+                     wait_start_time = clock.monotonic() # 记录本次等待开始的时间
+
+                     def _wait_tick():
+                         # 轮询模式下在等待过程中也实时更新时间信息
+                         nonlocal last_status_update_time
+                         current_time_inner = clock.monotonic()
                          if current_time_inner - last_status_update_time > 0.5:
-                             status_data['elapsed_time'] = actual_elapsed_time_inner
-                             status_data['remaining_time'] = max(0.0, remaining_regular_time_inner)
-                             last_status_update_time = current_time_inner
-                             # 更新状态描述，显示剩余等待时长
-                             status_data['current_status'] = f"等待常规提示音... ({max(0, math.floor(actual_sleep_duration - slept_duration))} 秒)"
+                             actual_elapsed_time_inner = (current_time_inner - start_mono) - paused_duration
+                             with status_batch(status_data):
+                                 status_data['elapsed_time'] = actual_elapsed_time_inner
+                                 status_data['remaining_time'] = max(0.0, total_duration_seconds - actual_elapsed_time_inner)
+                                 last_status_update_time = current_time_inner
+                                 # 更新状态描述，显示剩余等待时长
+                                 slept_duration = current_time_inner - wait_start_time
+                                 status_data['current_status'] = f"等待常规提示音... ({max(0, math.floor(actual_sleep_duration - slept_duration))} 秒)"
+
+                     wait_for_control(
+                         stop_event, pause_event,
+                         lambda: stop_event.is_set() or pause_event.is_set(),
+                         timeout=actual_sleep_duration,
+                         on_tick=_wait_tick,
+                         clock=clock
+                     )
 
 
                      # --- 内层等待循环结束 ---
                      # 检查是否是因为停止事件而被唤醒
                      if stop_event.is_set():
                          log_list.append("\n收到停止信号，常规计时阶段等待中中止。")
-                         status_data['current_status'] = "已接收停止信号，正在终止..."
-                         status_data['thread_status'] = 'stopping'
+                         with status_batch(status_data):
+                             status_data['current_status'] = "已接收停止信号，正在终止..."
+                             status_data['thread_status'] = 'stopping'
                          status = "stopped" # 设置返回状态
                          break # 退出外层 while 循环
 
@@ -321,15 +555,16 @@ def run_audio_timer(
 
                      # 如果等待完成（且没有停止或暂停），再次检查是否已超过总时长 (双重保险)
                      # 重新计算实际运行时间，确保准确
-                     current_time_after_sleep = time.time()
-                     actual_elapsed_time_after_sleep = (current_time_after_sleep - start_time) - paused_duration
+                     current_time_after_sleep = clock.monotonic()
+                     actual_elapsed_time_after_sleep = (current_time_after_sleep - start_mono) - paused_duration
                      if actual_elapsed_time_after_sleep >= total_duration_seconds:
                           log_list.append("等待后检查：常规提示音总运行时长已达到，跳出循环。")
-                          status_data['current_status'] = "常规计时结束 (等待后检查)..."
-                          status_data['thread_status'] = 'finishing_regular'
-                          # 确保最终的时间数据在跳出循环前更新
-                          status_data['elapsed_time'] = total_duration_seconds
-                          status_data['remaining_time'] = 0.0
+                          with status_batch(status_data):
+                              status_data['current_status'] = "常规计时结束 (等待后检查)..."
+                              status_data['thread_status'] = 'finishing_regular'
+                              # 确保最终的时间数据在跳出循环前更新
+                              status_data['elapsed_time'] = total_duration_seconds
+                              status_data['remaining_time'] = 0.0
                           break # 确保跳出外层 while 循环
 
 
@@ -338,43 +573,41 @@ def run_audio_timer(
                  # 只有在线程状态是 'running' 时才播放，防止从暂停恢复后立即响或在结束流程中响
                  if status_data.get('thread_status') == 'running' and not stop_event.is_set() and not pause_event.is_set():
                       # 在播放常规提示音前，再次检查是否已超过常规总时长
-                      current_time_before_play = time.time()
-                      actual_elapsed_time_before_play = (current_time_before_play - start_time) - paused_duration
+                      current_time_before_play = clock.monotonic()
+                      actual_elapsed_time_before_play = (current_time_before_play - start_mono) - paused_duration
                       if actual_elapsed_time_before_play >= total_duration_seconds:
                           log_list.append("播放前检查：常规提示音总运行时长已达到，跳过播放常规提示音。")
-                          status_data['current_status'] = "常规计时结束 (播放前检查)..."
-                          status_data['thread_status'] = 'finishing_regular'
-                          status_data['elapsed_time'] = total_duration_seconds
-                          status_data['remaining_time'] = 0.0
+                          with status_batch(status_data):
+                              status_data['current_status'] = "常规计时结束 (播放前检查)..."
+                              status_data['thread_status'] = 'finishing_regular'
+                              status_data['elapsed_time'] = total_duration_seconds
+                              status_data['remaining_time'] = 0.0
                           break # 跳出外层 while 循环
 
                       # 播放常规提示音
                       log_list.append(f"时间到！播放常规提示音 '{os.path.basename(regular_sound_path)}'...")
                       status_data['current_status'] = "播放常规提示音..." # 更新状态
+                      # 本次提示音的计划时间 (系统时间)，用于记录偏差
+                      planned_prompt_time = start_time + paused_duration + next_prompt_offset
                       try:
-                          # 使用 pygame.mixer.Sound.play() 是非阻塞的
+                          # 播放是非阻塞的 (发出后不等待)：声音在本会话的声道上播放，计时线程立即回到等待，
+                          # 期间的停止和暂停会直接停止声道，不必等声音播完
                           if regular_sound: # 确保音频对象存在
-                              regular_sound.play()
+                              mixer_lease.play(regular_sound)
                               # 记录常规提示音响起的绝对时间戳
-                              current_sound_time = time.time()
-                              time_records.append(current_sound_time)
+                              current_sound_time = clock.time()
+                              append_record(time_records, current_sound_time, scheduled=planned_prompt_time)
                               status_data['play_count'] += 1 # 增加播放次数
-                              # log_list.append(f"常规提示音播放完毕 (通过 pygame)。") # pygame.Sound().play() 是非阻塞的，这句会立即打印
-
-                              # 短暂等待，确保声音有机会播放出来，特别是对于很短的声音文件
-                              # 避免因为声音文件损坏或极短导致 get_length() 返回 0 报错
-                              sound_length = regular_sound.get_length()
-                              if sound_length > 0:
-                                  time.sleep(sound_length + 0.1) # 等待声音时长+一点缓冲
-                              else:
-                                   time.sleep(0.5) # 如果声音文件无效或极短，至少等待0.5秒
-
+                              record_event(journal, 'prompt', ts=current_sound_time, scheduled=planned_prompt_time)
+                              PROMPTS_PLAYED.inc(runner='thread')
+                              PROMPT_LATENESS.observe(max(0.0, current_sound_time - planned_prompt_time), runner='thread')
+                              prompt_end_time = clock.monotonic() + max(0.0, regular_sound.get_length())
 
-                          # 播放完毕后，状态描述会立即更新到下一个等待周期开始时的状态描述 (等待约 X 秒...)
+                          # 状态描述会立即更新到下一个等待周期开始时的状态描述 (等待约 X 秒...)
                           # 下一轮循环开始会重新计算 elapsed_time 并更新状态
 
-                      except pygame.error as e:
-                          msg = f"播放常规音频时出错 (pygame)：{e}"
+                      except audio.error as e:
+                          msg = f"播放常规音频时出错 ({audio.name})：{e}"
                           log_list.append(msg)
                           status_data['current_status'] = msg # 更新状态
                       except Exception as e:
@@ -382,6 +615,9 @@ def run_audio_timer(
                           log_list.append(msg)
                           status_data['current_status'] = msg # 更新状态
 
+                      # 下一个截止时间从本次的截止时间算起 (播放失败时也前进，不会立即重试)
+                      next_prompt_offset += random.uniform(min_interval_seconds, max_interval_seconds)
+
                  # 如果因为剩余时间不足导致 actual_sleep_duration 为0，且未达到总时长
                  # 例如 90分钟总时长，还剩5秒，min_interval=3分钟，max_interval=5分钟
                  # 计算出的随机等待可能是3分钟，但 actual_sleep_duration 会变成 5秒
@@ -393,18 +629,28 @@ def run_audio_timer(
             # 如果线程状态不是 'running' (可能是 'paused' 或 'stopping' 等)，则跳过常规运行逻辑，只处理标志检查
             else:
                  # 线程处于暂停、启动、停止等状态，只需要短暂等待并让主循环检查标志
-                 time.sleep(0.1) # 短暂等待
+                 wait_for_control(
+                     stop_event, pause_event,
+                     lambda: stop_event.is_set() or pause_event.is_set(),
+                     timeout=0.1,
+                     clock=clock
+                 )
 
         # --- 外层 While 循环结束后的处理 (总运行时间已达到常规时长 或 收到了停止信号) ---
 
-        # 停止所有可能还在播放的声音
-        pygame.mixer.stop()
+        # 最后一次常规提示音还在播放时，等它播完再播放结束音 (期间仍然响应停止)
+        if status_data.get('thread_status') == 'finishing_regular' and prompt_end_time is not None and mixer_lease.is_playing():
+            wait_for_control(
+                stop_event, pause_event,
+                stop_event.is_set,
+                timeout=max(0.0, prompt_end_time - clock.monotonic()),
+                clock=clock
+            )
+
+        # 停止本会话可能还在播放的声音
+        mixer_lease.stop()
         log_list.append("停止所有正在播放的声音。")
 
-        # 获取循环结束时的准确时间（系统时间）
-        current_time_end_loop = time.time()
-        # 计算最终的实际运行时间 (确保在线程结束前更新一次)
-        # final_actual_elapsed_at_end_of_loop = (current_time_end_loop - start_time) - paused_duration
         # 此时 elapsed_time 应该已经是最终值 (total_duration_seconds 或停止时的值)
 
         # 只有在正常完成常规计时阶段时，才播放结束音
@@ -413,8 +659,9 @@ def run_audio_timer(
             log_list.append("\n====================")
             log_list.append(f"程序已运行达到设定的 {total_duration_minutes} 分钟常规时长。")
             log_list.append(f"开始播放结束提示音 '{os.path.basename(final_sound_path)}'，持续 {final_duration_seconds} 秒...")
-            status_data['current_status'] = "播放结束提示音..." # 更新状态
-            status_data['thread_status'] = 'finishing' # 标记正在播放结束音
+            with status_batch(status_data):
+                status_data['current_status'] = "播放结束提示音..." # 更新状态
+                status_data['thread_status'] = 'finishing' # 标记正在播放结束音
 
             try:
                 # 播放结束提示音
@@ -426,29 +673,19 @@ def run_audio_timer(
                 if final_sound: # 确保音频对象存在
                     log_list.append(f"正在播放结束提示音... ({final_duration_seconds} 秒)")
                     # 播放一次，并设置最大播放时长 (毫秒)
-                    final_sound.play(loops=0, maxtime=final_duration_seconds * 1000)
-
-                    # 等待指定的结束提示音时长，同时检查停止事件
-                    end_sound_slept_duration = 0
-                    sleep_interval = 0.5 # 结束音等待时可以稍微长一点检查标志
-                    end_sound_start_time = time.time() # 记录结束音播放开始时间
-                    while end_sound_slept_duration < final_duration_seconds and not stop_event.is_set():
-                        # 计算已经等待的时长
-                        end_sound_slept_duration = time.time() - end_sound_start_time
-
-                        # 如果已经睡够了，直接 break
-                        if end_sound_slept_duration >= final_duration_seconds:
-                            break
+                    mixer_lease.play(final_sound, maxtime=final_duration_seconds * 1000)
 
-                        # 计算下一次实际睡眠时长 (不能超过剩余的等待时长)
-                        current_sleep_step = min(sleep_interval, final_duration_seconds - end_sound_slept_duration)
-                        time.sleep(current_sleep_step)
+                    # 等待指定的结束提示音时长，同时检查停止事件 (结束音阶段不响应暂停)
+                    wait_for_control(
+                        stop_event, pause_event,
+                        stop_event.is_set,
+                        timeout=final_duration_seconds,
+                        poll_interval=0.5, # 轮询模式下结束音等待时可以稍微长一点检查标志
+                        clock=clock
+                    )
 
-                        # 结束音播放期间也可以更新一下状态 (可选，但可以显示倒计时)
-                        # status_data['current_status'] = f"播放结束音... (剩余约 {max(0, final_duration_seconds - int(end_sound_slept_duration))} 秒)"
-
-                    # 停止所有正在播放的声音 (确保结束音停止)
-                    pygame.mixer.stop()
+                    # 停止本会话正在播放的声音 (确保结束音停止)
+                    mixer_lease.stop()
 
                     if not stop_event.is_set():
                         log_list.append(f"结束提示音播放完毕 ({final_duration_seconds} 秒)。")
@@ -465,8 +702,8 @@ def run_audio_timer(
                     status = "error"
 
 
-            except pygame.error as e:
-                msg = f"播放结束音频时出错 (pygame)：{e}"
+            except audio.error as e:
+                msg = f"播放结束音频时出错 ({audio.name})：{e}"
                 log_list.append(msg)
                 status_data['current_status'] = msg # 更新状态
                 status = "error"
@@ -505,30 +742,379 @@ def run_audio_timer(
 
 
     finally:
-        # --- 清理 pygame mixer ---
-        # 只有在 mixer 被成功初始化过才尝试退出
-        if pygame.mixer.get_init():
-             pygame.mixer.quit()
-             log_list.append("pygame mixer 已关闭。")
-        log_list.append(f"当前系统时间 (结束): {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        # --- 归还 mixer 声道 ---
+        # mixer 由进程内所有会话共享，这里不关闭 mixer，只停止并归还本会话的声道
+        if mixer_lease is not None:
+             mixer_lease.release()
+             log_list.append("已归还音频声道。")
+        log_list.append(f"当前系统时间 (结束): {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(clock.time()))}")
         log_list.append(f"任务结束处理完成。")
 
+        record_session_history(journal, status_data, time_records, status, 'thread', total_duration_minutes, clock.time())
         # 确保 status_data['current_status'] 和 status_data['thread_status'] 反映最终状态
-        # 优先保留错误信息或已设置的停止/完成状态
-        if status_data['thread_status'] != 'finished': # 避免重复设置finished状态
-             if status == "completed" and not status_data['current_status'].startswith("错误"):
-                  status_data['current_status'] = "任务完成"
-             elif status == "stopped" and not status_data['current_status'].startswith("错误"):
-                  status_data['current_status'] = "任务已停止"
-             elif status == "error" and not status_data['current_status'].startswith("错误"):
-                  # 如果当前状态不是错误，并且最终状态是 error，设置一个通用错误信息
-                  if status_data['current_status'] not in ['正在启动...', '已接收停止信号，正在终止...', '结束音播放期间中止', '任务已停止']:
-                     status_data['current_status'] = "任务发生错误"
-                  # 如果是启动错误，错误信息已经在前面设置了，保持不变
-
-             status_data['thread_status'] = 'finished' # 标记线程内部状态为完成
-             status_data['pause_start_time'] = None # 清除暂停开始时间
-             status_data['current_pause_duration_display'] = 0.0 # 清除实时暂停时长显示
+        _finish_status_data(status_data, status)
+        if journal is not None and journal.started:
+            record_event(journal, 'finish', result=status)
+        SESSIONS_FINISHED.inc(runner='thread', result=status)
 
         # 返回最终状态
-        return status
\ No newline at end of file
+        return status
+
+
+# --- asyncio 版本 ---
+# 一个事件循环 (例如 Streamlit 自己运行的 Tornado 事件循环) 可以驱动大量会话，而不需要为每个会话开线程。
+# 可能阻塞的 pygame 调用 (mixer 初始化、解码、播放/停止) 放到一个小线程池中执行。
+_audio_executor = None
+_audio_executor_lock = threading.Lock()
+
+
+def _get_audio_executor():
+    """返回执行 pygame 阻塞调用的共享线程池 (首次调用时创建)。"""
+    global _audio_executor
+    import concurrent.futures
+
+    with _audio_executor_lock:
+        if _audio_executor is None:
+            _audio_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="audio")
+        return _audio_executor
+
+
+class AsyncControlEvent:
+    """
+    asyncio 版本的控制事件，接口与 threading.Event 相同 (set/clear/is_set)。
+
+    set()/clear() 会唤醒共享同一个等待集合的所有协程 (用 add_waiter() 登记的 Future)。它们必须在事件循环所在的
+    线程中调用；从其他线程 (例如 Streamlit 的脚本线程) 控制时使用 loop.call_soon_threadsafe(event.set)。
+    """
+
+    def __init__(self, waiters):
+        self._flag = False
+        self._waiters = waiters # 与另一个控制事件共享的 Future 集合
+
+    def is_set(self):
+        return self._flag
+
+    def set(self):
+        self._flag = True
+        self._wake()
+
+    def clear(self):
+        self._flag = False
+        self._wake()
+
+    def add_waiter(self, waiter):
+        """登记一个 asyncio.Future，这一对控制事件中任何一个 set()/clear() 时完成它。"""
+        self._waiters.add(waiter)
+
+    def discard_waiter(self, waiter):
+        """取消登记 (等待结束后调用，可以重复调用)。"""
+        self._waiters.discard(waiter)
+
+    def _wake(self):
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+def create_async_control_events():
+    """创建一对共享等待集合的 (stop_event, pause_event)，用于 run_audio_timer_async。"""
+    waiters = set()
+    return AsyncControlEvent(waiters), AsyncControlEvent(waiters)
+
+
+async def async_wait_for_control(stop_event, predicate, timeout=None, clock=None):
+    """
+    wait_for_control 的 asyncio 版本：挂起直到 predicate() 为真或超时，不占用线程。
+
+    参数:
+        clock: 虚拟时钟 (时钟.VirtualClock) 时不挂起，与 wait_for_control 相同地只推进虚拟时间；
+               其他时钟 (或 None) 时由事件循环的单调时钟计时。
+
+    返回:
+        bool: True 表示被控制信号唤醒，False 表示等待超时。
+    """
+    import asyncio
+
+    if clock is not None and clock.virtual:
+        return clock.wait_for(None, predicate, timeout)
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    while not predicate():
+        remaining = None if deadline is None else deadline - loop.time()
+        if remaining is not None and remaining <= 0:
+            return False
+        waiter = loop.create_future()
+        stop_event.add_waiter(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=remaining)
+        finally:
+            stop_event.discard_waiter(waiter)
+    return True
+
+
+async def run_audio_timer_async(
+    min_interval_minutes,
+    max_interval_minutes,
+    regular_sound_path,
+    total_duration_minutes,
+    final_sound_path,
+    final_duration_seconds,
+    volume_control,
+    log_list,
+    time_records,
+    stop_event, # create_async_control_events() 创建的停止事件
+    pause_event, # create_async_control_events() 创建的暂停事件
+    status_data,
+    journal=None,
+    audio_backend=None,
+    clock=None
+):
+    """
+    run_audio_timer 的 asyncio 版本，参数 (包括 journal、audio_backend、clock) 和 log_list / time_records /
+    status_data 的输出与其相同。
+
+    区别:
+        - 等待使用 async_wait_for_control()，在截止时间或控制信号到来前不占用任何线程。
+        - stop_event/pause_event 是 AsyncControlEvent (见 create_async_control_events())。
+        - pygame 调用在 _get_audio_executor() 的小线程池中执行，不阻塞事件循环。
+        - clock 为 VirtualClock 时等待只推进虚拟时间 (见 async_wait_for_control())，整个会话在几毫秒内模拟完成。
+
+    返回:
+        str: 表示任务完成状态的字符串 ("completed", "stopped", "error").
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    executor = _get_audio_executor()
+    if clock is None:
+        clock = get_clock() # 时间戳和已运行时间；等待由事件循环的单调时钟计时
+    audio = audio_backend if audio_backend is not None else get_audio_backend()
+
+    min_interval_seconds = min_interval_minutes * 60
+    max_interval_seconds = max_interval_minutes * 60
+    total_duration_seconds = total_duration_minutes * 60
+
+    status = "error"
+    mixer_lease = None
+    paused_duration = status_data.get('paused_duration', 0.0)
+    start_time = status_data.get('start_time')
+    if start_time is None:
+        start_time = status_data['start_time'] = clock.time()
+    start_mono = monotonic_at(clock, start_time) # 已运行时间用单调时钟计算，见 run_audio_timer
+
+    _begin_session(
+        log_list, status_data, journal, min_interval_minutes, max_interval_minutes, regular_sound_path,
+        total_duration_minutes, final_sound_path, final_duration_seconds, volume_control, clock
+    )
+
+    try:
+        # --- 检查文件是否存在 ---
+        if not check_sound_files(log_list, status_data, regular_sound_path, final_sound_path):
+            return status
+
+        # --- 租用声道、加载音频 (在线程池中执行) ---
+        try:
+            mixer_lease = await loop.run_in_executor(executor, audio.acquire)
+            if mixer_lease.initialized_mixer:
+                log_list.append("pygame mixer 初始化成功。")
+        except audio.error as e:
+            msg = f"错误：无法初始化音频输出 ({audio.name}): {e}"
+            log_list.append(msg)
+            status_data['current_status'] = msg
+            return status
+
+        volume = resolve_volume(log_list, volume_control)
+
+        try:
+            regular_sound = await loop.run_in_executor(executor, audio.load_sound, regular_sound_path, volume)
+            final_sound = await loop.run_in_executor(executor, audio.load_sound, final_sound_path, volume, True)
+            log_once(log_list, 'audio_loaded', "音频文件加载成功。")
+        except (audio.error, OSError) as e:
+            msg = f"错误：无法加载音频文件: {e}"
+            log_list.append(msg)
+            status_data['current_status'] = msg
+            return status
+
+        next_prompt_offset = None # 下一个常规提示音的截止时间 (实际运行时间坐标，见 run_audio_timer)
+        prompt_end_time = None # 单调时钟
+
+        # --- 主循环 ---
+        while not stop_event.is_set():
+            # --- 暂停 ---
+            if pause_event.is_set():
+                with status_batch(status_data):
+                    if status_data.get('pause_start_time') is None: # 恢复的暂停沿用原来的开始时间
+                        status_data['pause_start_time'] = clock.time()
+                        record_event(journal, 'pause', ts=status_data['pause_start_time'])
+                    pause_start_time = status_data['pause_start_time']
+                    pause_start_mono = monotonic_at(clock, pause_start_time)
+                    status_data['thread_status'] = 'paused'
+                    status_data['current_status'] = "已暂停..."
+                    status_data['current_pause_duration_display'] = 0.0
+                log_list.append(f"\n--- 计时已暂停于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(pause_start_time))} ---")
+                await loop.run_in_executor(executor, mixer_lease.stop)
+
+                # 实时暂停时长由 UI 根据 pause_start_time 推算 (见 get_live_status_values)
+                await async_wait_for_control(stop_event, lambda: stop_event.is_set() or not pause_event.is_set(), clock=clock)
+                if stop_event.is_set():
+                    log_list.append("\n收到停止信号，暂停中中止。")
+                    with status_batch(status_data):
+                        status_data['current_status'] = "已接收停止信号，正在终止..."
+                        status_data['thread_status'] = 'stopping'
+                    status = "stopped"
+                    break
+
+                resume_time = clock.time()
+                current_pause_duration = clock.monotonic() - pause_start_mono
+                PAUSE_DURATION.observe(current_pause_duration, runner='async')
+                paused_duration += current_pause_duration
+                record_event(journal, 'resume', ts=resume_time)
+                with status_batch(status_data):
+                    status_data['paused_duration'] = paused_duration
+                    status_data['pause_start_time'] = None
+                    status_data['current_pause_duration_display'] = 0.0
+                    status_data['thread_status'] = 'running'
+                    log_list.append(f"\n--- 计时已恢复于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(clock.time()))} ---")
+                    log_list.append(f"本次暂停时长: {current_pause_duration:.2f} 秒 ({current_pause_duration/60:.2f} 分钟)")
+                    log_list.append(f"累计暂停时长: {paused_duration:.2f} 秒 ({paused_duration/60:.2f} 分钟)")
+                    status_data['current_status'] = "正在运行..."
+
+            # --- 等待下一个常规提示音 ---
+            actual_elapsed_time = (clock.monotonic() - start_mono) - paused_duration
+            remaining_regular_time = total_duration_seconds - actual_elapsed_time
+            with status_batch(status_data):
+                status_data['elapsed_time'] = actual_elapsed_time
+                status_data['remaining_time'] = max(0.0, remaining_regular_time)
+
+            if actual_elapsed_time >= total_duration_seconds:
+                log_list.append("常规提示音总运行时长已达到。准备播放结束提示音。")
+                with status_batch(status_data):
+                    status_data['current_status'] = "常规计时结束，准备结束音..."
+                    status_data['thread_status'] = 'finishing_regular'
+                    status_data['elapsed_time'] = total_duration_seconds
+                    status_data['remaining_time'] = 0.0
+                break
+
+            if next_prompt_offset is None:
+                next_prompt_offset = actual_elapsed_time + random.uniform(min_interval_seconds, max_interval_seconds)
+            actual_sleep_duration = min(max(0.0, next_prompt_offset - actual_elapsed_time), remaining_regular_time)
+            log_list.append(f"\n--------------------")
+            log_list.append(f"当前实际运行: {actual_elapsed_time:.2f} 秒 ({actual_elapsed_time/60:.2f} 分钟)")
+            log_list.append(f"常规提示音阶段剩余时间: {remaining_regular_time:.2f} 秒 ({remaining_regular_time/60:.2f} 分钟)")
+            log_list.append(f"下一个常规提示音将在约 {actual_sleep_duration:.2f} 秒 ({actual_sleep_duration/60:.2f} 分钟) 后尝试响起。")
+            log_list.append(f"当前系统时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(clock.time()))}")
+            log_list.append(f"--------------------")
+            status_data['current_status'] = f"等待常规提示音... ({math.floor(actual_sleep_duration)} 秒)"
+
+            await async_wait_for_control(
+                stop_event, lambda: stop_event.is_set() or pause_event.is_set(), timeout=actual_sleep_duration, clock=clock
+            )
+            if stop_event.is_set():
+                log_list.append("\n收到停止信号，常规计时阶段等待中中止。")
+                with status_batch(status_data):
+                    status_data['current_status'] = "已接收停止信号，正在终止..."
+                    status_data['thread_status'] = 'stopping'
+                status = "stopped"
+                break
+            if pause_event.is_set():
+                continue # 下一轮循环开始时处理暂停
+
+            if (clock.monotonic() - start_mono) - paused_duration >= total_duration_seconds:
+                log_list.append("等待后检查：常规提示音总运行时长已达到，跳出循环。")
+                with status_batch(status_data):
+                    status_data['current_status'] = "常规计时结束 (等待后检查)..."
+                    status_data['thread_status'] = 'finishing_regular'
+                    status_data['elapsed_time'] = total_duration_seconds
+                    status_data['remaining_time'] = 0.0
+                break
+
+            # --- 播放常规提示音 ---
+            log_list.append(f"时间到！播放常规提示音 '{os.path.basename(regular_sound_path)}'...")
+            status_data['current_status'] = "播放常规提示音..."
+            planned_prompt_time = start_time + paused_duration + next_prompt_offset
+            try:
+                # 发出后不等待播放结束，停止和暂停会直接停止声道
+                await loop.run_in_executor(executor, mixer_lease.play, regular_sound)
+                current_sound_time = clock.time()
+                append_record(time_records, current_sound_time, scheduled=planned_prompt_time)
+                status_data['play_count'] += 1
+                record_event(journal, 'prompt', ts=current_sound_time, scheduled=planned_prompt_time)
+                PROMPTS_PLAYED.inc(runner='async')
+                PROMPT_LATENESS.observe(max(0.0, current_sound_time - planned_prompt_time), runner='async')
+                prompt_end_time = clock.monotonic() + max(0.0, regular_sound.get_length())
+            except audio.error as e:
+                msg = f"播放常规音频时出错 ({audio.name})：{e}"
+                log_list.append(msg)
+                status_data['current_status'] = msg
+            except Exception as e:
+                msg = f"播放常规音频时发生未知错误：{e}"
+                log_list.append(msg)
+                status_data['current_status'] = msg
+            next_prompt_offset += random.uniform(min_interval_seconds, max_interval_seconds)
+
+        # --- 结束处理 ---
+        # 最后一次常规提示音还在播放时，等它播完再播放结束音
+        if status_data.get('thread_status') == 'finishing_regular' and prompt_end_time is not None and mixer_lease.is_playing():
+            await async_wait_for_control(
+                stop_event, stop_event.is_set, timeout=max(0.0, prompt_end_time - clock.monotonic()), clock=clock
+            )
+        await loop.run_in_executor(executor, mixer_lease.stop)
+        log_list.append("停止所有正在播放的声音。")
+
+        if status_data.get('thread_status') == 'finishing_regular' and not stop_event.is_set():
+            log_list.append("\n====================")
+            log_list.append(f"程序已运行达到设定的 {total_duration_minutes} 分钟常规时长。")
+            log_list.append(f"开始播放结束提示音 '{os.path.basename(final_sound_path)}'，持续 {final_duration_seconds} 秒...")
+            with status_batch(status_data):
+                status_data['current_status'] = "播放结束提示音..."
+                status_data['thread_status'] = 'finishing'
+            try:
+                log_list.append(f"正在播放结束提示音... ({final_duration_seconds} 秒)")
+                await loop.run_in_executor(executor, lambda: mixer_lease.play(final_sound, maxtime=final_duration_seconds * 1000))
+                await async_wait_for_control(stop_event, stop_event.is_set, timeout=final_duration_seconds, clock=clock)
+                await loop.run_in_executor(executor, mixer_lease.stop)
+                if not stop_event.is_set():
+                    log_list.append(f"结束提示音播放完毕 ({final_duration_seconds} 秒)。")
+                    status_data['current_status'] = "任务完成"
+                    status = "completed"
+                else:
+                    log_list.append(f"播放结束音期间收到停止信号，提前中止。")
+                    status_data['current_status'] = "结束音播放期间中止"
+                    status = "stopped"
+            except audio.error as e:
+                msg = f"播放结束音频时出错 ({audio.name})：{e}"
+                log_list.append(msg)
+                status_data['current_status'] = msg
+                status = "error"
+            except Exception as e:
+                msg = f"播放结束音频时发生未知错误：{e}"
+                log_list.append(msg)
+                status_data['current_status'] = msg
+                status = "error"
+
+        elif stop_event.is_set():
+            log_list.append("\n收到停止信号，程序中止。")
+            if not status_data['current_status'].startswith("错误"):
+                status_data['current_status'] = "任务已停止"
+            status = "stopped"
+
+    except Exception as e:
+        msg = f"程序运行过程中发生未捕获的异常: {e}"
+        log_list.append(msg)
+        status_data['current_status'] = msg
+        status = "error"
+
+    finally:
+        if mixer_lease is not None:
+            await loop.run_in_executor(executor, mixer_lease.release)
+            log_list.append("已归还音频声道。")
+        log_list.append(f"当前系统时间 (结束): {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(clock.time()))}")
+        log_list.append(f"任务结束处理完成。")
+        record_session_history(journal, status_data, time_records, status, 'async', total_duration_minutes, clock.time())
+        _finish_status_data(status_data, status)
+        if journal is not None and journal.started:
+            record_event(journal, 'finish', result=status)
+        SESSIONS_FINISHED.inc(runner='async', result=status)
+
+    return status
+
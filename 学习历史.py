@@ -0,0 +1,333 @@
+# 学习历史.py
+# 已结束会话的历史记录 (Parquet，按月分区)，以及历史页面 (pages/历史统计.py) 用的统计。
+#
+# 目录结构 (Hive 风格分区，分区键是会话开始时间所在的本地月份):
+#   .history/sessions/month=2026-10/<开始时间>-<会话 key>.parquet   每个会话一行
+#   .history/prompts/month=2026-10/<开始时间>-<会话 key>.parquet    每次常规提示音一行
+# 每个会话结束时写一个小文件 (后台线程写入，不阻塞调度线程)；某个月的小文件达到 COMPACT_MIN_FILES 个时
+# 合并成一个按开始时间排序的文件，一年的历史只有几十个文件。Streamlit 进程和计时后台服务可能同时写同一个月，
+# 合并前在分区目录里独占创建 .compact.lock，同一时间只有一个进程合并。读取时按 月份分区 + start_time 列统计信息
+# 过滤 (谓词下推)，只读需要的分区和行组。
+#
+# 只记录有会话日志 (journal) 的会话，与 record_event 相同：页面和计时后台服务的会话都有会话日志，
+# 性能基准和测试不写历史。pyarrow / pandas 在写入和查询时才导入，计时后端导入本模块没有额外开销。
+import os
+import threading
+import time
+import uuid
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HISTORY_DIR = os.path.join(SCRIPT_DIR, '.history')
+
+COMPACT_MIN_FILES = 16 # 一个月的分区里小文件达到这个数量时合并
+COMPACT_ROW_GROUP_ROWS = 4096 # 合并后文件的行组大小，行组越小按时间过滤时跳过的数据越多
+COMPACT_LOCK_STALE_SECONDS = 600 # 合并锁文件存在超过这么久，当作合并中途退出的进程留下的
+
+SESSION_COLUMNS = (
+    'session_key', 'runner', 'result', 'day', 'start_time', 'end_time',
+    'elapsed_time', 'paused_duration', 'play_count', 'total_duration_minutes',
+)
+PROMPT_COLUMNS = ('session_key', 'start_time', 'prompt_index', 'played_time', 'scheduled_time')
+
+
+def _schemas():
+    import pyarrow as pa
+
+    sessions = pa.schema([
+        ('session_key', pa.string()),
+        ('runner', pa.string()), # 'scheduler', 'thread', 'async'
+        ('result', pa.string()), # 'completed', 'stopped', 'error'
+        ('day', pa.string()), # 开始时间所在的本地日期 YYYY-MM-DD (写入时计算，按天统计不需要时区换算)
+        ('start_time', pa.float64()), # Unix 时间 (秒)
+        ('end_time', pa.float64()),
+        ('elapsed_time', pa.float64()), # 实际学习时长 (秒，不含暂停)
+        ('paused_duration', pa.float64()),
+        ('play_count', pa.int32()),
+        ('total_duration_minutes', pa.float64()),
+    ])
+    prompts = pa.schema([
+        ('session_key', pa.string()),
+        ('start_time', pa.float64()), # 所属会话的开始时间，和会话表使用相同的过滤条件
+        ('prompt_index', pa.int32()),
+        ('played_time', pa.float64()),
+        ('scheduled_time', pa.float64()), # 计划时间，未知时为 NaN
+    ])
+    return sessions, prompts
+
+
+def _month(timestamp):
+    return time.strftime('%Y-%m', time.localtime(timestamp))
+
+
+def _write_atomic(table, path, row_group_size=None):
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 以 '.' 开头的临时文件会被数据集扫描忽略，读取方不会读到写了一半的文件
+    temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        pq.write_table(table, temp_path, row_group_size=row_group_size)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_session(history_dir, session_row, prompt_rows):
+    """
+    写入一个会话 (session_row 是 SESSION_COLUMNS 的字典，prompt_rows 是 [(实际时间, 计划时间或 None)])。
+    先写提示音再写会话，读取方看到会话时它的提示音一定已经存在。
+
+    异常:
+        ImportError: 没有安装 pyarrow。
+        OSError: 写文件失败。
+    """
+    import pyarrow as pa
+
+    session_schema, prompt_schema = _schemas()
+    partition = f"month={_month(session_row['start_time'])}"
+    name = f"{int(session_row['start_time'])}-{session_row['session_key']}.parquet"
+    prompts = pa.table({
+        'session_key': [session_row['session_key']] * len(prompt_rows),
+        'start_time': [session_row['start_time']] * len(prompt_rows),
+        'prompt_index': list(range(len(prompt_rows))),
+        'played_time': [played_time for played_time, _ in prompt_rows],
+        'scheduled_time': [float('nan') if scheduled is None else scheduled for _, scheduled in prompt_rows],
+    }, schema=prompt_schema)
+    _write_atomic(prompts, os.path.join(history_dir, 'prompts', partition, name))
+    _write_atomic(pa.Table.from_pylist([session_row], schema=session_schema),
+                  os.path.join(history_dir, 'sessions', partition, name))
+    for table_name in ('prompts', 'sessions'):
+        compact_partition(os.path.join(history_dir, table_name, partition))
+
+
+def compact_partition(partition_dir, min_files=COMPACT_MIN_FILES):
+    """
+    把一个月份分区里的小文件合并成一个按 start_time 排序的文件，返回是否合并。
+    合并后的文件先原子地写好再删除旧文件；两者之间读到的重复行由 load_history 去重。
+    其他进程正在合并这个分区 (持有 .compact.lock) 时直接返回 False，下次写入时再检查。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if len(_partition_files(partition_dir)) < min_files:
+        return False
+    lock_path = os.path.join(partition_dir, '.compact.lock')
+    if not _acquire_lock(lock_path):
+        return False
+    try:
+        # 拿到锁之后重新列出文件：等锁期间其他进程可能已经合并过
+        names = _partition_files(partition_dir)
+        if len(names) < min_files:
+            return False
+        paths = [os.path.join(partition_dir, name) for name in names]
+        # 用 ParquetFile 读取单个文件，不会把目录名里的 month 当作分区列加进来
+        table = pa.concat_tables([pq.ParquetFile(path).read() for path in paths]).sort_by('start_time')
+        _write_atomic(table, os.path.join(partition_dir, f"compacted-{int(time.time())}-{uuid.uuid4().hex[:8]}.parquet"),
+                      row_group_size=COMPACT_ROW_GROUP_ROWS)
+        for path in paths:
+            os.remove(path)
+        return True
+    finally:
+        os.remove(lock_path)
+
+
+def _partition_files(partition_dir):
+    return sorted(name for name in os.listdir(partition_dir) if name.endswith('.parquet') and not name.startswith('.'))
+
+
+def _acquire_lock(lock_path):
+    """独占创建锁文件，返回是否成功。超过 COMPACT_LOCK_STALE_SECONDS 的锁文件删除后重试一次。"""
+    for attempt in range(2):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if attempt > 0 or time.time() - os.stat(lock_path).st_mtime < COMPACT_LOCK_STALE_SECONDS:
+                    return False
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass # 持有锁的进程刚好释放，重试
+    return False
+
+
+class SessionHistory:
+    """
+    历史记录的写入方：record() 只把会话放进队列，后台线程写 Parquet (写入和合并可能需要几十毫秒，
+    不能在持有调度器锁的调度线程里做)。pyarrow 不可用或写入失败时只计数，不影响计时。
+    """
+
+    def __init__(self, history_dir=DEFAULT_HISTORY_DIR):
+        self.history_dir = history_dir
+        self._condition = threading.Condition()
+        self._pending = [] # (session_row, prompt_rows)
+        self._writing = False
+        self._thread = None
+        self.written = 0
+        self.failures = 0
+
+    def record(self, session_row, prompt_rows):
+        with self._condition:
+            self._pending.append((session_row, prompt_rows))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="SessionHistory", daemon=True)
+                self._thread.start()
+            else:
+                self._condition.notify()
+
+    def flush(self, timeout=None):
+        """等待队列中的会话写完，返回是否在 timeout 秒内完成。"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def _run(self):
+        with self._condition:
+            while True:
+                self._condition.wait_for(lambda: self._pending)
+                batch, self._pending = self._pending, []
+                self._writing = True
+                self._condition.release()
+                try:
+                    for session_row, prompt_rows in batch:
+                        try:
+                            write_session(self.history_dir, session_row, prompt_rows)
+                            self.written += 1
+                        except (ImportError, OSError, ValueError):
+                            self.failures += 1
+                finally:
+                    self._condition.acquire()
+                    self._writing = False
+                    self._condition.notify_all()
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """返回进程内共享的 SessionHistory (首次调用时创建)。"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = SessionHistory()
+        return _history
+
+
+def record_session_history(journal, status_data, time_records, result, runner, total_duration_minutes, now):
+    """
+    会话结束时调用 (在清除 pause_start_time 之前)：把最终的学习时长、暂停时长和提示音时间放进历史记录队列。
+    journal 为 None (没有会话日志) 或会话没有开始时什么都不做。
+    """
+    start_time = status_data.get('start_time')
+    if journal is None or not journal.started or start_time is None:
+        return
+    paused_duration = status_data.get('paused_duration', 0.0)
+    pause_start_time = status_data.get('pause_start_time')
+    if pause_start_time is not None: # 暂停中结束：这次暂停也算进暂停时长
+        paused_duration += max(0.0, now - pause_start_time)
+    total_duration_seconds = total_duration_minutes * 60
+    if result == 'completed':
+        elapsed_time = total_duration_seconds
+    else:
+        elapsed_time = min(total_duration_seconds, max(0.0, (now - start_time) - paused_duration))
+    if hasattr(time_records, 'since'):
+        prompt_rows = time_records.since(0)
+    else:
+        prompt_rows = [(played_time, None) for played_time in time_records]
+    get_history().record({
+        'session_key': journal.session_key,
+        'runner': runner,
+        'result': result,
+        'day': time.strftime('%Y-%m-%d', time.localtime(start_time)),
+        'start_time': start_time,
+        'end_time': now,
+        'elapsed_time': elapsed_time,
+        'paused_duration': paused_duration,
+        'play_count': len(prompt_rows),
+        'total_duration_minutes': float(total_duration_minutes),
+    }, prompt_rows)
+
+
+# --- 查询 ---
+def history_signature(history_dir=DEFAULT_HISTORY_DIR):
+    """
+    各月份分区目录的修改时间 (元组)。分区里新增、合并或删除文件时目录的修改时间会变化，
+    页面用它作为查询缓存键的一部分，历史没有变化时不重新读取。
+    """
+    signature = []
+    for table_name in ('sessions', 'prompts'):
+        try:
+            with os.scandir(os.path.join(history_dir, table_name)) as entries:
+                signature.extend((table_name, entry.name, entry.stat().st_mtime_ns)
+                                 for entry in entries if entry.is_dir())
+        except FileNotFoundError:
+            pass
+    return tuple(sorted(signature))
+
+
+def load_history(start_time=None, end_time=None, history_dir=DEFAULT_HISTORY_DIR):
+    """
+    读取开始时间在 [start_time, end_time) 内的会话和它们的提示音 (两个 pandas DataFrame)。
+    月份分区和 start_time 列的行组统计信息都参与过滤，范围外的文件和行组不会被读取。
+
+    异常:
+        ImportError: 没有安装 pyarrow / pandas。
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    session_schema, prompt_schema = _schemas()
+    condition = None
+    if start_time is not None:
+        condition = (ds.field('month') >= _month(start_time)) & (ds.field('start_time') >= start_time)
+    if end_time is not None:
+        upper = (ds.field('month') <= _month(end_time)) & (ds.field('start_time') < end_time)
+        condition = upper if condition is None else condition & upper
+
+    frames = []
+    for table_name, schema, key_columns in (('sessions', session_schema, ['session_key']),
+                                            ('prompts', prompt_schema, ['session_key', 'prompt_index'])):
+        path = os.path.join(history_dir, table_name)
+        if os.path.isdir(path):
+            dataset = ds.dataset(
+                path, format='parquet', schema=schema.append(pa.field('month', pa.string())),
+                partitioning=ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+            )
+            table = dataset.to_table(columns=schema.names, filter=condition)
+        else:
+            table = schema.empty_table()
+        # 合并分区的过程中可能同时读到合并后的文件和旧文件
+        frames.append(table.to_pandas().drop_duplicates(key_columns, ignore_index=True))
+    return frames[0], frames[1]
+
+
+def daily_summary(sessions):
+    """
+    按天汇总：会话数、学习分钟数、暂停分钟数、暂停占比、提示音次数 (以日期为索引的 DataFrame)。
+    """
+    summary = sessions.groupby('day', sort=True).agg(
+        sessions=('session_key', 'size'),
+        study_seconds=('elapsed_time', 'sum'),
+        paused_seconds=('paused_duration', 'sum'),
+        prompts=('play_count', 'sum'),
+    )
+    summary['study_minutes'] = summary['study_seconds'] / 60
+    summary['paused_minutes'] = summary['paused_seconds'] / 60
+    total_seconds = summary['study_seconds'] + summary['paused_seconds']
+    summary['pause_ratio'] = (summary['paused_seconds'] / total_seconds.where(total_seconds > 0)).fillna(0.0)
+    return summary.drop(columns=['study_seconds', 'paused_seconds'])
+
+
+def prompt_intervals(prompts):
+    """
+    同一会话内相邻两次常规提示音的间隔 (分钟) 和实际响起时间相对计划时间的偏差 (秒)。
+    返回 DataFrame: session_key, interval_minutes, drift_seconds (第一次提示音没有间隔，为 NaN)。
+    """
+    ordered = prompts.sort_values(['session_key', 'played_time'], ignore_index=True)
+    intervals = ordered.groupby('session_key', sort=False)['played_time'].diff() / 60
+    return ordered.assign(
+        interval_minutes=intervals,
+        drift_seconds=ordered['played_time'] - ordered['scheduled_time'],
+    )[['session_key', 'interval_minutes', 'drift_seconds']]
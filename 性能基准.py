@@ -0,0 +1,351 @@
+# 性能基准.py
+# 无界面运行的性能基准，输出可以在不同版本之间比较的 JSON：
+#   - scheduler:        共享调度器的唤醒次数/分钟、每会话小时的 CPU 秒数、提示音相对计划时间的偏差
+#   - run_audio_timer:  线程版本的同样指标 (唤醒次数由计数时钟统计，偏差为等待超时后实际醒来的延迟)
+#   - memory:           每个并发会话占用的内存 (tracemalloc 统计的 Python 堆 + 进程 RSS 增量)
+#   - ui_rerun:         streamlit_高效学习.py 每次 rerun 的耗时与日志条数、时间记录条数的关系 (需要 streamlit)
+# 音频输出到 SDL 的 dummy 驱动 (空输出)，不需要声卡。
+#
+# 用法:
+#   python 性能基准.py --output bench.json
+#   python 性能基准.py --quick --compare bench.json   # 与上次结果比较
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# 默认提示音，基准只关心计时开销，用哪个文件不影响结果
+BENCH_SOUND_PATH = os.path.join(SCRIPT_DIR, '剑鸣2秒.wav')
+
+
+def _use_null_audio_sink():
+    # 必须在 pygame 初始化 mixer 之前设置
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+
+def _new_status_data(start_time):
+    return {
+        'elapsed_time': 0.0,
+        'remaining_time': 0.0,
+        'play_count': 0,
+        'current_status': '正在启动...',
+        'thread_status': 'starting',
+        'start_time': start_time,
+        'paused_duration': 0.0,
+        'pause_start_time': None,
+        'current_pause_duration_display': 0.0
+    }
+
+
+def _summarize(values):
+    """返回 {'mean', 'p95', 'max'} (毫秒)，没有数据时返回 None。"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def _rss_bytes():
+    """当前进程的常驻内存 (字节)，不支持的平台返回 None。"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class CountingClock:
+    """
+    包装默认时钟，统计 run_audio_timer 的唤醒次数和超时唤醒的延迟。
+    每次 predicate 被求值 (第一次检查除外) 就是一次唤醒。
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.wakeups = 0
+        self.timeout_lateness = [] # 等待超时后实际返回时间 - 截止时间 (秒)
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self.clock.time()
+
+    def monotonic(self):
+        return self.clock.monotonic()
+
+    def sleep(self, seconds):
+        self.clock.sleep(seconds)
+        with self._lock:
+            self.wakeups += 1
+
+    def wait_for(self, condition, predicate, timeout=None):
+        evaluations = 0
+
+        def counting_predicate():
+            nonlocal evaluations
+            evaluations += 1
+            return predicate()
+
+        deadline = None if timeout is None else self.clock.monotonic() + timeout
+        result = self.clock.wait_for(condition, counting_predicate, timeout)
+        returned = self.clock.monotonic()
+        with self._lock:
+            self.wakeups += max(0, evaluations - 1)
+            if not result and deadline is not None:
+                self.wakeups += 1 # 超时返回时不会再求值 predicate
+                self.timeout_lateness.append(max(0.0, returned - deadline))
+        return result
+
+
+def bench_scheduler(sessions, duration_seconds):
+    """在共享调度器中同时运行 sessions 个会话 duration_seconds 秒。"""
+    from 计时调度器 import TimerScheduler
+    from 时间记录 import TimeRecords
+    from 日志存储 import LogStore
+
+    scheduler = TimerScheduler()
+    total_minutes = duration_seconds / 60
+    # 间隔取总时长的 1/10 - 1/5，每个会话大约响 6-9 次
+    min_minutes, max_minutes = total_minutes / 10, total_minutes / 5
+    records = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    ids = []
+    for _ in range(sessions):
+        time_records = TimeRecords()
+        records.append(time_records)
+        session_id = scheduler.register(
+            min_minutes, max_minutes, BENCH_SOUND_PATH, total_minutes, BENCH_SOUND_PATH, 1,
+            0.0, LogStore(), time_records, _new_status_data(None)
+        )
+        if session_id is None:
+            raise RuntimeError("调度器注册会话失败 (音频不可用?)")
+        ids.append(session_id)
+    while any(scheduler.is_active(session_id) for session_id in ids):
+        time.sleep(0.2)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    drifts = []
+    for time_records in records:
+        drifts.extend(time_records.drifts())
+    session_hours = sessions * wall / 3600
+    return {
+        'sessions': sessions,
+        'wall_seconds': wall,
+        'wakeups_per_minute': scheduler.wakeups / (wall / 60),
+        'cpu_seconds_per_session_hour': cpu / session_hours,
+        'prompt_drift': _summarize([abs(d) for d in drifts]),
+        'prompts': len(drifts),
+    }
+
+
+def bench_run_audio_timer(sessions, duration_seconds):
+    """每个会话一个线程运行 run_audio_timer (事件驱动等待)，统计同样的指标。"""
+    from 学习函数 import create_control_events, run_audio_timer
+    from 时钟 import get_clock
+
+    total_minutes = duration_seconds / 60
+    min_minutes, max_minutes = total_minutes / 10, total_minutes / 5
+    clocks = [CountingClock(get_clock()) for _ in range(sessions)]
+    threads = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for clock in clocks:
+        stop_event, pause_event = create_control_events()
+        thread = threading.Thread(target=run_audio_timer, args=(
+            min_minutes, max_minutes, BENCH_SOUND_PATH, total_minutes, BENCH_SOUND_PATH, 1, 0.0,
+            [], [], stop_event, pause_event, _new_status_data(clock.time())
+        ), kwargs={'clock': clock}, daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    wakeups = sum(clock.wakeups for clock in clocks)
+    lateness = [value for clock in clocks for value in clock.timeout_lateness]
+    return {
+        'sessions': sessions,
+        'wall_seconds': wall,
+        'wakeups_per_minute': wakeups / (wall / 60),
+        'cpu_seconds_per_session_hour': cpu / (sessions * wall / 3600),
+        'wakeup_jitter': _summarize(lateness),
+    }
+
+
+def bench_memory(sessions):
+    """注册 sessions 个长会话 (90 分钟)，统计每个会话的内存占用，然后全部取消。"""
+    from 计时调度器 import TimerScheduler
+    from 时间记录 import TimeRecords
+    from 日志存储 import LogStore
+
+    scheduler = TimerScheduler()
+    # 先注册一个会话，让 mixer 初始化和音频解码缓存不计入每会话的开销
+    warmup_id = scheduler.register(3, 5, BENCH_SOUND_PATH, 90, BENCH_SOUND_PATH, 10, 0.0,
+                                   LogStore(), TimeRecords(), _new_status_data(None))
+    tracemalloc.start()
+    rss_before = _rss_bytes()
+    heap_before = tracemalloc.get_traced_memory()[0]
+    ids = [
+        scheduler.register(3, 5, BENCH_SOUND_PATH, 90, BENCH_SOUND_PATH, 10, 0.0,
+                           LogStore(), TimeRecords(), _new_status_data(None))
+        for _ in range(sessions)
+    ]
+    heap_after = tracemalloc.get_traced_memory()[0]
+    rss_after = _rss_bytes()
+    tracemalloc.stop()
+    for session_id in ids + [warmup_id]:
+        scheduler.cancel(session_id)
+    return {
+        'sessions': sessions,
+        'python_heap_bytes_per_session': (heap_after - heap_before) / sessions,
+        'rss_bytes_per_session': None if rss_before is None else (rss_after - rss_before) / sessions,
+    }
+
+
+def bench_ui_rerun(log_lengths, record_counts, repeats):
+    """用 streamlit 的 AppTest 无界面运行页面，测量不同日志/记录规模下每次 rerun 的耗时。"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {'skipped': 'streamlit 未安装'}
+    from 时间记录 import TimeRecords
+    from 日志存储 import LogStore
+
+    page_path = os.path.join(SCRIPT_DIR, 'streamlit_高效学习.py')
+    results = []
+    for log_length in log_lengths:
+        for record_count in record_counts:
+            app = AppTest.from_file(page_path, default_timeout=30)
+            app.run() # 第一次运行包含导入和初始化，不计入
+            log_store = LogStore()
+            log_store.extend(f"基准日志 {i}" for i in range(log_length))
+            time_records = TimeRecords()
+            now = time.time()
+            for i in range(record_count):
+                time_records.append(now - (record_count - i) * 200, scheduled=now - (record_count - i) * 200)
+            app.session_state['log_messages'] = log_store
+            app.session_state['time_records'] = time_records
+            durations = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                app.run()
+                durations.append(time.perf_counter() - start)
+            results.append({
+                'log_length': log_length,
+                'record_count': record_count,
+                'rerun': _summarize(durations),
+            })
+    return {'points': results}
+
+
+def _git_revision():
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True, text=True)
+        return completed.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(quick=False, audio='pygame'):
+    """
+    运行全部基准，返回可以直接 json.dump 的字典。
+    audio 为 'null' 时使用 音频后端.NullAudioBackend (不初始化 SDL)，只测计时本身的开销。
+    """
+    _use_null_audio_sink()
+    if audio != 'pygame':
+        from 音频后端 import create_audio_backend, set_audio_backend
+
+        set_audio_backend(create_audio_backend(audio))
+    sessions = 10 if quick else 50
+    duration_seconds = 5 if quick else 20
+    return {
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'quick': quick,
+        'audio': audio,
+        'results': {
+            'scheduler': bench_scheduler(sessions, duration_seconds),
+            'run_audio_timer': bench_run_audio_timer(sessions, duration_seconds),
+            'memory': bench_memory(sessions * 4),
+            'ui_rerun': bench_ui_rerun(
+                log_lengths=(0, 1000) if quick else (0, 100, 1000),
+                record_counts=(0, 100) if quick else (0, 30, 300),
+                repeats=3 if quick else 10
+            ),
+        },
+    }
+
+
+def _flatten(value, prefix=''):
+    # {'a': {'b': 1}} -> {'a.b': 1}，列表按下标展开
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return {prefix: value}
+    flat = {}
+    for key, item in items:
+        flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def compare(previous, current):
+    """逐项比较两次结果中的数值指标，返回 [(指标, 旧值, 新值, 变化比例)]。"""
+    old_flat = _flatten(previous.get('results', {}))
+    new_flat = _flatten(current.get('results', {}))
+    rows = []
+    for key, new_value in new_flat.items():
+        old_value = old_flat.get(key)
+        if isinstance(new_value, bool) or not isinstance(new_value, (int, float)) or not isinstance(old_value, (int, float)):
+            continue
+        change = None if old_value == 0 else (new_value - old_value) / abs(old_value)
+        rows.append((key, old_value, new_value, change))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="学习计时器性能基准")
+    parser.add_argument('--quick', action='store_true', help="缩短运行时间和规模 (约半分钟)")
+    parser.add_argument('--output', help="结果 JSON 文件，默认输出到标准输出")
+    parser.add_argument('--compare', help="与之前保存的结果 JSON 比较")
+    parser.add_argument('--audio', choices=('pygame', 'null'), default='pygame',
+                        help="音频后端: pygame (SDL dummy 驱动，默认) 或 null (只记录播放事件)")
+    args = parser.parse_args(argv)
+
+    result = run_benchmarks(quick=args.quick, audio=args.audio)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        print(f"\n与 {args.compare} (版本 {previous.get('revision')}) 比较:", file=sys.stderr)
+        for key, old_value, new_value, change in compare(previous, result):
+            change_text = "  n/a" if change is None else f"{change:+.1%}"
+            print(f"  {key:60} {old_value:14.4f} -> {new_value:14.4f}  {change_text}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# 提示时间线.py
+# 在会话开始时一次性生成全部常规提示音的时间点 (以"实际运行时间"为坐标，不含暂停)，
+# 之后的已运行时间、剩余时间、已响次数和下一次提示音的倒计时都由时钟直接推算，
+# 不需要计时线程周期性地写入状态。
+import bisect
+import random
+
+from 时钟 import get_clock
+
+
+class PromptTimeline:
+    """
+    预先编译好的会话时间线。
+
+    prompt_offsets 是每个常规提示音相对于会话开始的实际运行时间 (秒，不含暂停)，
+    final_start/final_end 是结束提示音的播放窗口。对象创建后不再修改，
+    所以 UI 可以在任何线程中不加锁地读取。
+    """
+
+    __slots__ = ('prompt_offsets', 'total_duration_seconds', 'final_start', 'final_end', 'seed')
+
+    def __init__(self, prompt_offsets, total_duration_seconds, final_start, final_end, seed):
+        self.prompt_offsets = tuple(prompt_offsets)
+        self.total_duration_seconds = total_duration_seconds
+        self.final_start = final_start
+        self.final_end = final_end
+        self.seed = seed
+
+    def __len__(self):
+        return len(self.prompt_offsets)
+
+    def play_count_at(self, elapsed_time):
+        """实际运行 elapsed_time 秒时已经响过的常规提示音次数。"""
+        return bisect.bisect_right(self.prompt_offsets, elapsed_time)
+
+    def next_prompt_offset(self, elapsed_time):
+        """elapsed_time 之后下一个常规提示音的时间点，没有则返回 None。"""
+        index = bisect.bisect_right(self.prompt_offsets, elapsed_time)
+        if index < len(self.prompt_offsets):
+            return self.prompt_offsets[index]
+        return None
+
+    def status_at(self, start_time, paused_duration, pause_start_time=None, now=None):
+        """
+        根据开始时间、累计暂停时长和当前时间推算会话状态。
+        提示音只有二三十个，二分查找的代价可以忽略，读取不需要加锁。
+
+        返回:
+            dict: 'elapsed_time', 'remaining_time', 'play_count', 'next_prompt_eta' (秒，没有下一次时为 None),
+                  'phase' ('running', 'finishing', 'finished')
+        """
+        if now is None:
+            now = get_clock().time()
+        # 暂停期间实际运行时间停在暂停开始的那一刻
+        reference_time = pause_start_time if pause_start_time is not None else now
+        elapsed_time = max(0.0, (reference_time - start_time) - paused_duration)
+
+        if elapsed_time < self.final_start:
+            phase = 'running'
+        elif elapsed_time < self.final_end:
+            phase = 'finishing'
+        else:
+            phase = 'finished'
+
+        next_offset = self.next_prompt_offset(elapsed_time)
+        return {
+            'elapsed_time': min(elapsed_time, self.total_duration_seconds),
+            'remaining_time': max(0.0, self.total_duration_seconds - elapsed_time),
+            'play_count': self.play_count_at(elapsed_time),
+            'next_prompt_eta': None if next_offset is None else next_offset - elapsed_time,
+            'phase': phase,
+        }
+
+
+def compile_timeline(
+    min_interval_minutes,
+    max_interval_minutes,
+    total_duration_minutes,
+    final_duration_seconds,
+    prompt_length_seconds=0.0,
+    seed=None
+):
+    """
+    按 run_audio_timer 的规则一次性生成整个会话的时间线。
+
+    规则与 run_audio_timer 相同：每个截止时间是上一个截止时间加 uniform(min, max) 秒 (播放不阻塞，
+    间隔不包含提示音本身的时长)；截止时间达到或超过总时长时不再响常规提示音。
+    结束提示音在常规时长结束、且最后一次常规提示音播完之后开始。
+
+    参数:
+        prompt_length_seconds (float): 常规提示音的时长 (秒)，只用于推迟紧跟在最后一次提示音之后的结束音.
+        seed (int | None): 随机种子。None 时随机生成一个并记录在 timeline.seed 中，方便复现。
+
+    返回:
+        PromptTimeline
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    rng = random.Random(seed)
+    min_interval_seconds = min_interval_minutes * 60
+    max_interval_seconds = max_interval_minutes * 60
+    total_duration_seconds = total_duration_minutes * 60
+
+    prompt_offsets = []
+    offset = 0.0
+    while True:
+        remaining_regular_time = total_duration_seconds - offset
+        if remaining_regular_time <= 0:
+            break
+        wait_seconds = rng.uniform(min_interval_seconds, max_interval_seconds)
+        if wait_seconds >= remaining_regular_time:
+            break # 等待会被截断到总时长，等待结束时常规阶段已经结束
+        offset += wait_seconds
+        prompt_offsets.append(offset)
+
+    final_start = max(offset + prompt_length_seconds if prompt_offsets else 0.0, total_duration_seconds)
+    return PromptTimeline(
+        prompt_offsets,
+        total_duration_seconds,
+        final_start,
+        final_start + final_duration_seconds,
+        seed
+    )
@@ -0,0 +1,234 @@
+# 文件监视.py
+# 提示音文件的路径解析和元数据缓存，由文件系统变化通知 (watchdog) 失效。
+#
+# 页面每次 rerun 都会把侧边栏里的两个路径转换成绝对路径并检查文件是否存在，run_audio_timer、
+# 调度器和音频缓存加载时又各自 stat 一次。文件在会话期间几乎不会变化，所以第一次检查时记住结果
+# (真实路径、修改时间、大小，或"不存在")，同时监视文件所在的目录；目录里这个文件被创建、修改、
+# 删除或替换时才丢弃记住的结果，并通知监听者 (音频服务.SoundCache、音频预处理.SoundIngestCache)
+# 释放已经解码或转换过的旧版本。稳定状态下的检查只是一次字典查找，不再有文件系统调用。
+#
+# 没有安装 watchdog 或无法监视某个目录 (目录不存在、inotify 数量达到上限) 时不缓存，
+# 每次都直接检查文件系统，与原来的行为相同。
+import functools
+import os
+import threading
+
+# 这些事件表示文件内容或存在性可能变化；只读打开 (opened / closed_no_write) 不算
+_CHANGE_EVENTS = frozenset(('created', 'deleted', 'modified', 'moved', 'closed'))
+
+
+class FileMetadata:
+    """一次 stat 的结果 (只保留缓存键需要的字段)。"""
+
+    __slots__ = ('real_path', 'mtime_ns', 'size')
+
+    def __init__(self, real_path, mtime_ns, size):
+        self.real_path = real_path
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+
+@functools.lru_cache(maxsize=256)
+def resolve_path(path, base_dir):
+    """
+    把 path 转换成绝对路径：相对路径基于 base_dir，绝对路径原样返回 (规范化)。
+    path 为 None、空字符串或只有空白时返回 None。只做字符串运算，结果按参数缓存。
+    """
+    cleaned_path = path.strip() if isinstance(path, str) else None
+    if not cleaned_path:
+        return None
+    if os.path.isabs(cleaned_path):
+        return cleaned_path
+    return os.path.normpath(os.path.join(base_dir, cleaned_path))
+
+
+class FileMetadataCache:
+    """
+    按绝对路径缓存 FileMetadata (文件不存在时缓存 None)，由 watchdog 的目录监视失效。
+
+    add_listener(callback) 注册的回调在被缓存的文件发生变化时以该路径调用 (在 watchdog 的线程中)。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {} # 绝对路径 -> FileMetadata | None
+        self._generation = 0 # 每次收到变化通知时加 1，用来丢弃通知之前开始的 stat 结果
+        self._stats_in_flight = 0 # 正在进行 (还没有写入缓存) 的 stat 数
+        self._watches = {} # 目录 -> watchdog 的 ObservedWatch
+        self._observer = None
+        self._watch_available = True
+        self._listeners = []
+        self.hits = 0
+        self.misses = 0
+
+    def add_listener(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+    def stat(self, path):
+        """
+        返回 path 的 FileMetadata，文件不存在时返回 None。
+
+        异常:
+            OSError: 除"不存在"以外的 stat 失败 (例如没有权限)，这种结果不缓存。
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._entries:
+                self.hits += 1
+                return self._entries[path]
+            self.misses += 1
+            generation = self._generation
+            self._stats_in_flight += 1
+
+        try:
+            real_path = os.path.realpath(path)
+            try:
+                st = os.stat(real_path)
+                metadata = FileMetadata(real_path, st.st_mtime_ns, st.st_size)
+            except (FileNotFoundError, NotADirectoryError):
+                metadata = None
+
+            # 同时监视路径本身和符号链接目标所在的目录，任何一边变化都会失效
+            watch_dirs = {os.path.dirname(path), os.path.dirname(real_path)}
+            if all(self._watch(directory) for directory in watch_dirs):
+                with self._lock:
+                    if self._generation == generation: # stat 期间没有变化通知，结果仍然有效
+                        self._entries[path] = metadata
+            return metadata
+        finally:
+            with self._lock:
+                self._stats_in_flight -= 1
+
+    def exists(self, path):
+        """path 是否存在 (与 os.path.exists 相同，stat 失败时返回 False)。"""
+        if not path:
+            return False
+        try:
+            return self.stat(path) is not None
+        except OSError:
+            return False
+
+    def invalidate(self, path=None):
+        """丢弃 path (为 None 时为全部) 的缓存结果，并通知监听者。"""
+        with self._lock:
+            self._generation += 1
+            if path is None:
+                changed = list(self._entries)
+                self._entries.clear()
+            else:
+                changed = self._pop_matching(os.path.abspath(path))
+            listeners = list(self._listeners)
+        for changed_path in changed:
+            for callback in listeners:
+                callback(changed_path)
+
+    def _on_change(self, changed_path):
+        """
+        watchdog 事件的入口：只有缓存中的文件 (或包含它们的目录) 变化时才调用 invalidate()。
+        被监视的目录里还有会话日志 (-wal)、计时后台的套接字、学习历史等频繁写入的文件，
+        它们的事件直接丢弃，不会打断正在进行的 stat，也不会通知监听者。
+        """
+        changed_path = os.path.abspath(changed_path)
+        with self._lock:
+            # 有 stat 正在进行时不能丢弃：它的结果可能就是这个文件，要靠 _generation 作废
+            relevant = self._stats_in_flight > 0 or bool(self._matching(changed_path))
+        if relevant:
+            self.invalidate(changed_path)
+
+    def stats(self):
+        """返回缓存统计: {'entries', 'watched_dirs', 'hits', 'misses'}。"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'watched_dirs': len(self._watches),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _matching(self, changed_path):
+        # 受影响的缓存路径：文件本身变化，或它所在的目录被删除/移动 (调用方已持有 self._lock)
+        prefix = changed_path.rstrip(os.sep) + os.sep
+        changed = []
+        for path, metadata in self._entries.items():
+            targets = (path,) if metadata is None else (path, metadata.real_path)
+            if any(target == changed_path or target.startswith(prefix) for target in targets):
+                changed.append(path)
+        return changed
+
+    def _pop_matching(self, changed_path):
+        changed = self._matching(changed_path)
+        for path in changed:
+            del self._entries[path]
+        return changed
+
+    def _watch(self, directory):
+        """确保 directory 正在被监视，无法监视时返回 False (下次检查时再尝试，目录可能之后才创建)。"""
+        with self._lock:
+            if directory in self._watches:
+                return True
+            if not self._watch_available:
+                return False
+            try:
+                if self._observer is None:
+                    from watchdog.observers import Observer
+
+                    observer = Observer()
+                    observer.daemon = True
+                    observer.start()
+                    self._observer = observer
+                watch = self._observer.schedule(_ChangeHandler(self), directory, recursive=False)
+            except ImportError:
+                self._watch_available = False # 没有安装 watchdog，不缓存
+                return False
+            except (OSError, RuntimeError):
+                return False
+            self._watches[directory] = watch
+            return True
+
+    def _unwatch(self, directory):
+        """被监视的目录本身被删除或移动，监视已经失效；下次检查这个目录里的文件时重新建立。"""
+        with self._lock:
+            watch = self._watches.pop(directory, None)
+            if watch is not None:
+                try:
+                    self._observer.unschedule(watch)
+                except (KeyError, OSError):
+                    pass
+
+
+class _ChangeHandler:
+    """watchdog 的事件处理器 (只实现 dispatch，不依赖 FileSystemEventHandler 的导入)。"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def dispatch(self, event):
+        if event.event_type not in _CHANGE_EVENTS:
+            return
+        if event.is_directory and event.event_type in ('modified', 'closed'):
+            return # 目录里有文件增删时目录本身也会"修改"，具体的文件会有自己的事件
+        if event.is_directory and event.event_type in ('deleted', 'moved'):
+            self.cache._unwatch(os.fsdecode(event.src_path))
+        self.cache._on_change(os.fsdecode(event.src_path))
+        dest_path = getattr(event, 'dest_path', '')
+        if dest_path:
+            self.cache._on_change(os.fsdecode(dest_path)) # 替换 (临时文件改名为目标文件)
+
+
+_file_metadata = None
+_file_metadata_lock = threading.Lock()
+
+
+def get_file_metadata():
+    """返回进程内共享的 FileMetadataCache (首次调用时创建)。"""
+    global _file_metadata
+    with _file_metadata_lock:
+        if _file_metadata is None:
+            _file_metadata = FileMetadataCache()
+        return _file_metadata
+
+
+def file_exists(path):
+    """共享缓存版本的 os.path.exists (path 为 None 或空字符串时返回 False)。"""
+    return get_file_metadata().exists(path)
@@ -0,0 +1,118 @@
+# 日志存储.py
+# 固定容量的环形日志存储，替代无限增长的 log_list。
+# 每条记录是 (timestamp, level, code, message)，并维护"最近是否出现过某个 code"的索引，
+# 去重检查是 O(1)，不再需要把最近几条日志拼成字符串再查找子串。
+import collections
+import threading
+import time
+
+
+# 一个 90 分钟的会话大约产生 200-300 条日志，默认容量可以完整保留一到两次会话
+DEFAULT_LOG_CAPACITY = 1000
+
+LogRecord = collections.namedtuple('LogRecord', ['seq', 'timestamp', 'level', 'code', 'message'])
+
+
+def _infer_level(message):
+    # 现有日志消息没有级别，根据内容推断，保持调用方 append(message) 的写法不变
+    if "错误" in message or "异常" in message:
+        return 'error'
+    if "警告" in message:
+        return 'warning'
+    return 'info'
+
+
+class LogStore:
+    """
+    固定容量的环形日志存储。
+
+    兼容原来 log_list 的主要用法：append(message)、len()、按顺序迭代得到消息字符串，
+    所以 run_audio_timer 和调度器不需要区分传进来的是 list 还是 LogStore。
+    超过容量时最旧的记录被丢弃，内存占用不随会话时长增长。
+
+    version 是累计追加过的记录条数 (只增不减)，UI 用 since(version) 只取新增的记录。
+    """
+
+    def __init__(self, capacity=DEFAULT_LOG_CAPACITY):
+        self.capacity = capacity
+        self._records = collections.deque(maxlen=capacity)
+        self._last_seq_by_code = {} # code -> 最近一次出现时的 seq
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def append(self, message, code=None, level=None):
+        """追加一条日志。code 用于 seen_recently() 去重，level 默认根据消息内容推断。"""
+        with self._lock:
+            self.version += 1
+            record = LogRecord(self.version, time.time(), level or _infer_level(message), code, message)
+            self._records.append(record)
+            if code is not None:
+                self._last_seq_by_code[code] = self.version
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def seen_recently(self, code, window):
+        """最近 window 条日志中是否出现过 code，O(1)。"""
+        last_seq = self._last_seq_by_code.get(code)
+        return last_seq is not None and self.version - last_seq < window
+
+    def since(self, version):
+        """
+        返回 seq 大于 version 的记录 (仍在缓冲区中的部分)。
+        新记录都在右端，所以只需要从右往左取，代价与新增条数成正比。
+        """
+        with self._lock:
+            count = min(self.version - version, len(self._records))
+            if count <= 0:
+                return []
+            return [self._records[-i] for i in range(count, 0, -1)]
+
+    def records(self):
+        """当前缓冲区中的全部记录 (从旧到新)。"""
+        with self._lock:
+            return list(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        # 与 list 兼容：迭代得到消息字符串
+        return iter([record.message for record in self.records()])
+
+
+def log_once(log_list, code, message, window=5):
+    """
+    如果最近 window 条日志中没有出现过同一条消息，则追加 message。
+
+    log_list 是 LogStore 时使用 code 索引 (O(1))；是普通 list 时在最近 window 条中逐条比较，
+    不再把它们拼接成字符串。
+    """
+    if isinstance(log_list, LogStore):
+        if not log_list.seen_recently(code, window):
+            log_list.append(message, code=code)
+    elif message not in log_list[-window:]:
+        log_list.append(message)
+
+
+class LogView:
+    """
+    增量渲染视图：缓存已经格式化好的行，每次只格式化 LogStore 中新增的记录。
+    行数上限与 LogStore 的容量相同，所以拼接文本的代价也有上限。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.version = 0
+        self._lines = collections.deque(maxlen=store.capacity)
+        self._text = ""
+
+    def text(self):
+        """返回全部日志文本；没有新记录时直接返回缓存的文本。"""
+        if self.store.version != self.version:
+            new_records = self.store.since(self.version)
+            self._lines.extend(record.message for record in new_records)
+            self.version = self.store.version
+            self._text = "\n".join(self._lines)
+        return self._text
@@ -0,0 +1,135 @@
+# 时钟.py
+# 计时代码使用的时钟抽象：
+#   - SystemClock (默认): time() 是 Unix 时间 (time.time())，用于写入会话日志、学习历史和状态的时间戳，
+#     页面进程和计时后台进程读到的是同一个时间；monotonic() 是 time.monotonic()，只用于在同一个进程内
+#     计算已运行时间、暂停时长和截止时间，系统时间被 NTP 校准或手动修改时计时不会跳变。
+#     持久化的时间戳用 monotonic_at() 换算到本进程的单调时钟坐标 (会话开始或恢复时换算一次)。
+#   - VirtualClock: 测试/模拟用的虚拟时钟。等待不会真的睡眠，而是直接把时间推进到截止时间或下一个
+#     预先安排的事件 (暂停、继续、停止……)，一个 90 分钟的会话在几毫秒内跑完。
+#
+# 时钟需要提供 time()、monotonic()、sleep(seconds) 和 wait_for(condition, predicate, timeout) 四个方法。
+import heapq
+import itertools
+import threading
+import time
+
+
+class SystemClock:
+    """
+    系统时钟：time() 返回 Unix 时间，monotonic() 返回单调时钟。
+
+    不能把两者混在一起相减：单调时钟在电脑休眠期间停止，各进程的起点也不同，
+    所以写入会话日志和学习历史、在进程之间传递的时间戳都用 time()，计时间隔和截止时间都用 monotonic()。
+    """
+
+    virtual = False
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait_for(self, condition, predicate, timeout=None):
+        """在 condition 上阻塞直到 predicate() 为真或超时 (threading 的超时本身基于单调时钟)。"""
+        with condition:
+            return condition.wait_for(predicate, timeout)
+
+
+class VirtualClock:
+    """
+    虚拟时钟，用于在测试中快速模拟完整的会话。
+
+    时间只在 sleep() / wait_for() / advance() 时向前推进。用 call_at() / call_later() 预先安排事件，
+    例如 clock.call_later(600, pause_event.set) 表示运行 10 分钟后暂停；等待时如果截止时间之前有事件，
+    时钟先推进到事件时间并执行它，再检查等待条件。
+
+    虚拟时钟由调用 sleep() / wait_for() 的线程驱动 (例如直接调用 run_audio_timer)。TimerScheduler 的调度线程
+    在真实的 Condition 上等待，使用虚拟时钟时用 TimerScheduler.advance_to_next_deadline() 逐步推进。
+    """
+
+    virtual = True
+
+    def __init__(self, start=1_700_000_000.0):
+        self._now = start
+        self._lock = threading.Lock()
+        self._callbacks = [] # (when, seq, callback)
+        self._seq = itertools.count()
+
+    def time(self):
+        return self._now
+
+    def monotonic(self):
+        # 虚拟时间没有跳变，两种读数相同
+        return self._now
+
+    def call_at(self, when, callback):
+        """在虚拟时间 when 执行 callback()。"""
+        with self._lock:
+            heapq.heappush(self._callbacks, (when, next(self._seq), callback))
+
+    def call_later(self, delay, callback):
+        """在当前虚拟时间之后 delay 秒执行 callback()。"""
+        self.call_at(self._now + delay, callback)
+
+    def advance(self, seconds):
+        """推进 seconds 秒，依次执行期间到期的事件。"""
+        self._run_until(self._now + max(0.0, seconds))
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def wait_for(self, condition, predicate, timeout=None):
+        """
+        不阻塞地模拟等待：依次执行截止时间之前的事件，直到 predicate() 为真或到达截止时间。
+        condition 只是为了与 SystemClock 的接口一致，这里不使用。
+
+        异常:
+            RuntimeError: timeout 为 None 且没有任何待执行的事件 (真实时钟下会永远阻塞)。
+        """
+        deadline = None if timeout is None else self._now + timeout
+        while not predicate():
+            with self._lock:
+                next_time = self._callbacks[0][0] if self._callbacks else None
+            if next_time is None or (deadline is not None and next_time > deadline):
+                if deadline is None:
+                    raise RuntimeError("虚拟时钟：无限等待期间没有安排任何事件，会话将永远阻塞")
+                self._run_until(deadline)
+                return predicate()
+            self._run_until(next_time)
+        return True
+
+    def _run_until(self, target):
+        while True:
+            with self._lock:
+                if not self._callbacks or self._callbacks[0][0] > target:
+                    break
+                when, _, callback = heapq.heappop(self._callbacks)
+            self._now = max(self._now, when)
+            callback()
+        self._now = max(self._now, target)
+
+
+def monotonic_at(clock, timestamp):
+    """
+    把 Unix 时间戳 (例如会话日志中的 start_time) 换算到 clock 的单调时钟坐标。
+    换算只在会话开始或恢复时做一次，之后的间隔都由单调时钟计算。
+    """
+    return clock.monotonic() - (clock.time() - timestamp)
+
+
+_clock = None
+_clock_lock = threading.Lock()
+
+
+def get_clock():
+    """返回进程内共享的默认时钟 (SystemClock，首次调用时创建)。"""
+    global _clock
+    with _clock_lock:
+        if _clock is None:
+            _clock = SystemClock()
+        return _clock
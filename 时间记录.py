@@ -0,0 +1,101 @@
+# 时间记录.py
+# 常规提示音响起时间的紧凑存储：时间戳保存在 array('d') 中 (每条 8 字节)，
+# 格式化后的字符串只追加缓存，每次刷新页面只格式化新增的记录。
+# 同一块缓冲区还提供基于 NumPy 的间隔统计 (均值、方差) 和相对计划时间的偏差统计。
+import array
+import datetime
+import math
+
+
+class TimeRecords:
+    """
+    常规提示音时间记录。
+
+    兼容原来 time_records 列表的用法：append(timestamp)、len()、迭代、下标访问、布尔判断，
+    所以 run_audio_timer 和调度器不需要区分传进来的是 list 还是 TimeRecords。
+    如果追加时提供了计划时间 (scheduled)，还可以统计实际响起时间相对计划的偏差。
+    """
+
+    __slots__ = ('_timestamps', '_scheduled', '_formatted', '_format')
+
+    def __init__(self, time_format='%Y-%m-%d %H:%M:%S'):
+        self._timestamps = array.array('d')
+        self._scheduled = array.array('d') # 与 _timestamps 一一对应，未知时为 NaN
+        self._formatted = [] # 已格式化的字符串，只追加
+        self._format = time_format
+
+    def append(self, timestamp, scheduled=None):
+        # 先写计划时间再写实际时间：读取方以 _timestamps 的长度为准，不会读到缺少计划时间的记录
+        self._scheduled.append(math.nan if scheduled is None else scheduled)
+        self._timestamps.append(timestamp)
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def __iter__(self):
+        return iter(self._timestamps)
+
+    def __getitem__(self, index):
+        return self._timestamps[index]
+
+    def formatted(self):
+        """返回全部记录的格式化字符串 (列表)，只格式化上次调用之后新增的记录。"""
+        count = len(self._timestamps)
+        for timestamp in self._timestamps[len(self._formatted):count]:
+            self._formatted.append(datetime.datetime.fromtimestamp(timestamp).strftime(self._format))
+        return self._formatted
+
+    def since(self, index):
+        """返回第 index 条之后的记录 [(实际响起时间, 计划时间或 None)]，用于增量复制 (例如 计时服务.py)。"""
+        count = len(self._timestamps)
+        return [
+            (timestamp, None if math.isnan(scheduled) else scheduled)
+            for timestamp, scheduled in zip(self._timestamps[index:count], self._scheduled[index:count])
+        ]
+
+    def drifts(self):
+        """每条有计划时间的记录的 (实际响起时间 - 计划时间)，单位秒，不需要 NumPy。"""
+        count = len(self._timestamps)
+        return [
+            timestamp - scheduled
+            for timestamp, scheduled in zip(self._timestamps[:count], self._scheduled[:count])
+            if not math.isnan(scheduled)
+        ]
+
+    def interval_stats(self):
+        """
+        间隔和偏差统计 (向量化计算)。
+
+        返回:
+            dict | None: 记录少于 2 条时返回 None，否则包含
+                'count' (记录数), 'gap_mean' / 'gap_var' (相邻提示音间隔的均值/方差，秒),
+                'drift_mean' / 'drift_max' (实际响起时间减计划时间的均值/最大绝对值，秒；
+                没有计划时间时为 None)
+        """
+        import numpy as np # 只有需要统计时才导入
+
+        count = len(self._timestamps)
+        if count < 2:
+            return None
+        # 先切片再 frombuffer：直接导出 self._timestamps 的缓冲区会让计时线程的 append() 抛出 BufferError
+        timestamps = np.frombuffer(self._timestamps[:count], dtype=np.float64)
+        scheduled = np.frombuffer(self._scheduled[:count], dtype=np.float64)
+        gaps = np.diff(timestamps)
+
+        drift = timestamps - scheduled
+        drift = drift[~np.isnan(drift)]
+        return {
+            'count': count,
+            'gap_mean': float(gaps.mean()),
+            'gap_var': float(gaps.var()),
+            'drift_mean': float(drift.mean()) if drift.size else None,
+            'drift_max': float(np.abs(drift).max()) if drift.size else None,
+        }
+
+
+def append_record(time_records, timestamp, scheduled=None):
+    """向 time_records 追加一条记录；是 TimeRecords 时同时记录计划时间。"""
+    if isinstance(time_records, TimeRecords):
+        time_records.append(timestamp, scheduled=scheduled)
+    else:
+        time_records.append(timestamp)
@@ -0,0 +1,271 @@
+# 流式音频.py
+# 大 WAV 文件的流式播放：不把整首曲子解码成 pygame.mixer.Sound，而是把文件 mmap 到内存映射中，
+# 每次只取一小段 PCM 包装成 Sound，通过 Channel.queue() 接在当前片段后面播放。
+# 每个正在播放的流最多占用两段缓冲 (正在播放的一段 + 排队的一段)，与文件大小和播放时长无关；
+# 文件内容本身由操作系统的页缓存按需读入，多个会话播放同一个文件时共享。
+#
+# 只有格式与 mixer 相同的未压缩 PCM WAV 才走流式路径 (不做重采样和格式转换)，
+# 其他文件以及小文件仍由 音频服务.SoundCache 整体解码。
+import mmap
+import os
+import struct
+import threading
+
+from 启动开销 import lazy_import # pygame 在第一次使用音频时才导入 (导入时会加载 SDL)
+
+pygame = lazy_import('pygame')
+
+# 文件大于这个大小时才考虑流式播放 (约 47 秒的 44.1 kHz 16 位立体声)，默认的提示音都远小于它
+STREAMING_THRESHOLD_BYTES = 8 * 1024 * 1024
+# 每段缓冲的时长 (秒)，供给线程每隔半段检查一次是否需要排队下一段
+STREAM_CHUNK_SECONDS = 0.5
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# WAV 每个采样的字节数 -> pygame mixer 的格式 (8 位 WAV 是无符号的，16 位是有符号的)
+_MIXER_FORMATS = {1: 8, 2: -16}
+
+
+class WavInfo:
+    """PCM WAV 文件的格式和 data 块的位置。"""
+
+    __slots__ = ('path', 'frequency', 'channels', 'sample_width', 'data_offset', 'data_size')
+
+    def __init__(self, path, frequency, channels, sample_width, data_offset, data_size):
+        self.path = path
+        self.frequency = frequency
+        self.channels = channels
+        self.sample_width = sample_width # 每个采样的字节数
+        self.data_offset = data_offset
+        self.data_size = data_size
+
+    @property
+    def block_align(self):
+        return self.channels * self.sample_width
+
+    @property
+    def mixer_format(self):
+        """与 pygame.mixer.get_init() 相同形式的 (频率, 格式, 声道数)，不支持的采样宽度返回 None。"""
+        sample_format = _MIXER_FORMATS.get(self.sample_width)
+        if sample_format is None:
+            return None
+        return (self.frequency, sample_format, self.channels)
+
+    def get_length(self):
+        """时长 (秒)。"""
+        return self.data_size / (self.frequency * self.block_align)
+
+
+def read_wav_info(path):
+    """
+    解析 RIFF/WAVE 头，找到 fmt 和 data 块。只读取文件开头的块头，不读取 PCM 数据。
+
+    返回:
+        WavInfo | None: 不是未压缩 PCM 的 WAV 文件 (或文件损坏) 时返回 None。
+    """
+    try:
+        file_size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                return None
+            fmt = None
+            while True:
+                chunk_header = f.read(8)
+                if len(chunk_header) < 8:
+                    return None
+                chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+                if chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size)
+                    if len(fmt) < 16:
+                        return None
+                    if chunk_size % 2:
+                        f.seek(1, os.SEEK_CUR)
+                elif chunk_id == b'data':
+                    if fmt is None:
+                        return None
+                    data_offset = f.tell()
+                    # 流式写出的 WAV 可能没有回填 data 大小 (0 或 0xFFFFFFFF)，按文件实际大小截断
+                    data_size = min(chunk_size, file_size - data_offset) if chunk_size else file_size - data_offset
+                    break
+                else:
+                    f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    except OSError:
+        return None
+
+    audio_format, channels, frequency, _, _, bits_per_sample = struct.unpack('<HHIIHH', fmt[:16])
+    if audio_format == _WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        audio_format = struct.unpack('<H', fmt[24:26])[0] # SubFormat GUID 的前两个字节
+    if audio_format != _WAVE_FORMAT_PCM or not channels or not frequency or bits_per_sample % 8:
+        return None
+    info = WavInfo(path, frequency, channels, bits_per_sample // 8, data_offset, 0)
+    info.data_size = data_size - data_size % info.block_align # 去掉不完整的最后一帧
+    return info
+
+
+class StreamingSoundHandle:
+    """
+    流式播放的提示音句柄，接口与 音频服务.SoundHandle 相同 (get_length()、volume、path)。
+    MixerLease.play() 遇到这种句柄时交给 StreamFeeder 分段播放。
+    """
+
+    __slots__ = ('info', 'volume', 'path')
+
+    def __init__(self, info, volume):
+        self.info = info
+        self.volume = volume
+        self.path = info.path
+
+    def get_length(self):
+        return self.info.get_length()
+
+
+def open_streaming_sound(path, volume, threshold_bytes=STREAMING_THRESHOLD_BYTES):
+    """
+    path 适合流式播放时返回 StreamingSoundHandle，否则返回 None (调用方改用整体解码)。
+    适合流式播放：文件大于 threshold_bytes、是未压缩 PCM WAV、格式与当前 mixer 完全相同。
+    调用前 mixer 必须已经初始化。
+    """
+    try:
+        if os.path.getsize(path) <= threshold_bytes:
+            return None
+    except OSError:
+        return None
+    info = read_wav_info(path)
+    if info is None or info.data_size == 0 or info.mixer_format != pygame.mixer.get_init():
+        return None
+    return StreamingSoundHandle(info, volume)
+
+
+class _Stream:
+    """一次流式播放：映射的文件、读取位置和剩余可播放的字节数。"""
+
+    __slots__ = ('channel', 'file', 'mapping', 'position', 'end', 'chunk_bytes')
+
+    def __init__(self, channel, info, maxtime):
+        self.channel = channel
+        self.file = open(info.path, 'rb')
+        try:
+            self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.file.close()
+            raise
+        bytes_per_second = info.frequency * info.block_align
+        self.position = info.data_offset
+        self.end = info.data_offset + info.data_size
+        if maxtime > 0: # 与 Sound.play(maxtime=...) 相同，只播放前 maxtime 毫秒
+            max_bytes = int(bytes_per_second * maxtime / 1000)
+            self.end = min(self.end, self.position + max_bytes - max_bytes % info.block_align)
+        self.chunk_bytes = max(info.block_align, int(bytes_per_second * STREAM_CHUNK_SECONDS) // info.block_align * info.block_align)
+
+    def next_chunk(self):
+        """下一段 PCM 包装成的 Sound，已经读完时返回 None。"""
+        if self.position >= self.end:
+            return None
+        stop = min(self.position + self.chunk_bytes, self.end)
+        chunk = pygame.mixer.Sound(buffer=self.mapping[self.position:stop])
+        self.position = stop
+        return chunk
+
+    @property
+    def exhausted(self):
+        return self.position >= self.end
+
+    def close(self):
+        self.mapping.close()
+        self.file.close()
+
+
+class StreamFeeder:
+    """
+    进程内所有流式播放共用的供给线程。
+
+    每隔半段缓冲的时长检查一次各个流：声道的队列空了 (上一段已经开始播放) 就排入下一段。
+    没有流在播放时线程一直阻塞，不会周期性唤醒。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._streams = {} # channel -> _Stream
+        self._thread = None
+
+    def play(self, channel, handle, maxtime=0):
+        """
+        在 channel 上流式播放 handle (会替换该声道上正在进行的流)。
+
+        异常:
+            OSError: 文件无法打开或映射。
+            pygame.error: 播放失败。
+        """
+        stream = _Stream(channel, handle.info, maxtime)
+        try:
+            first = stream.next_chunk()
+            second = stream.next_chunk()
+        except Exception:
+            stream.close()
+            raise
+        with self._condition:
+            self._stop_locked(channel)
+            if first is None:
+                stream.close()
+                return
+            channel.play(first)
+            channel.set_volume(handle.volume)
+            if second is not None:
+                channel.queue(second)
+            if stream.exhausted:
+                stream.close()
+                return
+            self._streams[channel] = stream
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="StreamFeeder", daemon=True)
+                self._thread.start()
+            else:
+                self._condition.notify()
+
+    def stop(self, channel):
+        """结束 channel 上的流 (不停止声道本身，由调用方停止)。"""
+        with self._condition:
+            self._stop_locked(channel)
+
+    def active_streams(self):
+        with self._condition:
+            return len(self._streams)
+
+    def _stop_locked(self, channel):
+        stream = self._streams.pop(channel, None)
+        if stream is not None:
+            stream.close()
+
+    def _run(self):
+        with self._condition:
+            while True:
+                self._condition.wait_for(lambda: self._streams)
+                for channel, stream in list(self._streams.items()):
+                    if channel.get_queue() is not None:
+                        continue # 排队的一段还没开始播放
+                    if not channel.get_busy():
+                        self._stop_locked(channel) # 声道被停止或被其他声音打断
+                        continue
+                    try:
+                        chunk = stream.next_chunk()
+                        if chunk is not None:
+                            channel.queue(chunk)
+                    except (pygame.error, ValueError):
+                        chunk = None # 映射已关闭或解码失败，结束这个流
+                    if chunk is None or stream.exhausted:
+                        self._stop_locked(channel)
+                self._condition.wait(STREAM_CHUNK_SECONDS / 2)
+
+
+_stream_feeder = None
+_stream_feeder_lock = threading.Lock()
+
+
+def get_stream_feeder():
+    """返回进程内共享的 StreamFeeder (首次调用时创建)。"""
+    global _stream_feeder
+    with _stream_feeder_lock:
+        if _stream_feeder is None:
+            _stream_feeder = StreamFeeder()
+        return _stream_feeder
@@ -0,0 +1,180 @@
+# 状态快照.py
+# 计时线程 (或调度器) 与 UI 之间共享的实时状态。
+#
+# 原来的 status_data 是普通字典，写入方逐个键更新 (elapsed_time、thread_status、current_status ...)，
+# UI 在两次写入之间读取时会看到"半新半旧"的状态，也无法知道状态是否变化过。
+# TimerStatus 是字段固定的结构 (__slots__)，对外仍然是字典接口，原有的 status_data['键'] 写法不变；
+# 写入方用 `with status_batch(status_data):` 把一组相关的更新包起来，UI 用 snapshot() 读取：
+#   - 写入采用顺序锁 (seqlock)：写入开始和结束时各把序号加 1，写入期间序号为奇数；
+#   - 读取不加锁：读到的序号为偶数、复制字段后序号没有变化，就是一致的快照，否则重试；
+#   - 快照是不可变对象并按序号缓存，状态没有变化时 snapshot() 直接返回上一次的对象 (O(1))，
+#     UI 比较 version 即可判断是否需要重新计算显示内容。
+# 写入方之间用一个锁互斥 (计时线程和 UI 的按钮处理都会写入)，读取方从不阻塞写入方。
+import contextlib
+import threading
+import time
+from collections.abc import MutableMapping
+
+# 字段和默认值 (与页面初始化的 status_data 相同)
+STATUS_DEFAULTS = {
+    'elapsed_time': 0.0, # 实际运行时间 (秒)
+    'remaining_time': 0.0, # 常规计时阶段剩余时间 (秒)
+    'play_count': 0, # 常规提示音播放次数
+    'current_status': '空闲', # 状态描述
+    # 'idle', 'starting', 'resuming', 'running', 'paused', 'stopping', 'finishing_regular', 'finishing', 'finished', 'hibernated'
+    'thread_status': 'idle',
+    'start_time': None, # 任务开始的系统时间戳
+    'paused_duration': 0.0, # 累计暂停时长 (秒)
+    'pause_start_time': None, # 当前暂停开始的系统时间戳
+    'current_pause_duration_display': 0.0, # 当前这次暂停已持续的时长 (秒，仅轮询模式实时更新)
+    'timeline': None, # 调度器编译的 PromptTimeline
+}
+STATUS_FIELDS = tuple(STATUS_DEFAULTS)
+
+
+class StatusSnapshot:
+    """
+    某一时刻的一致状态 (只读)。
+    支持 snapshot['键'] 和 snapshot.get('键', 默认值)，可以直接传给 get_live_status_values()。
+    """
+
+    __slots__ = ('version',) + STATUS_FIELDS
+
+    def __init__(self, version, values):
+        object.__setattr__(self, 'version', version)
+        for name, value in zip(STATUS_FIELDS, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StatusSnapshot 是只读的")
+
+    def __getitem__(self, key):
+        if key not in STATUS_DEFAULTS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in STATUS_DEFAULTS:
+            return default
+        return getattr(self, key)
+
+
+class TimerStatus(MutableMapping):
+    """
+    字段固定的实时状态，字典接口兼容原来的 status_data。
+
+    不支持 STATUS_FIELDS 以外的键 (写入时抛出 KeyError)；删除某个键 (例如 pop('timeline', None))
+    会把它恢复为默认值。单独的赋值本身就是一次完整的写入；相关的多个字段应放在
+    status_batch() / writing() 中一起写入，UI 才不会看到只更新了一半的状态。
+    """
+
+    __slots__ = STATUS_FIELDS + ('_seq', '_write_lock', '_write_depth', '_dirty', '_snapshot')
+
+    def __init__(self, values=None, **kwargs):
+        for name, default in STATUS_DEFAULTS.items():
+            object.__setattr__(self, name, default)
+        object.__setattr__(self, '_seq', 0) # 偶数: 没有写入在进行; 奇数: 正在写入
+        object.__setattr__(self, '_write_lock', threading.RLock())
+        object.__setattr__(self, '_write_depth', 0)
+        object.__setattr__(self, '_dirty', False)
+        object.__setattr__(self, '_snapshot', None)
+        if values is not None or kwargs:
+            with self.writing():
+                self.update(values or (), **kwargs)
+
+    @property
+    def version(self):
+        """状态的版本号 (每次有字段变化的写入完成后增加)。"""
+        return self._seq
+
+    # --- 写入 ---
+    @contextlib.contextmanager
+    def writing(self):
+        """把块内的多个写入合并成一次原子发布 (可以嵌套)。"""
+        with self._write_lock:
+            outermost = self._write_depth == 0
+            if outermost:
+                object.__setattr__(self, '_dirty', False)
+                object.__setattr__(self, '_seq', self._seq + 1)
+            object.__setattr__(self, '_write_depth', self._write_depth + 1)
+            try:
+                yield self
+            finally:
+                object.__setattr__(self, '_write_depth', self._write_depth - 1)
+                if outermost:
+                    # 没有字段变化时序号回到原来的偶数，版本号不变
+                    object.__setattr__(self, '_seq', self._seq + (1 if self._dirty else -1))
+
+    def __setitem__(self, key, value):
+        if key not in STATUS_DEFAULTS:
+            raise KeyError(f"未知的状态字段: {key}")
+        with self.writing():
+            if getattr(self, key) != value or type(getattr(self, key)) is not type(value):
+                object.__setattr__(self, key, value)
+                object.__setattr__(self, '_dirty', True)
+
+    def __delitem__(self, key):
+        if key not in STATUS_DEFAULTS:
+            raise KeyError(key)
+        self[key] = STATUS_DEFAULTS[key]
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    # --- 读取 ---
+    def __getitem__(self, key):
+        if key not in STATUS_DEFAULTS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in STATUS_DEFAULTS:
+            return default
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(STATUS_FIELDS)
+
+    def __len__(self):
+        return len(STATUS_FIELDS)
+
+    def __repr__(self):
+        return f"TimerStatus(version={self._seq}, {dict(self)!r})"
+
+    def snapshot(self):
+        """
+        返回一致的只读快照 (StatusSnapshot)，不加锁。
+        状态没有变化时返回上一次的同一个对象，调用方可以用 version 或 `is` 判断是否变化。
+        """
+        while True:
+            seq = self._seq
+            cached = self._snapshot
+            if cached is not None and cached.version == seq:
+                return cached
+            if seq & 1:
+                time.sleep(0) # 写入方正在写，让出 GIL 后重试
+                continue
+            values = tuple(getattr(self, name) for name in STATUS_FIELDS)
+            if self._seq == seq:
+                snapshot = StatusSnapshot(seq, values)
+                object.__setattr__(self, '_snapshot', snapshot)
+                return snapshot
+
+
+def status_batch(status_data):
+    """
+    把一组写入合并成一次发布。status_data 是普通字典时 (例如命令行版本或旧的调用方) 什么都不做，
+    所以 run_audio_timer 等函数仍然可以接收字典。
+    """
+    if isinstance(status_data, TimerStatus):
+        return status_data.writing()
+    return contextlib.nullcontext(status_data)
+
+
+def read_status(status_data):
+    """返回一致的快照；status_data 是普通字典时返回它的浅拷贝 (version 为 None)。"""
+    if isinstance(status_data, TimerStatus):
+        return status_data.snapshot()
+    values = dict(STATUS_DEFAULTS)
+    values.update(status_data)
+    return StatusSnapshot(None, tuple(values[name] for name in STATUS_FIELDS))
@@ -0,0 +1,767 @@
+# 计时服务.py
+# 独立的计时后台进程：所有会话的调度 (TimerScheduler) 和音频都在这个进程里，
+# Streamlit 进程通过本机的 Unix 域套接字 (不支持时用 127.0.0.1 上的 TCP) 发送控制命令并拉取状态。
+# Streamlit 进程本身不再持有计时状态，可以随时重启或同时运行多个副本，共享同一个后台；
+# 页面渲染和计时线程也不再争用同一个 GIL。
+#
+# 协议：每行一个 JSON 请求 {"op": ..., 参数...}，每行一个 JSON 响应
+#   {"ok": true, "result": ...} 或 {"ok": false, "error": "..."}。
+#   start / pause / resume / cancel / is_active / find / counts / ping 对应 TimerScheduler 的同名方法；
+#   poll 一次请求带上本进程所有会话已经拿到的版本号 (状态版本、日志条数、记录条数)，只返回变化的部分，
+#   上次拉取之后有页面查看过的会话带上 touched (页面心跳，见 会话回收.py)。
+#
+# 用法:
+#   python 计时服务.py                                   # 在默认地址监听 (见 DEFAULT_BACKEND_ADDRESS)
+#   python 计时服务.py --listen tcp:127.0.0.1:9470 --metrics-port 9465
+#   STUDY_TIMER_BACKEND=unix:/path/to/.timer_backend.sock streamlit run streamlit_高效学习.py
+# 没有设置 STUDY_TIMER_BACKEND 时页面仍在进程内运行调度器 (与原来相同)。
+#
+# 协议没有身份验证：只能监听本机回环地址 (TCP) 或只有本用户可以连接的 Unix 域套接字。
+import ipaddress
+import itertools
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uuid
+
+from 提示时间线 import PromptTimeline
+from 时间记录 import TimeRecords, append_record
+from 日志存储 import LogStore
+from 状态快照 import STATUS_FIELDS, TimerStatus, read_status, status_batch
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+if hasattr(socket, 'AF_UNIX'):
+    DEFAULT_BACKEND_ADDRESS = 'unix:' + os.path.join(SCRIPT_DIR, '.timer_backend.sock')
+else:
+    DEFAULT_BACKEND_ADDRESS = 'tcp:127.0.0.1:9470'
+
+# 页面的局部刷新每秒一次，同一个 Streamlit 进程内的多个浏览器会话共用一次拉取
+REFRESH_INTERVAL_SECONDS = 0.5
+# 已结束的会话在后台保留的时间，让页面拉取到最终的状态和日志
+FINISHED_RETENTION_SECONDS = 600
+REQUEST_TIMEOUT_SECONDS = 10.0
+MAX_REQUEST_BYTES = 4 * 1024 * 1024 # 单个请求行的上限 (带上全部时间记录的 start 请求也远小于这个值)
+
+_TIMELINE_FIELDS = ('prompt_offsets', 'total_duration_seconds', 'final_start', 'final_end', 'seed')
+_WIRE_STATUS_FIELDS = tuple(name for name in STATUS_FIELDS if name != 'timeline') # timeline 单独传一次
+
+
+class TimerBackendError(RuntimeError):
+    """后台服务拒绝了请求 (参数错误、未知操作等)。连接失败抛出的是 ConnectionError。"""
+
+
+def parse_address(address):
+    """
+    'unix:/path/to.sock' 或 'tcp:host:port' (也接受 'host:port') -> (地址族, 套接字地址)。
+
+    异常:
+        ValueError: 地址格式错误，或当前平台不支持 Unix 域套接字。
+    """
+    if address.startswith('unix:'):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError("当前平台不支持 Unix 域套接字，请使用 tcp:host:port")
+        return socket.AF_UNIX, address[len('unix:'):]
+    if address.startswith('tcp:'):
+        address = address[len('tcp:'):]
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f"无效的后台服务地址: {address}")
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+def check_listen_address(address):
+    """
+    检查后台服务的监听地址，返回 parse_address(address) 的结果。
+
+    异常:
+        ValueError: 地址格式错误，或者是本机回环地址以外的 TCP 地址 (协议没有身份验证)。
+    """
+    family, target = parse_address(address)
+    if family == socket.AF_INET:
+        host = target[0]
+        try:
+            loopback = host == 'localhost' or ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback:
+            raise ValueError(f"计时后台服务没有身份验证，只能监听本机回环地址 (例如 127.0.0.1)，不能监听 {host}")
+    return family, target
+
+
+# --- 服务端 ---
+class _HostedSession:
+    """后台进程中一个会话的日志、记录和状态 (由调度器直接更新)。"""
+
+    __slots__ = ('instance', 'session_id', 'journal_key', 'log_list', 'time_records', 'status_data', 'finished_at')
+
+    def __init__(self, instance, journal_key, log_list, time_records, status_data):
+        self.instance = instance
+        self.session_id = None
+        self.journal_key = journal_key
+        self.log_list = log_list
+        self.time_records = time_records
+        self.status_data = status_data
+        self.finished_at = None # 第一次发现会话已结束的时间 (单调时钟)
+
+    def delta(self, status_version=None, log_version=0, records_from=0, want_timeline=False):
+        """客户端拿到的版本之后的变化：状态 (版本变化时)、新增的日志和时间记录、时间线 (需要时)。"""
+        snapshot = read_status(self.status_data)
+        delta = {
+            'instance': self.instance,
+            'session_id': self.session_id,
+            'status_version': snapshot.version,
+            'logs': [record.message for record in self.log_list.since(log_version)],
+            'log_version': self.log_list.version,
+            'records': self.time_records.since(records_from),
+        }
+        if snapshot.version != status_version:
+            delta['status'] = {name: getattr(snapshot, name) for name in _WIRE_STATUS_FIELDS}
+        if want_timeline and snapshot.timeline is not None:
+            delta['timeline'] = {name: getattr(snapshot.timeline, name) for name in _TIMELINE_FIELDS}
+        return delta
+
+
+class TimerBackend:
+    """
+    后台进程中的请求处理：把命令转给 TimerScheduler，并为每个会话保存一份完整的状态供客户端拉取。
+    """
+
+    def __init__(self, scheduler=None, journal=None):
+        if scheduler is None:
+            from 计时调度器 import get_scheduler
+
+            scheduler = get_scheduler()
+        self.scheduler = scheduler
+        self.journal = journal # 会话持久化.SessionJournal，为 None 时会话不写日志
+        # 会话 ID 在后台重启后会从 1 重新开始，客户端带上 instance，旧进程的 ID 不会被误认
+        self.instance = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._sessions = {} # session_id -> _HostedSession
+
+    def handle(self, request):
+        """
+        处理一个请求 (已解析的 JSON 对象)，返回结果。
+
+        异常:
+            TimerBackendError: 未知的操作或缺少参数。
+        """
+        op = request.get('op') if isinstance(request, dict) else None
+        handler = getattr(self, f'_op_{op}', None) if isinstance(op, str) else None
+        if handler is None:
+            raise TimerBackendError(f"未知的操作: {op!r}")
+        try:
+            return handler(request)
+        except (KeyError, TypeError, ValueError) as e:
+            raise TimerBackendError(f"{op} 请求参数错误: {e!r}") from e
+
+    def start(self, params, status_fields, records, journal_recorder=None):
+        """注册一个会话 (参数含义与 TimerScheduler.register 相同)，返回 _HostedSession。"""
+        time_records = TimeRecords()
+        for played_time, scheduled_time in records:
+            time_records.append(played_time, scheduled=scheduled_time)
+        hosted = _HostedSession(
+            self.instance, journal_recorder.session_key if journal_recorder is not None else None,
+            LogStore(), time_records, TimerStatus(status_fields)
+        )
+        hosted.session_id = self.scheduler.register(
+            params['min_interval_minutes'],
+            params['max_interval_minutes'],
+            params['regular_sound_path'],
+            params['total_duration_minutes'],
+            params['final_sound_path'],
+            params['final_duration_seconds'],
+            params['volume_control'],
+            hosted.log_list,
+            hosted.time_records,
+            hosted.status_data,
+            seed=params.get('seed'),
+            journal=journal_recorder
+        )
+        if hosted.session_id is not None:
+            with self._lock:
+                self._sessions[hosted.session_id] = hosted
+        return hosted
+
+    def resume_unfinished(self):
+        """
+        恢复会话日志中未结束的会话 (后台进程重启后调用)，返回恢复的会话数。
+        休眠的会话 (无人查看) 不自动恢复，只在页面重新打开时恢复，否则每次重启都会重新占用声道。
+        """
+        if self.journal is None:
+            return 0
+        resumed = 0
+        for session_key in self.journal.unfinished_sessions():
+            state = self.journal.load(session_key)
+            if state is None or state.finished or state.hibernated or self._find(session_key) is not None:
+                continue
+            hosted = self.start(
+                state.params, state.to_status_data(),
+                list(zip(state.prompt_times, state.scheduled_times)),
+                self.journal.recorder(session_key)
+            )
+            resumed += hosted.session_id is not None
+        return resumed
+
+    def _snapshot(self):
+        # 会话表的浅拷贝：只在复制时持有 self._lock，之后调用调度器 (它有自己的锁) 不会阻塞其他请求
+        with self._lock:
+            return dict(self._sessions)
+
+    def _find(self, journal_key, sessions=None):
+        if sessions is None:
+            sessions = self._snapshot()
+        for hosted in sessions.values():
+            if hosted.journal_key == journal_key and self.scheduler.is_active(hosted.session_id):
+                return hosted
+        return None
+
+    def _purge_finished(self, sessions):
+        # 已结束的会话保留 FINISHED_RETENTION_SECONDS 秒，之后不再占用内存 (同时从快照 sessions 中移除)
+        now = time.monotonic()
+        expired = []
+        for session_id, hosted in sessions.items():
+            if self.scheduler.is_active(session_id):
+                continue
+            if hosted.finished_at is None:
+                hosted.finished_at = now
+            elif now - hosted.finished_at > FINISHED_RETENTION_SECONDS:
+                expired.append(session_id)
+        if expired:
+            with self._lock:
+                for session_id in expired:
+                    self._sessions.pop(session_id, None)
+            for session_id in expired:
+                del sessions[session_id]
+
+    # --- 操作 ---
+    def _session_id(self, request):
+        # 其他后台实例 (重启之前) 分配的 ID 在这里没有意义
+        return request['session_id'] if request.get('instance') == self.instance else None
+
+    def _op_ping(self, request):
+        return {'pid': os.getpid(), 'instance': self.instance}
+
+    def _op_start(self, request):
+        journal_key = request.get('journal_key')
+        recorder = None
+        if journal_key and self.journal is not None:
+            recorder = self.journal.recorder(journal_key)
+            recorder.started = bool(request.get('journal_started'))
+        hosted = self.start(request['params'], request['status'], request.get('records', ()), recorder)
+        return hosted.delta(records_from=len(hosted.time_records), want_timeline=True)
+
+    def _op_pause(self, request):
+        return self.scheduler.pause(self._session_id(request))
+
+    def _op_resume(self, request):
+        return self.scheduler.resume(self._session_id(request))
+
+    def _op_cancel(self, request):
+        return self.scheduler.cancel(self._session_id(request))
+
+    def _op_is_active(self, request):
+        return self.scheduler.is_active(self._session_id(request))
+
+    def _op_find(self, request):
+        hosted = self._find(request['journal_key'])
+        return None if hosted is None else hosted.delta(want_timeline=True)
+
+    def _op_counts(self, request):
+        return self.scheduler.session_counts()
+
+    def _op_poll(self, request):
+        # 每次拉取只复制一次会话表，不为每个会话分别加锁
+        sessions = self._snapshot()
+        self._purge_finished(sessions)
+        results = []
+        for entry in request['sessions']:
+            hosted = sessions.get(self._session_id(entry))
+            if hosted is not None:
+                if entry.get('touched'):
+                    # 一个 Streamlit 进程为所有标签页一起拉取，拉取本身不代表有人在看
+                    self.scheduler.touch(hosted.session_id)
+                results.append(hosted.delta(
+                    entry.get('status_version'), entry.get('log_version', 0),
+                    entry.get('records_from', 0), entry.get('want_timeline', False)
+                ))
+                continue
+            # 后台重启后会话以新的 ID 恢复：按会话日志的 key 找到它，客户端从头同步日志和状态
+            hosted = self._find(entry['journal_key'], sessions) if entry.get('journal_key') else None
+            if hosted is None:
+                results.append({'unknown': True})
+            else:
+                if entry.get('touched'):
+                    self.scheduler.touch(hosted.session_id)
+                results.append(hosted.delta(records_from=entry.get('records_from', 0), want_timeline=True))
+        return results
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        backend = self.server.backend
+        while True:
+            line = self.rfile.readline(MAX_REQUEST_BYTES + 1)
+            if not line:
+                return
+            if len(line) > MAX_REQUEST_BYTES:
+                # 剩下的数据无法再按行对齐，返回错误后断开连接
+                response = {'ok': False, 'error': f"请求超过 {MAX_REQUEST_BYTES} 字节"}
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                return
+            try:
+                response = {'ok': True, 'result': backend.handle(json.loads(line))}
+            except Exception as e:
+                # 单个请求出错 (格式错误、数据库异常……) 只返回错误，不断开连接
+                response = {'ok': False, 'error': str(e) if isinstance(e, TimerBackendError) else f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def create_server(address, backend):
+    """
+    在 address 上创建 (还没有开始服务的) 后台服务器。
+    Unix 套接字文件已经存在时：有进程在监听就抛出 OSError，否则当作上次异常退出留下的文件删除。
+    新建的套接字文件只有当前用户可以连接。
+
+    异常:
+        ValueError: 见 check_listen_address()。
+    """
+    family, target = check_listen_address(address)
+    if family == socket.AF_INET:
+        server = _TCPServer(target, _RequestHandler)
+    else:
+        if os.path.exists(target):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(target)
+            except OSError:
+                os.remove(target)
+            else:
+                raise OSError(f"{target} 上已经有计时后台服务在运行")
+            finally:
+                probe.close()
+        server = _UnixServer(target, _RequestHandler)
+        os.chmod(target, 0o600)
+    server.backend = backend
+    return server
+
+
+# --- 客户端 ---
+class TimerBackendClient:
+    """到后台服务的一条持久连接，请求串行发送 (每个 Streamlit 进程共用一个)。"""
+
+    def __init__(self, address, timeout=REQUEST_TIMEOUT_SECONDS):
+        self.address = address
+        self.timeout = timeout
+        self._family, self._target = parse_address(address)
+        self._lock = threading.Lock()
+        self._sock = None
+        self._reader = None
+
+    def call(self, op, **params):
+        """
+        发送一个请求并等待响应。
+
+        复用的连接失败时 (后台重启后旧连接已经失效，请求不会被处理) 重新连接并重发一次；
+        新建的连接失败时不重试。
+
+        异常:
+            ConnectionError: 无法连接或连接中断。
+            TimerBackendError: 后台返回了错误。
+        """
+        payload = json.dumps(dict(params, op=op), ensure_ascii=False).encode('utf-8') + b'\n'
+        with self._lock:
+            for attempt in range(2):
+                reused = self._sock is not None
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._sock.sendall(payload)
+                    line = self._reader.readline()
+                    if not line:
+                        raise ConnectionError("后台服务关闭了连接")
+                    break
+                except OSError as e:
+                    self._close()
+                    if attempt == 0 and reused:
+                        continue
+                    raise ConnectionError(f"无法连接计时后台服务 {self.address}: {e}") from e
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise TimerBackendError(response.get('error', '未知错误'))
+        return response['result']
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _connect(self):
+        sock = socket.socket(self._family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self._target)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._reader = sock.makefile('rb')
+
+    def _close(self):
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+            self._sock = self._reader = None
+
+
+class _Mirror:
+    """客户端进程中一个远程会话的本地副本，以及已经同步到的版本。"""
+
+    __slots__ = ('instance', 'session_id', 'journal_key', 'log_list', 'time_records', 'status_data',
+                 'status_version', 'log_version', 'records_from', 'timeline', 'touched')
+
+    def __init__(self, instance, session_id, journal_key, log_list, time_records, status_data, records_from=0):
+        self.instance = instance
+        self.session_id = session_id
+        self.journal_key = journal_key
+        self.log_list = log_list
+        self.time_records = time_records
+        self.status_data = status_data
+        self.status_version = None
+        self.log_version = 0
+        self.records_from = records_from
+        self.timeline = None
+        self.touched = False # 上次拉取之后页面是否查看过这个会话
+
+    def request(self):
+        return {
+            'instance': self.instance, 'session_id': self.session_id, 'journal_key': self.journal_key,
+            'status_version': self.status_version, 'log_version': self.log_version,
+            'records_from': self.records_from, 'want_timeline': self.timeline is None,
+            'touched': self.touched,
+        }
+
+    def apply(self, delta):
+        """
+        写入后台返回的变化，返回会话是否已经结束 (或已休眠)。状态最后写入，UI 看到结束状态时日志已经完整。
+        """
+        if delta['instance'] != self.instance: # 后台重启后会话以新的 ID 恢复，状态从头同步
+            self.instance = delta['instance']
+            self.session_id = delta['session_id']
+            self.status_version = None
+        for message in delta['logs']:
+            self.log_list.append(message)
+        self.log_version = delta['log_version']
+        for played_time, scheduled_time in delta['records']:
+            append_record(self.time_records, played_time, scheduled_time)
+        self.records_from += len(delta['records'])
+        if 'timeline' in delta:
+            self.timeline = PromptTimeline(**delta['timeline'])
+        with status_batch(self.status_data):
+            for name, value in delta.get('status', {}).items():
+                self.status_data[name] = value
+            if self.timeline is not None and self.status_data.get('timeline') is not self.timeline:
+                self.status_data['timeline'] = self.timeline
+        self.status_version = delta['status_version']
+        return self.status_data.get('thread_status') in ('finished', 'hibernated')
+
+
+class RemoteScheduler:
+    """
+    接口与 TimerScheduler 相同 (register / pause / resume / cancel / touch / is_active / find_by_journal_key /
+    session_counts)，实际的会话运行在后台服务中。
+
+    传给 register() 的 log_list / time_records / status_data 是本地副本，refresh() 一次请求拉取
+    本进程所有会话的变化并写入副本，页面的读取方式不变。会话结束并同步完最终状态后不再拉取。
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        # 页面持有的是本进程分配的会话 ID，后台重启后 mirror.session_id 变化，页面持有的 ID 不变
+        self._mirrors = {} # 本地会话 ID -> _Mirror
+        self._local_ids = itertools.count(1)
+        self._last_refresh = 0.0
+
+    def register(
+        self,
+        min_interval_minutes,
+        max_interval_minutes,
+        regular_sound_path,
+        total_duration_minutes,
+        final_sound_path,
+        final_duration_seconds,
+        volume_control,
+        log_list,
+        time_records,
+        status_data,
+        seed=None,
+        journal=None
+    ):
+        """
+        在后台服务中注册会话，参数和返回值与 TimerScheduler.register 相同。
+        journal 只传 key：后台进程打开同一个会话日志数据库继续记录。
+        无法连接后台时与启动失败一样返回 None，原因写入 log_list，status_data['thread_status'] 为 'finished'。
+        """
+        if isinstance(time_records, TimeRecords):
+            records = time_records.since(0)
+        else:
+            records = [(played_time, None) for played_time in time_records]
+        params = {
+            'min_interval_minutes': min_interval_minutes,
+            'max_interval_minutes': max_interval_minutes,
+            'regular_sound_path': regular_sound_path,
+            'total_duration_minutes': total_duration_minutes,
+            'final_sound_path': final_sound_path,
+            'final_duration_seconds': final_duration_seconds,
+            'volume_control': volume_control,
+            'seed': seed,
+        }
+        journal_key = journal.session_key if journal is not None else None
+        try:
+            delta = self.client.call(
+                'start', params=params, records=records,
+                status={name: status_data.get(name) for name in _WIRE_STATUS_FIELDS},
+                journal_key=journal_key, journal_started=journal is not None and journal.started
+            )
+        except (ConnectionError, TimerBackendError) as e:
+            msg = f"错误：{e}"
+            log_list.append(msg)
+            with status_batch(status_data):
+                status_data['current_status'] = msg
+                status_data['thread_status'] = 'finished'
+            return None
+        if journal is not None:
+            journal.started = True
+        mirror = _Mirror(delta['instance'], delta['session_id'], journal_key, log_list, time_records, status_data, len(records))
+        with self._lock:
+            mirror.apply(delta)
+            if mirror.session_id is None:
+                return None
+            local_id = next(self._local_ids)
+            self._mirrors[local_id] = mirror
+            return local_id
+
+    def _command(self, op, session_id):
+        with self._lock:
+            mirror = self._mirrors.get(session_id)
+        if mirror is None:
+            return False
+        try:
+            result = self.client.call(op, instance=mirror.instance, session_id=mirror.session_id)
+        except (ConnectionError, TimerBackendError):
+            return False
+        self.refresh(force=True) # 页面在命令之后立即 rerun，马上拿到新的状态
+        return result
+
+    def pause(self, session_id):
+        return self._command('pause', session_id)
+
+    def resume(self, session_id):
+        return self._command('resume', session_id)
+
+    def cancel(self, session_id):
+        return self._command('cancel', session_id)
+
+    def touch(self, session_id):
+        """页面心跳：不单独发请求，下次拉取时一起告诉后台。返回会话是否仍在同步。"""
+        with self._lock:
+            mirror = self._mirrors.get(session_id)
+            if mirror is None:
+                return False
+            mirror.touched = True
+            return True
+
+    def is_active(self, session_id):
+        with self._lock:
+            mirror = self._mirrors.get(session_id)
+        if mirror is None:
+            return False
+        try:
+            return self.client.call('is_active', instance=mirror.instance, session_id=mirror.session_id)
+        except (ConnectionError, TimerBackendError):
+            return False
+
+    def find_by_journal_key(self, session_key):
+        """与 TimerScheduler.find_by_journal_key 相同；会话在后台运行时创建本地副本并完整同步一次。"""
+        with self._lock:
+            for local_id, mirror in self._mirrors.items():
+                if mirror.journal_key == session_key:
+                    return local_id, mirror.log_list, mirror.time_records, mirror.status_data
+            try:
+                delta = self.client.call('find', journal_key=session_key)
+            except (ConnectionError, TimerBackendError):
+                return None
+            if delta is None:
+                return None
+            mirror = _Mirror(delta['instance'], delta['session_id'], session_key, LogStore(), TimeRecords(), TimerStatus())
+            local_id = next(self._local_ids)
+            if not mirror.apply(delta):
+                self._mirrors[local_id] = mirror
+            return local_id, mirror.log_list, mirror.time_records, mirror.status_data
+
+    def session_counts(self):
+        try:
+            return self.client.call('counts')
+        except (ConnectionError, TimerBackendError):
+            return {'running': 0, 'paused': 0, 'finishing': 0}
+
+    def refresh(self, force=False):
+        """
+        一次请求拉取本进程所有未结束会话的变化 (距离上次拉取不到 REFRESH_INTERVAL_SECONDS 秒时跳过)。
+        后台暂时不可用时保持上一次的状态，下次刷新时重试。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self._mirrors or (not force and now - self._last_refresh < REFRESH_INTERVAL_SECONDS):
+                return
+            self._last_refresh = now
+            local_ids = list(self._mirrors)
+            try:
+                deltas = self.client.call(
+                    'poll', sessions=[self._mirrors[local_id].request() for local_id in local_ids]
+                )
+            except (ConnectionError, TimerBackendError):
+                return
+            for local_id, delta in zip(local_ids, deltas):
+                mirror = self._mirrors[local_id]
+                mirror.touched = False
+                if delta.get('unknown'):
+                    # 后台重启且没有恢复这个会话 (例如没有会话日志)，不会再有更新
+                    msg = "错误：计时后台服务中已经没有这个会话 (后台可能已重启)"
+                    mirror.log_list.append(msg)
+                    with status_batch(mirror.status_data):
+                        mirror.status_data['current_status'] = msg
+                        mirror.status_data['thread_status'] = 'finished'
+                    finished = True
+                else:
+                    finished = mirror.apply(delta)
+                if finished:
+                    del self._mirrors[local_id]
+
+
+_remote_scheduler = None
+_remote_scheduler_lock = threading.Lock()
+
+
+def get_timer_backend():
+    """
+    返回页面使用的调度器：设置了环境变量 STUDY_TIMER_BACKEND (后台服务地址) 时是共享的 RemoteScheduler，
+    否则是进程内的 TimerScheduler (同时启动会话回收线程，见 会话回收.py)。
+    """
+    global _remote_scheduler
+    address = os.environ.get('STUDY_TIMER_BACKEND')
+    if not address:
+        from 会话回收 import start_session_reaper
+        from 计时调度器 import get_scheduler
+
+        scheduler = get_scheduler()
+        start_session_reaper(scheduler)
+        return scheduler
+    with _remote_scheduler_lock:
+        if _remote_scheduler is None:
+            _remote_scheduler = RemoteScheduler(TimerBackendClient(address))
+        return _remote_scheduler
+
+
+def refresh_timer_backend():
+    """使用后台服务时拉取本进程所有会话的最新状态 (进程内调度器直接写入状态，不需要拉取)。"""
+    if _remote_scheduler is not None:
+        _remote_scheduler.refresh()
+
+
+def main(argv=None):
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description="计时后台服务 (Streamlit 页面通过 STUDY_TIMER_BACKEND 连接)")
+    parser.add_argument('--listen', default=DEFAULT_BACKEND_ADDRESS,
+                        help=f"监听地址 unix:路径 或 tcp:主机:端口 (只能是本机回环地址)，默认 {DEFAULT_BACKEND_ADDRESS}")
+    parser.add_argument('--no-resume', action='store_true', help="启动时不恢复会话日志中未结束的会话")
+    parser.add_argument('--no-journal', action='store_true', help="不写会话日志 (后台重启后会话不能恢复)")
+    parser.add_argument('--audio', default=os.environ.get('STUDY_TIMER_AUDIO', 'pygame'),
+                        help="音频后端: pygame (默认)、null (不输出声音，只记录播放事件) 或 wav:<目录>")
+    parser.add_argument('--orphan-grace', type=float, default=None,
+                        help="超过这么多秒没有页面查看的会话被休眠或停止 (默认读取 STUDY_TIMER_ORPHAN_GRACE_SECONDS，"
+                             "未设置时 600)，0 表示不回收")
+    parser.add_argument('--orphan-action', choices=('hibernate', 'stop'), default=None,
+                        help="回收方式: hibernate (暂停并释放资源，可以从会话日志恢复) 或 stop，默认读取 STUDY_TIMER_ORPHAN_ACTION")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="在 127.0.0.1 的这个端口上以 Prometheus 格式导出运行指标 (/metrics)，默认 0 表示不导出")
+    args = parser.parse_args(argv)
+
+    from 会话回收 import start_session_reaper
+    from 运行指标 import start_metrics_server
+    from 音频后端 import create_audio_backend, set_audio_backend
+
+    try:
+        check_listen_address(args.listen)
+        audio_backend = create_audio_backend(args.audio)
+    except ValueError as e:
+        parser.error(str(e))
+    set_audio_backend(audio_backend) # 后台中的调度器在会话启动时使用它
+
+    if args.metrics_port and start_metrics_server(args.metrics_port) is None:
+        print(f"警告：无法在端口 {args.metrics_port} 上导出运行指标 (端口被占用?)")
+
+    journal = None
+    if not args.no_journal:
+        import sqlite3
+
+        from 会话持久化 import get_journal
+
+        try:
+            journal = get_journal()
+        except sqlite3.Error as e:
+            print(f"警告：会话日志不可用，会话不会持久化: {e}")
+    backend = TimerBackend(journal=journal)
+    try:
+        start_session_reaper(backend.scheduler, args.orphan_grace, args.orphan_action)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        server = create_server(args.listen, backend)
+    except OSError as e:
+        print(f"错误：无法在 {args.listen} 上监听: {e}")
+        return 1
+    if not args.no_resume:
+        resumed = backend.resume_unfinished()
+        if resumed:
+            print(f"已从会话日志恢复 {resumed} 个未结束的会话。")
+
+    # SIGTERM 与 Ctrl+C 一样退出；未结束的会话留在会话日志中，下次启动时恢复
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print(f"计时后台服务正在监听 {args.listen}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        family, target = parse_address(args.listen)
+        if family != socket.AF_INET and os.path.exists(target):
+            os.remove(target)
+        audio_backend.flush(timeout=5)
+        if journal is not None:
+            journal.flush(timeout=5)
+        from 学习历史 import get_history
+
+        get_history().flush(timeout=5) # 刚结束的会话写入历史记录
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,658 @@
+# 计时调度器.py
+# 进程级共享的计时调度器：所有学习会话的下一个截止时间放在同一个堆 (优先队列) 里，
+# 由一个调度线程统一处理，而不是每个会话各开一个线程睡 90 分钟。
+import collections
+import contextlib
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+from 提示时间线 import compile_timeline
+from 音频后端 import get_audio_backend
+from 时间记录 import append_record
+from 会话持久化 import record_event
+from 时钟 import get_clock, monotonic_at
+from 状态快照 import status_batch
+from 学习函数 import check_sound_files, log_session_start, resolve_volume # 与 run_audio_timer 相同的日志
+from 学习历史 import record_session_history
+from 运行指标 import (
+    PAUSE_DURATION, PROMPT_LATENESS, PROMPTS_PLAYED, SESSIONS_FINISHED, SESSIONS_HIBERNATED, register_session_gauge
+)
+
+
+class _TimerSession:
+    """
+    调度器内部的单个会话状态。
+    与 run_audio_timer 使用相同的 log_list / time_records / status_data 约定，UI 无需区分。
+    """
+
+    __slots__ = (
+        'session_id', 'total_duration_seconds', 'total_duration_minutes', 'final_duration_seconds',
+        'regular_sound_path', 'final_sound_path', 'regular_sound', 'final_sound',
+        'log_list', 'time_records', 'status_data', 'timeline', 'next_index',
+        'phase', 'generation', 'audio', 'mixer_lease', 'result', 'journal', 'last_seen',
+        'start_mono', 'pause_mono'
+    )
+
+    def __init__(self, session_id, log_list, time_records, status_data):
+        self.session_id = session_id
+        self.log_list = log_list
+        self.time_records = time_records
+        self.status_data = status_data
+        # 'running' (等待下一个常规提示音), 'paused', 'finishing' (播放结束音), 'finished', 'hibernated' (见 hibernate())
+        self.phase = 'running'
+        self.generation = 0 # 每次重新调度时加 1，堆中旧的条目据此作废 (惰性删除)
+        self.audio = None # 会话使用的音频后端 (见 音频后端.py)
+        self.mixer_lease = None # 从音频后端租用的专用声道，暂停/停止只影响这个声道
+        self.result = None # 结束状态: "completed", "stopped", "error"
+        self.timeline = None # 启动时编译好的 PromptTimeline
+        self.next_index = 0 # 下一个要播放的常规提示音在 timeline.prompt_offsets 中的下标
+        self.journal = None # 可选的会话日志记录器 (会话持久化.SessionRecorder)
+        self.last_seen = 0.0 # 页面最近一次心跳 (touch) 的单调时钟时间，见 会话回收.py
+        self.start_mono = None # status_data['start_time'] 换算到单调时钟的值，截止时间由它计算
+        self.pause_mono = None # 当前暂停开始的单调时钟时间
+
+
+class TimerScheduler:
+    """
+    进程级计时引擎。
+
+    每个会话通过 register() 注册，之后通过 pause() / resume() / cancel() 控制。
+    所有会话的下一个截止时间保存在一个最小堆里，调度线程在一个 Condition 上阻塞到
+    最早的截止时间或有新的控制操作，所以线程数和唤醒次数不随会话数增长。
+
+    这把锁只保护堆和会话表：加载提示音、编译时间线在注册会话之前完成；会话日志、学习历史和
+    归还声道在锁内只排进 _deferred，释放锁之后再按顺序执行，慢的会话不会推迟其他会话的提示音。
+
+    每个会话启动时编译一条 PromptTimeline (见 提示时间线.py)，截止时间由
+    start_time + paused_duration + 时间线偏移 得到。时间线以实际运行时间为坐标，
+    所以暂停只会整体推迟后面的提示音 (与 run_audio_timer 相同，恢复后不重新抽取间隔)。
+    写入 status_data 和会话日志的时间戳是 Unix 时间；堆中的截止时间、暂停时长和心跳用单调时钟，
+    start_time 在注册时换算一次 (见 时钟.monotonic_at)。
+    """
+
+    def __init__(self, clock=None, audio_backend=None):
+        # 时间戳 (clock.time()) 和截止时间 (clock.monotonic()) 都来自这个时钟，
+        # 截止时间不受系统时间跳变影响，不会让所有会话同时"到期"
+        # 调度线程在真实的 Condition 上等待；使用 VirtualClock 时由 advance_to_next_deadline() 推动
+        self._clock = clock if clock is not None else get_clock()
+        # 为 None 时每个会话启动时使用 get_audio_backend() (可以由 音频后端.set_audio_backend() 替换)
+        self._audio_backend = audio_backend
+        self._condition = threading.Condition()
+        self._heap = [] # (deadline, seq, session_id, generation)
+        self._sessions = {} # session_id -> _TimerSession (只包含未结束的会话)
+        self._ids = itertools.count(1)
+        self._seq = itertools.count() # 截止时间相同时保证堆元素可比较
+        self._thread = None
+        self._depth = 0 # 当前持锁线程进入 _locked() 的层数 (只在持锁时修改)
+        self._deferred = collections.deque() # 释放锁之后再执行的 (函数, 参数, 关键字参数)，见 _defer()
+        self._deferred_lock = threading.Lock() # 保证 _deferred 按加入的顺序逐个执行
+        self.wakeups = 0 # 调度线程被唤醒的累计次数 (性能基准用)
+
+    # --- 公共 API ---
+    def register(
+        self,
+        min_interval_minutes,
+        max_interval_minutes,
+        regular_sound_path,
+        total_duration_minutes,
+        final_sound_path,
+        final_duration_seconds,
+        volume_control,
+        log_list,
+        time_records,
+        status_data,
+        seed=None,
+        journal=None
+    ):
+        """
+        注册并启动一个新会话，参数含义与 run_audio_timer 相同 (不需要 stop_event/pause_event)。
+        seed (int | None) 用于生成时间线的随机种子，相同的种子和配置得到相同的提示音时间点。
+        编译好的时间线也会放在 status_data['timeline'] 中，UI 可以用它不加锁地推算实时状态。
+
+        journal (SessionRecorder | None) 是会话日志记录器：新会话写入 start 事件 (包含随机种子)，
+        之后记录暂停、继续、常规提示音和结束事件。恢复会话时传入 SessionState.to_status_data()
+        (thread_status 为 'resuming') 和原来的 seed，时间线与重启前完全相同；重启期间错过的提示音不再补响，
+        重启前处于暂停状态的会话恢复后仍然是暂停状态。
+
+        返回:
+            int | None: 会话 ID；如果启动阶段出错 (文件不存在、mixer 初始化或音频加载失败)，
+                        或恢复的会话在重启期间已经结束，返回 None。此时信息已写入 log_list，
+                        status_data['thread_status'] 为 'finished'。
+        """
+        # 加载提示音 (可能要初始化 mixer、解码和转换文件) 和编译时间线都在持锁之前完成
+        session = _TimerSession(next(self._ids), log_list, time_records, status_data)
+        session.journal = journal
+        session.total_duration_minutes = total_duration_minutes
+        session.total_duration_seconds = total_duration_minutes * 60
+        session.final_duration_seconds = final_duration_seconds
+        session.regular_sound_path = regular_sound_path
+        session.final_sound_path = final_sound_path
+
+        resuming = status_data.get('thread_status') == 'resuming'
+        if resuming:
+            log_list.append(f"--- 已从会话日志恢复于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._clock.time()))}，计时从断点继续 ---")
+        else:
+            log_session_start(
+                log_list, min_interval_minutes, max_interval_minutes, regular_sound_path,
+                total_duration_minutes, final_sound_path, final_duration_seconds
+            )
+        with status_batch(status_data):
+            status_data['thread_status'] = 'running'
+            status_data['current_status'] = "正在运行..."
+            if status_data.get('start_time') is None:
+                status_data['start_time'] = self._clock.time()
+
+        if resuming:
+            record_event(journal, 'restore', ts=self._clock.time()) # 休眠的会话重新打开后，后台重启时又会自动恢复它
+        if not self._load_sounds(session, volume_control):
+            with self._locked():
+                self._finalize(session, "error") # 声道在释放锁之后归还
+            return None
+
+        # 提示音播放不阻塞调度，间隔按截止时间计算；提示音时长只用来让结束音等最后一次提示音播完
+        session.timeline = compile_timeline(
+            min_interval_minutes,
+            max_interval_minutes,
+            total_duration_minutes,
+            final_duration_seconds,
+            prompt_length_seconds=max(0.0, session.regular_sound.get_length()),
+            seed=seed
+        )
+        status_data['timeline'] = session.timeline
+        log_list.append(f"已生成提示时间线：共 {len(session.timeline)} 次常规提示音 (随机种子 {session.timeline.seed})。")
+        if journal is not None and not journal.started:
+            record_event(
+                journal, 'start', ts=status_data['start_time'],
+                start_time=status_data['start_time'],
+                min_interval_minutes=min_interval_minutes,
+                max_interval_minutes=max_interval_minutes,
+                regular_sound_path=regular_sound_path,
+                total_duration_minutes=total_duration_minutes,
+                final_sound_path=final_sound_path,
+                final_duration_seconds=final_duration_seconds,
+                volume_control=volume_control,
+                seed=session.timeline.seed
+            )
+
+        with self._locked():
+            self._sessions[session.session_id] = session
+            now = self._clock.monotonic()
+            session.last_seen = now
+            session.start_mono = monotonic_at(self._clock, status_data['start_time'])
+            if resuming and not self._restore_position(session):
+                return None
+            if session.phase == 'running':
+                self._schedule_next(session, now)
+            self._ensure_thread()
+            return session.session_id
+
+    def pause(self, session_id):
+        """暂停会话。只有处于常规计时阶段的会话可以暂停，返回是否成功。"""
+        with self._locked():
+            session = self._sessions.get(session_id)
+            if session is None or session.phase != 'running':
+                return False
+            now = self._clock.time()
+            session.pause_mono = self._clock.monotonic()
+            status_data = session.status_data
+            session.phase = 'paused'
+            session.generation += 1 # 作废堆中的等待条目
+            self._stop_channels(session)
+            with status_batch(status_data):
+                status_data['elapsed_time'] = (session.pause_mono - session.start_mono) - status_data['paused_duration']
+                status_data['remaining_time'] = max(0.0, session.total_duration_seconds - status_data['elapsed_time'])
+                status_data['thread_status'] = 'paused'
+                status_data['current_status'] = "已暂停..."
+                status_data['pause_start_time'] = now
+                status_data['current_pause_duration_display'] = 0.0
+            self._defer(record_event, session.journal, 'pause', ts=now)
+            session.log_list.append(f"\n--- 计时已暂停于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))} ---")
+            return True
+
+    def resume(self, session_id):
+        """继续已暂停的会话，返回是否成功。"""
+        with self._locked():
+            session = self._sessions.get(session_id)
+            if session is None or session.phase != 'paused':
+                return False
+            now = self._clock.time()
+            now_mono = self._clock.monotonic()
+            status_data = session.status_data
+            log_list = session.log_list
+            with status_batch(status_data):
+                current_pause_duration = now_mono - session.pause_mono
+                status_data['paused_duration'] += current_pause_duration
+                PAUSE_DURATION.observe(current_pause_duration, runner='scheduler')
+                self._defer(record_event, session.journal, 'resume', ts=now)
+                status_data['pause_start_time'] = None
+                status_data['current_pause_duration_display'] = 0.0
+                status_data['thread_status'] = 'running'
+                status_data['current_status'] = "正在运行..."
+                session.phase = 'running'
+            paused_duration = status_data['paused_duration']
+            log_list.append(f"\n--- 计时已恢复于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))} ---")
+            log_list.append(f"本次暂停时长: {current_pause_duration:.2f} 秒 ({current_pause_duration/60:.2f} 分钟)")
+            log_list.append(f"累计暂停时长: {paused_duration:.2f} 秒 ({paused_duration/60:.2f} 分钟)")
+            # 时间线以实际运行时间为坐标，恢复后按新的累计暂停时长重新计算截止时间
+            self._schedule_next(session, now_mono)
+            return True
+
+    def cancel(self, session_id):
+        """停止会话 (对应"结束计时")，返回是否成功。"""
+        with self._locked():
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            log_list = session.log_list
+            if session.phase == 'finishing':
+                log_list.append("播放结束音期间收到停止信号，提前中止。")
+                session.status_data['current_status'] = "结束音播放期间中止"
+            else:
+                if session.phase == 'paused':
+                    log_list.append("\n收到停止信号，暂停中中止。")
+                log_list.append("\n收到停止信号，程序中止。")
+                session.status_data['current_status'] = "任务已停止"
+            self._finalize(session, "stopped")
+            return True
+
+    def hibernate(self, session_id):
+        """
+        休眠无人查看的会话 (见 会话回收.py)：先暂停 (会话日志记录暂停事件)，再从调度器中移除并归还声道，
+        不记录结束事件，也不写入学习历史，而是记录 hibernate 事件：会话日志中它仍是暂停中的未结束会话，
+        页面重新打开 (?session=...) 时从暂停处恢复，但计时后台重启时不会自动恢复它。
+        没有会话日志的会话无法恢复，改为停止。
+        返回是否成功 (播放结束音阶段马上就会结束，不休眠)。
+        """
+        with self._locked():
+            session = self._sessions.get(session_id)
+            if session is None or session.phase == 'finishing':
+                return False
+            if session.journal is None or not session.journal.started:
+                session.log_list.append("\n会话长时间无人查看，且没有会话日志无法恢复，已停止。")
+                session.status_data['current_status'] = "会话长时间无人查看，已停止"
+                self._finalize(session, "stopped")
+                return True
+            if session.phase == 'running':
+                self.pause(session_id)
+            now = self._clock.time()
+            session.phase = 'hibernated'
+            session.generation += 1
+            self._sessions.pop(session_id, None)
+            if session.mixer_lease is not None:
+                self._defer(session.mixer_lease.release)
+                session.mixer_lease = None
+            session.regular_sound = session.final_sound = None
+            self._defer(record_event, session.journal, 'hibernate', ts=now)
+            session.log_list.append(f"\n--- 会话长时间无人查看，已于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))} 休眠 (计时保持暂停) ---")
+            with status_batch(session.status_data):
+                session.status_data['thread_status'] = 'hibernated'
+                session.status_data['current_status'] = "会话已休眠 (计时保持暂停，可以从会话日志恢复)"
+            SESSIONS_HIBERNATED.inc()
+            return True
+
+    def touch(self, session_id):
+        """页面心跳：记录会话仍有页面在查看，返回会话是否仍未结束。"""
+        with self._condition:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            session.last_seen = self._clock.monotonic()
+            return True
+
+    def idle_sessions(self, idle_seconds):
+        """超过 idle_seconds 秒没有心跳的未结束会话 ID (播放结束音的会话马上就会结束，不包括在内)。"""
+        with self._condition:
+            cutoff = self._clock.monotonic() - idle_seconds
+            return [
+                session.session_id for session in self._sessions.values()
+                if session.last_seen < cutoff and session.phase != 'finishing'
+            ]
+
+    def liveness_counts(self, idle_seconds):
+        """返回 {'live': n, 'orphaned': n}：最近 idle_seconds 秒内有没有页面心跳的未结束会话数。"""
+        with self._condition:
+            cutoff = self._clock.monotonic() - idle_seconds
+            orphaned = sum(1 for session in self._sessions.values() if session.last_seen < cutoff)
+            return {'live': len(self._sessions) - orphaned, 'orphaned': orphaned}
+
+    def is_active(self, session_id):
+        """会话是否仍未结束 (包括暂停和播放结束音阶段)。"""
+        with self._condition:
+            return session_id in self._sessions
+
+    def find_by_journal_key(self, session_key):
+        """
+        查找使用 session_key 会话日志的未结束会话 (例如页面刷新后，进程内的会话仍在运行)。
+
+        返回:
+            tuple | None: (会话 ID, log_list, time_records, status_data)，没有找到时返回 None。
+        """
+        with self._condition:
+            for session in self._sessions.values():
+                if session.journal is not None and session.journal.session_key == session_key:
+                    return session.session_id, session.log_list, session.time_records, session.status_data
+            return None
+
+    def session_counts(self):
+        """返回各阶段的会话数量，例如 {'running': 3, 'paused': 1, 'finishing': 0}。"""
+        with self._condition:
+            counts = {'running': 0, 'paused': 0, 'finishing': 0}
+            for session in self._sessions.values():
+                counts[session.phase] += 1
+            return counts
+
+    def advance_to_next_deadline(self):
+        """
+        把虚拟时钟 (时钟.VirtualClock) 推进到最早的截止时间，并在调用线程中处理所有到期的会话，
+        用于测试和模拟中逐步推动调度器。返回前会话日志、学习历史等延后执行的操作已经完成。
+
+        返回:
+            float | None: 推进到的截止时间 (单调时钟)；没有等待中的截止时间时返回 None。
+
+        异常:
+            RuntimeError: 调度器使用的不是虚拟时钟。
+        """
+        if not getattr(self._clock, 'virtual', False):
+            raise RuntimeError("advance_to_next_deadline() 只能用于虚拟时钟")
+        with self._locked():
+            while self._heap:
+                _, _, session_id, generation = self._heap[0]
+                session = self._sessions.get(session_id)
+                if session is not None and session.generation == generation:
+                    break
+                heapq.heappop(self._heap) # 已作废的旧条目
+            if not self._heap:
+                return None
+            deadline = self._heap[0][0]
+            # 推进期间到期的虚拟时钟事件 (例如 call_later 安排的暂停) 在这里执行
+            self._clock.advance(deadline - self._clock.monotonic())
+            self._process_due(self._clock.monotonic())
+            self._condition.notify() # 调度线程按新的时间重新计算等待时长
+            return deadline
+
+    # --- 锁和延后执行 ---
+    @contextlib.contextmanager
+    def _locked(self):
+        """持有 self._condition；最外层退出并释放锁之后执行期间排进 _deferred 的操作。"""
+        with self._condition:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                outermost = self._depth == 0
+        if outermost:
+            self._drain_deferred()
+
+    def _defer(self, func, *args, **kwargs):
+        # 调用方已持有 self._condition
+        self._deferred.append((func, args, kwargs))
+
+    def _drain_deferred(self):
+        # 不持有 self._condition。多个线程同时调用时由 _deferred_lock 保证按加入的顺序执行
+        with self._deferred_lock:
+            while self._deferred:
+                func, args, kwargs = self._deferred.popleft()
+                try:
+                    func(*args, **kwargs)
+                except Exception:
+                    pass # 日志或历史记录失败不能影响计时
+
+    # --- 调度线程 ---
+    def _ensure_thread(self):
+        # 调用方已持有 self._condition
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="TimerScheduler", daemon=True)
+            self._thread.start()
+        else:
+            self._condition.notify()
+
+    def _push(self, session, deadline):
+        session.generation += 1
+        heapq.heappush(self._heap, (deadline, next(self._seq), session.session_id, session.generation))
+        self._condition.notify()
+
+    def _run(self):
+        with self._condition:
+            while True:
+                now = self._clock.monotonic()
+                self._process_due(now)
+                if self._deferred:
+                    # 会话日志、学习历史等在释放锁之后执行，然后重新检查到期的会话
+                    self._condition.release()
+                    try:
+                        self._drain_deferred()
+                    finally:
+                        self._condition.acquire()
+                    continue
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._condition.wait(timeout)
+                self.wakeups += 1
+
+    def _process_due(self, now):
+        # 调用方已持有 self._condition
+        while self._heap and self._heap[0][0] <= now:
+            _, _, session_id, generation = heapq.heappop(self._heap)
+            session = self._sessions.get(session_id)
+            if session is None or session.generation != generation:
+                continue # 已暂停/已停止/已重新调度的旧条目
+            try:
+                self._on_deadline(session, now)
+            except Exception as e:
+                # 单个会话出错不能影响调度线程和其他会话
+                msg = f"程序运行过程中发生未捕获的异常: {e}"
+                session.log_list.append(msg)
+                session.status_data['current_status'] = msg
+                self._finalize(session, "error")
+
+    # --- 会话状态机 ---
+    def _on_deadline(self, session, now):
+        if session.phase == 'finishing':
+            self._stop_channels(session)
+            session.log_list.append(f"结束提示音播放完毕 ({session.final_duration_seconds} 秒)。")
+            session.status_data['current_status'] = "任务完成"
+            self._finalize(session, "completed")
+            return
+
+        status_data = session.status_data
+        log_list = session.log_list
+        if session.next_index >= len(session.timeline):
+            log_list.append("常规提示音总运行时长已达到。准备播放结束提示音。")
+            with status_batch(status_data):
+                status_data['current_status'] = "常规计时结束，准备结束音..."
+                status_data['thread_status'] = 'finishing_regular'
+                status_data['elapsed_time'] = session.total_duration_seconds
+                status_data['remaining_time'] = 0.0
+            self._begin_final(session)
+            return
+
+        # 播放常规提示音
+        scheduled_time = (status_data['start_time'] + status_data['paused_duration']
+                          + session.timeline.prompt_offsets[session.next_index])
+        session.next_index += 1
+        log_list.append(f"时间到！播放常规提示音 '{os.path.basename(session.regular_sound_path)}'...")
+        status_data['current_status'] = "播放常规提示音..."
+        try:
+            self._play(session, session.regular_sound)
+            played_time = self._clock.time()
+            append_record(session.time_records, played_time, scheduled=scheduled_time)
+            status_data['play_count'] += 1
+            self._defer(record_event, session.journal, 'prompt', ts=played_time, scheduled=scheduled_time)
+            PROMPTS_PLAYED.inc(runner='scheduler')
+            PROMPT_LATENESS.observe(max(0.0, played_time - scheduled_time), runner='scheduler')
+        except session.audio.error as e:
+            msg = f"播放常规音频时出错 ({session.audio.name})：{e}"
+            log_list.append(msg)
+            status_data['current_status'] = msg
+        self._schedule_next(session, now)
+
+    def _schedule_next(self, session, now):
+        """按时间线把会话的下一个截止时间 (下一个常规提示音或结束音) 放入堆中。now 是单调时钟时间。"""
+        status_data = session.status_data
+        timeline = session.timeline
+        # 时间线偏移 -> 截止时间：开始时间 + 累计暂停时长 + 偏移 (单调时钟坐标)
+        base_time = session.start_mono + status_data['paused_duration']
+        actual_elapsed_time = now - base_time
+        remaining_regular_time = session.total_duration_seconds - actual_elapsed_time
+        with status_batch(status_data):
+            status_data['elapsed_time'] = actual_elapsed_time
+            status_data['remaining_time'] = max(0.0, remaining_regular_time)
+
+        if session.next_index >= len(timeline):
+            # 没有剩余的常规提示音，等到结束音窗口开始
+            self._push(session, base_time + timeline.final_start)
+            return
+
+        deadline = base_time + timeline.prompt_offsets[session.next_index]
+        actual_sleep_duration = max(0.0, deadline - now)
+        log_list = session.log_list
+        log_list.append(f"\n--------------------")
+        log_list.append(f"当前实际运行: {actual_elapsed_time:.2f} 秒 ({actual_elapsed_time/60:.2f} 分钟)")
+        log_list.append(f"常规提示音阶段剩余时间: {remaining_regular_time:.2f} 秒 ({remaining_regular_time/60:.2f} 分钟)")
+        log_list.append(f"下一个常规提示音将在约 {actual_sleep_duration:.2f} 秒 ({actual_sleep_duration/60:.2f} 分钟) 后尝试响起。")
+        log_list.append(f"当前系统时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._clock.time()))}")
+        log_list.append(f"--------------------")
+        status_data['current_status'] = f"等待常规提示音... ({math.floor(actual_sleep_duration)} 秒)"
+        self._push(session, deadline)
+
+    def _begin_final(self, session):
+        log_list = session.log_list
+        status_data = session.status_data
+        log_list.append("停止所有正在播放的声音。")
+        self._stop_channels(session)
+        log_list.append("\n====================")
+        log_list.append(f"程序已运行达到设定的 {session.total_duration_minutes} 分钟常规时长。")
+        log_list.append(f"开始播放结束提示音 '{os.path.basename(session.final_sound_path)}'，持续 {session.final_duration_seconds} 秒...")
+        with status_batch(status_data):
+            status_data['current_status'] = "播放结束提示音..."
+            status_data['thread_status'] = 'finishing'
+        session.phase = 'finishing'
+        try:
+            log_list.append(f"正在播放结束提示音... ({session.final_duration_seconds} 秒)")
+            self._play(session, session.final_sound, maxtime=session.final_duration_seconds * 1000)
+        except session.audio.error as e:
+            msg = f"播放结束音频时出错 ({session.audio.name})：{e}"
+            log_list.append(msg)
+            status_data['current_status'] = msg
+            self._finalize(session, "error")
+            return
+        self._push(session, self._clock.monotonic() + session.final_duration_seconds)
+
+    def _finalize(self, session, result):
+        # 调用方已持有 self._condition
+        session.phase = 'finished'
+        session.result = result
+        session.generation += 1
+        self._sessions.pop(session.session_id, None)
+        if session.mixer_lease is not None:
+            self._stop_channels(session)
+            self._defer(session.mixer_lease.release) # 归还声道
+        status_data = session.status_data
+        # 在清除 pause_start_time 之前取值，暂停中结束时这次暂停也计入暂停时长
+        self._defer(
+            record_session_history, session.journal,
+            {name: status_data[name] for name in ('start_time', 'paused_duration', 'pause_start_time')},
+            session.time_records, result, 'scheduler', session.total_duration_minutes, self._clock.time()
+        )
+        session.log_list.append(f"当前系统时间 (结束): {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._clock.time()))}")
+        session.log_list.append(f"任务结束处理完成。")
+        with status_batch(status_data):
+            if result == "error" and not status_data['current_status'].startswith("错误"):
+                status_data['current_status'] = "任务发生错误"
+            status_data['thread_status'] = 'finished'
+            status_data['pause_start_time'] = None
+            status_data['current_pause_duration_display'] = 0.0
+        if session.journal is not None and session.journal.started:
+            self._defer(record_event, session.journal, 'finish', result=result)
+        SESSIONS_FINISHED.inc(runner='scheduler', result=result)
+
+    def _restore_position(self, session):
+        """
+        恢复会话时把时间线位置对齐到当前的实际运行时间 (调用方已持有 self._condition)。
+        重启跨越了进程，这里用会话日志中的 Unix 时间计算。
+        返回 False 表示会话在重启期间已经全部结束 (已 finalize)。
+        """
+        status_data = session.status_data
+        timeline = session.timeline
+        pause_start_time = status_data.get('pause_start_time')
+        reference_time = pause_start_time if pause_start_time is not None else self._clock.time()
+        actual_elapsed_time = (reference_time - status_data['start_time']) - status_data['paused_duration']
+        if actual_elapsed_time >= timeline.final_end:
+            session.log_list.append("会话在重启期间已经到达结束时间，不再播放提示音。")
+            with status_batch(status_data):
+                status_data['elapsed_time'] = session.total_duration_seconds
+                status_data['remaining_time'] = 0.0
+                status_data['current_status'] = "任务完成"
+            self._finalize(session, "completed")
+            return False
+        # 重启期间错过的常规提示音不再补响
+        session.next_index = timeline.play_count_at(actual_elapsed_time)
+        if pause_start_time is not None:
+            session.phase = 'paused'
+            session.pause_mono = monotonic_at(self._clock, pause_start_time)
+            with status_batch(status_data):
+                status_data['elapsed_time'] = actual_elapsed_time
+                status_data['remaining_time'] = max(0.0, session.total_duration_seconds - actual_elapsed_time)
+                status_data['thread_status'] = 'paused'
+                status_data['current_status'] = "已暂停..."
+        return True
+
+    # --- 音频 ---
+    def _load_sounds(self, session, volume_control):
+        log_list = session.log_list
+        status_data = session.status_data
+        if not check_sound_files(log_list, status_data, session.regular_sound_path, session.final_sound_path):
+            return False
+
+        # mixer 在进程内只初始化一次，由所有会话共享；每个会话租用一个专用声道
+        audio = session.audio = self._audio_backend if self._audio_backend is not None else get_audio_backend()
+        try:
+            session.mixer_lease = audio.acquire()
+            if session.mixer_lease.initialized_mixer:
+                log_list.append("pygame mixer 初始化成功。")
+        except audio.error as e:
+            msg = f"错误：无法初始化音频输出 ({audio.name}): {e}"
+            log_list.append(msg)
+            status_data['current_status'] = msg
+            return False
+
+        volume = resolve_volume(log_list, volume_control)
+
+        # 从进程级缓存获取解码后的共享 Sound，常用的默认提示音只解码一次
+        # 音量保存在会话自己的句柄里，播放时设置到声道上
+        try:
+            session.regular_sound = audio.load_sound(session.regular_sound_path, volume)
+            session.final_sound = audio.load_sound(session.final_sound_path, volume, streaming=True)
+            log_list.append("音频文件加载成功。")
+        except (audio.error, OSError) as e:
+            msg = f"错误：无法加载音频文件: {e}"
+            log_list.append(msg)
+            status_data['current_status'] = msg
+            return False
+        return True
+
+    def _play(self, session, sound_handle, maxtime=0):
+        session.mixer_lease.play(sound_handle, maxtime=maxtime)
+
+    def _stop_channels(self, session):
+        # 只停止本会话的专用声道，不影响其他会话
+        if session.mixer_lease is not None:
+            session.mixer_lease.stop()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """返回进程内共享的 TimerScheduler (首次调用时创建)。"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TimerScheduler()
+            register_session_gauge(_scheduler.session_counts) # 运行指标：抓取时读取各阶段会话数
+        return _scheduler
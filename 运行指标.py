@@ -0,0 +1,286 @@
+# 运行指标.py
+# 运行期指标 (Prometheus 文本格式)，在本机端口上通过 HTTP 暴露 (设置了端口时)，例如 http://127.0.0.1:9464/metrics。
+# 不依赖 prometheus_client：这里只需要计数器、仪表和直方图三种类型。
+#
+# 热路径上的更新 (每次提示音、暂停、rerun) 只是在一个几乎没有竞争的锁内做一次加法，
+# 会话数量之类的值用回调仪表在抓取时才读取，平时没有任何开销。HTTP 相关的模块只在启动服务时才导入。
+import bisect
+import contextlib
+import functools
+import math
+import os
+import threading
+import time
+
+DEFAULT_METRICS_HOST = '127.0.0.1'
+
+# 提示音延迟以毫秒到秒为主，rerun 耗时以几十毫秒到几秒为主，暂停时长以分钟为主
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PAUSE_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器。"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """
+    可增可减的仪表。
+    传入 callback 时，抓取时调用 callback() 读取当前值 (返回数值，或 {标签值元组: 数值} 的字典)。
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self.callback = callback
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self.callback is not None:
+            values = self.callback()
+            items = values.items() if isinstance(values, dict) else [((), values)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """固定桶的直方图 (桶计数在抓取时再累加成 Prometheus 需要的累计形式)。"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # 标签值 -> [各桶计数 (最后一个是 +Inf), 总和]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels):
+        series = self._series.get(self._key(labels))
+        return 0 if series is None else sum(series[0])
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """记录 with 块的耗时 (秒)，块内抛出异常 (例如 st.rerun) 时也会记录。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """装饰器形式的 time()，保留被装饰函数的名称 (Streamlit 按函数标识 fragment)。"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for upper, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(upper)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，expose() 生成 Prometheus 文本格式。"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def expose(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# runner: 'scheduler' (共享调度器), 'thread' (run_audio_timer), 'async' (run_audio_timer_async)
+PROMPTS_PLAYED = REGISTRY.register(Counter(
+    'study_timer_prompts_played_total', "已播放的常规提示音次数", ('runner',)))
+PROMPT_LATENESS = REGISTRY.register(Histogram(
+    'study_timer_prompt_lateness_seconds', "常规提示音实际响起时间相对计划时间的延迟", ('runner',)))
+PAUSE_DURATION = REGISTRY.register(Histogram(
+    'study_timer_pause_duration_seconds', "每次暂停的时长", ('runner',), buckets=PAUSE_BUCKETS))
+MIXER_INIT_FAILURES = REGISTRY.register(Counter(
+    'study_timer_mixer_init_failures_total', "pygame mixer 初始化失败次数"))
+SESSIONS_FINISHED = REGISTRY.register(Counter(
+    'study_timer_sessions_finished_total', "已结束的会话数", ('runner', 'result')))
+SESSIONS_HIBERNATED = REGISTRY.register(Counter(
+    'study_timer_sessions_hibernated_total', "长时间无人查看而休眠的会话数 (见 会话回收.py)"))
+RERUN_DURATION = REGISTRY.register(Histogram(
+    'study_timer_rerun_duration_seconds', "Streamlit 脚本 (scope=app) 和局部刷新 (scope=live_status / log) 每次运行的耗时", ('scope',)))
+
+
+def register_session_gauge(session_counts):
+    """
+    注册按阶段统计会话数的回调仪表，session_counts() 返回 {'running': n, 'paused': n, 'finishing': n}
+    (例如 TimerScheduler.session_counts)。只在抓取时调用。
+    """
+    def collect():
+        return {(phase,): count for phase, count in session_counts().items()}
+
+    return REGISTRY.register(Gauge(
+        'study_timer_sessions', "调度器中未结束的会话数 (按阶段)", ('phase',), callback=collect))
+
+
+def register_liveness_gauge(liveness_counts):
+    """
+    注册有人查看/无人查看的会话数回调仪表，liveness_counts() 返回 {'live': n, 'orphaned': n}
+    (例如 会话回收.SessionReaper.liveness_counts)。只在抓取时调用。
+    """
+    def collect():
+        return {(state,): count for state, count in liveness_counts().items()}
+
+    return REGISTRY.register(Gauge(
+        'study_timer_sessions_liveness', "调度器中未结束的会话数 (按页面是否仍在查看)", ('state',), callback=collect))
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None, host=DEFAULT_METRICS_HOST):
+    """
+    在后台线程中启动 /metrics HTTP 服务 (每个进程只启动一次)。
+    port 为 None 时读取环境变量 STUDY_TIMER_METRICS_PORT；没有设置、为 0 或端口被占用时不启动。
+
+    返回:
+        int | None: 实际监听的端口，没有启动时返回 None。
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server.server_address[1]
+        if port is None:
+            port = int(os.environ.get('STUDY_TIMER_METRICS_PORT') or 0)
+        if not port:
+            return None
+
+        import http.server
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = REGISTRY.expose().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # 抓取请求不写入标准错误
+
+        try:
+            server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError:
+            return None # 端口被占用 (例如同一台机器上的另一个 Streamlit 进程已经在导出)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+        _server = server
+        return server.server_address[1]
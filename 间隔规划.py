@@ -0,0 +1,256 @@
+# 间隔规划.py
+# 间隔配置的蒙特卡洛规划：按 run_audio_timer / compile_timeline 的规则模拟大量会话，
+# 给出常规提示音次数的分布、间隔的分位数和结束提示音开始时间的分布，侧边栏在配置变化时显示。
+#
+# 规则 (与 提示时间线.compile_timeline 相同)：每个截止时间是上一个截止时间加 uniform(min, max) 秒；
+# 等待会被截断到剩余常规时长 (min(wait, remaining))，截断后等待结束时常规阶段已经结束，不再响；
+# 播放不阻塞计时，但结束提示音要等最后一次常规提示音播完才开始。
+#
+# 模拟是向量化的：一批会话的全部等待时间一次生成为矩阵，按行 cumsum 得到截止时间，
+# "截止时间 < 总时长" 的个数就是提示音次数。结果只保留直方图 (可以直接相加)，
+# 所以可以分块计算控制内存，也可以分给多个进程后合并。
+import os
+import wave
+
+SIMULATION_CHUNK_ELEMENTS = 1 << 21 # 每块等待时间矩阵的元素数 (float64，约 16 MB)
+HISTOGRAM_BINS = 1024 # 间隔、尾部时长和结束音推迟时长的直方图分箱数 (分位数的精度为范围的 1/1024)
+DEFAULT_PLAN_SESSIONS = 100_000 # 侧边栏默认的模拟会话数
+PLAN_ELEMENT_BUDGET = 1 << 21 # 侧边栏一次模拟最多生成的等待时间个数 (约 50 毫秒)，提示音很多时相应减少会话数
+PLAN_PERCENTILES = (5, 50, 95)
+
+
+class IntervalPlan:
+    """
+    模拟结果 (只读)。
+
+    count_probabilities[k] 是恰好响 k 次常规提示音的概率；*_percentiles 是 {百分位: 值} 字典：
+    gap_percentiles 是同一会话中相邻两次常规提示音的间隔 (分钟，不含从开始到第一次提示音的等待；
+    只统计两次都响了的间隔，所以接近常规阶段结束时略偏短)，tail_percentiles 是最后一次提示音 (没有时从开始算) 到
+    常规阶段结束的时长 (分钟)，final_delay_percentiles 是结束提示音因为等最后一次提示音播完而推迟的秒数。
+    """
+
+    __slots__ = ('sessions', 'count_probabilities', 'count_mean', 'count_percentiles',
+                 'gap_percentiles', 'tail_percentiles', 'final_delay_percentiles')
+
+    def __init__(self, sessions, count_probabilities, count_mean, count_percentiles,
+                 gap_percentiles, tail_percentiles, final_delay_percentiles):
+        self.sessions = sessions
+        self.count_probabilities = count_probabilities
+        self.count_mean = count_mean
+        self.count_percentiles = count_percentiles
+        self.gap_percentiles = gap_percentiles
+        self.tail_percentiles = tail_percentiles
+        self.final_delay_percentiles = final_delay_percentiles
+
+
+def _edges(low, high):
+    import numpy as np
+
+    if high <= low:
+        high = low + 1e-9 # 所有值都相同 (例如没有结束音推迟) 时分箱范围不能为空
+    return np.linspace(low, high, HISTOGRAM_BINS + 1)
+
+
+def _columns(min_seconds, max_seconds, total_seconds):
+    # 每行先生成"期望次数 + 余量"列，少数还没有到达总时长的行再生成下一段
+    return int(total_seconds / ((min_seconds + max_seconds) / 2)) + 4
+
+
+def _simulate_part(sessions, seed, min_seconds, max_seconds, total_seconds, prompt_length_seconds):
+    """
+    模拟 sessions 个会话，返回可以相加的直方图:
+    (提示音次数的 bincount, 间隔直方图, 尾部时长直方图, 结束音推迟直方图)。
+    顶层函数，可以交给进程池执行。
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    gap_edges = _edges(min_seconds, max_seconds)
+    tail_edges = _edges(0.0, total_seconds)
+    delay_edges = _edges(0.0, prompt_length_seconds)
+    count_hist = np.zeros(1, dtype=np.int64)
+    gap_hist = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+    tail_hist = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+    delay_hist = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+
+    columns = _columns(min_seconds, max_seconds, total_seconds)
+    chunk_rows = max(1, SIMULATION_CHUNK_ELEMENTS // columns)
+    for chunk_start in range(0, sessions, chunk_rows):
+        rows = min(chunk_rows, sessions - chunk_start)
+        counts = np.zeros(rows, dtype=np.int64)
+        last_offsets = np.zeros(rows) # 最后一次提示音的时间点 (没有提示音时为 0)
+        offsets = np.zeros(rows)
+        active = np.arange(rows)
+        first_segment = True
+        while active.size:
+            waits = rng.uniform(min_seconds, max_seconds, size=(active.size, columns))
+            deadlines = np.cumsum(waits, axis=1)
+            deadlines += offsets[active, None]
+            fired = deadlines < total_seconds # 截止时间递增，响过的一定是每行的前缀
+            fired_counts = fired.sum(axis=1)
+            # 第一段每行的第一个等待从会话开始算起，不是相邻提示音的间隔；
+            # 后面各段的第一个等待从上一段最后一次 (已经响了的) 提示音算起，是间隔
+            gaps = waits[:, 1:][fired[:, 1:]] if first_segment else waits[fired]
+            gap_hist += np.histogram(gaps, bins=gap_edges)[0]
+            first_segment = False
+            counts[active] += fired_counts
+            has_prompt = fired_counts > 0
+            last_offsets[active[has_prompt]] = deadlines[has_prompt, fired_counts[has_prompt] - 1]
+            offsets[active] = deadlines[:, -1]
+            active = active[fired_counts == columns] # 整段都响了的行还没有结束
+
+        tail_hist += np.histogram(total_seconds - last_offsets, bins=tail_edges)[0]
+        delays = np.where(counts > 0, np.maximum(0.0, last_offsets + prompt_length_seconds - total_seconds), 0.0)
+        delay_hist += np.histogram(delays, bins=delay_edges)[0]
+        chunk_count_hist = np.bincount(counts)
+        if chunk_count_hist.size > count_hist.size:
+            count_hist = np.pad(count_hist, (0, chunk_count_hist.size - count_hist.size))
+        count_hist[:chunk_count_hist.size] += chunk_count_hist
+    return count_hist, gap_hist, tail_hist, delay_hist
+
+
+def _histogram_percentiles(hist, edges, scale=1.0):
+    """按直方图 (箱内线性插值) 计算 PLAN_PERCENTILES 对应的值，再乘以 scale。"""
+    import numpy as np
+
+    total = hist.sum()
+    if total == 0:
+        return {q: None for q in PLAN_PERCENTILES}
+    cumulative = np.cumsum(hist) / total
+    result = {}
+    for q in PLAN_PERCENTILES:
+        index = int(np.searchsorted(cumulative, q / 100, side='left'))
+        index = min(index, len(hist) - 1)
+        below = cumulative[index - 1] if index > 0 else 0.0
+        fraction = (q / 100 - below) / (cumulative[index] - below) if cumulative[index] > below else 0.0
+        result[q] = float(edges[index] + fraction * (edges[index + 1] - edges[index])) * scale
+    return result
+
+
+def plan_intervals(
+    min_interval_minutes,
+    max_interval_minutes,
+    total_duration_minutes,
+    prompt_length_seconds=0.0,
+    sessions=None,
+    seed=None,
+    processes=None
+):
+    """
+    模拟 sessions 个会话并汇总。
+
+    参数:
+        prompt_length_seconds (float): 常规提示音的时长 (秒)，只影响结束提示音的推迟.
+        sessions (int | None): 模拟的会话数。None 时最多 DEFAULT_PLAN_SESSIONS 个，
+            并且生成的等待时间不超过 PLAN_ELEMENT_BUDGET 个 (侧边栏在配置变化时计算，需要很快返回).
+        seed (int | None): 随机种子，参数、种子和进程数都相同时结果相同.
+        processes (int | None): 大于 1 时把会话分给这么多个进程 (模拟几百万个会话时使用).
+
+    返回:
+        IntervalPlan
+
+    异常:
+        ValueError: 间隔或总时长不是正数。
+    """
+    import numpy as np
+
+    min_seconds, max_seconds = sorted((min_interval_minutes * 60, max_interval_minutes * 60))
+    total_seconds = total_duration_minutes * 60
+    if min_seconds > 0 and total_seconds > 0 and sessions is None:
+        sessions = max(1000, min(DEFAULT_PLAN_SESSIONS, PLAN_ELEMENT_BUDGET // _columns(min_seconds, max_seconds, total_seconds)))
+    if min_seconds <= 0 or total_seconds <= 0 or sessions <= 0:
+        raise ValueError("提示音间隔、总时长和模拟次数必须是正数")
+    prompt_length_seconds = max(0.0, prompt_length_seconds)
+
+    parts = max(1, min(processes or 1, sessions))
+    seeds = np.random.SeedSequence(seed).spawn(parts)
+    sizes = [sessions // parts + (1 if index < sessions % parts else 0) for index in range(parts)]
+    arguments = [(size, part_seed, min_seconds, max_seconds, total_seconds, prompt_length_seconds)
+                 for size, part_seed in zip(sizes, seeds)]
+    if parts == 1:
+        results = [_simulate_part(*arguments[0])]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=parts) as executor:
+            results = list(executor.map(_simulate_part, *zip(*arguments)))
+
+    count_hist = np.zeros(max(result[0].size for result in results), dtype=np.int64)
+    for result in results:
+        count_hist[:result[0].size] += result[0]
+    gap_hist, tail_hist, delay_hist = (sum(result[index] for result in results) for index in (1, 2, 3))
+
+    count_probabilities = count_hist / sessions
+    cumulative = np.cumsum(count_probabilities)
+    return IntervalPlan(
+        sessions=sessions,
+        count_probabilities=count_probabilities,
+        count_mean=float(np.dot(np.arange(count_hist.size), count_probabilities)),
+        count_percentiles={q: int(np.searchsorted(cumulative, q / 100 - 1e-12)) for q in PLAN_PERCENTILES},
+        gap_percentiles=_histogram_percentiles(gap_hist, _edges(min_seconds, max_seconds), 1 / 60),
+        tail_percentiles=_histogram_percentiles(tail_hist, _edges(0.0, total_seconds), 1 / 60),
+        final_delay_percentiles=_histogram_percentiles(delay_hist, _edges(0.0, prompt_length_seconds)),
+    )
+
+
+def wav_length_seconds(path):
+    """读取 WAV 文件头得到时长 (秒)，不解码音频；不是 WAV 或无法读取时返回 0.0。"""
+    try:
+        with wave.open(path, 'rb') as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (OSError, EOFError, wave.Error, ZeroDivisionError):
+        return 0.0
+
+
+def format_plan(plan):
+    """把 IntervalPlan 格式化成几行中文说明 (侧边栏和命令行共用)。"""
+    counts = plan.count_percentiles
+    gaps = plan.gap_percentiles
+    tails = plan.tail_percentiles
+    lines = [
+        f"常规提示音约 {plan.count_mean:.1f} 次 (90% 的会话在 {counts[5]}–{counts[95]} 次之间)",
+        f"相邻间隔中位数 {gaps[50]:.1f} 分钟 (5%–95%: {gaps[5]:.1f}–{gaps[95]:.1f})" if gaps[50] is not None
+        else "没有相邻的提示音",
+        f"最后一次提示音到常规结束 {tails[5]:.1f}–{tails[95]:.1f} 分钟 (5%–95%)",
+    ]
+    delays = plan.final_delay_percentiles
+    if delays[95]:
+        lines.append(f"结束提示音推迟 (等最后一次提示音播完): 95% 不超过 {delays[95]:.1f} 秒")
+    return lines
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="模拟间隔配置下的常规提示音次数和间隔分布")
+    parser.add_argument('min_interval_minutes', type=float)
+    parser.add_argument('max_interval_minutes', type=float)
+    parser.add_argument('total_duration_minutes', type=float)
+    parser.add_argument('--prompt-sound', help="常规提示音文件 (WAV，用于计算结束提示音的推迟)")
+    parser.add_argument('--sessions', type=int, default=1_000_000, help="模拟的会话数，默认 1000000")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="进程数，默认为 CPU 核数")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        plan = plan_intervals(
+            args.min_interval_minutes, args.max_interval_minutes, args.total_duration_minutes,
+            prompt_length_seconds=wav_length_seconds(args.prompt_sound) if args.prompt_sound else 0.0,
+            sessions=args.sessions, seed=args.seed, processes=args.processes
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    for line in format_plan(plan):
+        print(line)
+    print("次数分布: " + ", ".join(f"{count} 次 {probability:.1%}"
+                                for count, probability in enumerate(plan.count_probabilities) if probability >= 0.005))
+    print(f"(模拟 {plan.sessions} 个会话，用时 {time.perf_counter() - started:.2f} 秒)")
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+
+    sys.exit(main())
@@ -0,0 +1,275 @@
+# 音频后端.py
+# run_audio_timer、异步版本和调度器使用的音频输出接口，可以替换 pygame:
+#   - PygameAudioBackend: 原来的实现 (音频服务.MixerService 的共享 mixer 和专用声道、SoundCache、流式播放)；
+#   - NullAudioBackend:   不输出声音，只记录播放事件。不导入 pygame、不初始化 SDL、不占用声卡，
+#                         适合没有声卡的服务器和同时运行成千上万个会话的压力测试；
+#   - WavFileAudioBackend: 把每次播放的声音写成一个 WAV 文件 (在没有声卡的机器上检查实际播放的内容)。
+#
+# 三者的接口相同 (计时代码不需要区分):
+#   backend.acquire() -> 租约 (play(handle, maxtime=0)、is_playing()、stop()、release()、initialized_mixer)
+#   backend.load_sound(path, volume, streaming=False) -> 句柄 (get_length()、volume、path)
+#   backend.error: 这个后端在初始化、加载和播放时抛出的异常类型 (文件不存在仍是 OSError)
+#   backend.flush(timeout=None): 等待后台写入完成 (只有 wav 后端在后台写文件)，退出进程前调用
+#
+# 默认后端由环境变量 STUDY_TIMER_AUDIO 选择: pygame (默认)、null、wav:<输出目录>。
+import collections
+import errno
+import itertools
+import os
+import threading
+import wave
+
+from 启动开销 import lazy_import # pygame 在第一次使用音频时才导入 (导入时会加载 SDL)
+from 文件监视 import get_file_metadata
+from 时钟 import get_clock
+from 流式音频 import read_wav_info
+
+pygame = lazy_import('pygame')
+
+PLAY_EVENT_HISTORY = 10000 # NullAudioBackend 保留的最近播放事件数
+
+
+class AudioBackendError(RuntimeError):
+    """WavFileAudioBackend 写文件失败 (NullAudioBackend 不会失败)。"""
+
+
+class PygameAudioBackend:
+    """pygame mixer 输出 (进程内共享的 MixerService 和 SoundCache)。"""
+
+    name = 'pygame'
+
+    @property
+    def error(self):
+        return pygame.error
+
+    def acquire(self):
+        from 音频服务 import get_mixer_service
+
+        return get_mixer_service().acquire()
+
+    def load_sound(self, path, volume, streaming=False):
+        from 音频服务 import load_sound
+
+        return load_sound(path, volume, streaming=streaming)
+
+    def flush(self, timeout=None):
+        return True
+
+
+class NullSoundHandle:
+    """不解码的句柄：时长从 PCM WAV 文件头读取，其他格式 (例如 FLAC) 的时长未知，get_length() 返回 0。"""
+
+    __slots__ = ('path', 'real_path', 'volume', 'length', 'wav_info')
+
+    def __init__(self, path, real_path, volume, wav_info):
+        self.path = path
+        self.real_path = real_path
+        self.volume = volume
+        self.wav_info = wav_info
+        self.length = wav_info.get_length() if wav_info is not None else None
+
+    def get_length(self):
+        return self.length or 0.0
+
+
+class NullLease:
+    """
+    不输出声音的"声道"：play() 只记录事件，is_playing() 按声音时长 (和 maxtime) 推算，
+    所以结束音之前等最后一次提示音播完的逻辑与真实声道相同。
+    """
+
+    __slots__ = ('backend', 'lease_id', 'initialized_mixer', 'released', 'play_count', '_playing_until')
+
+    def __init__(self, backend, lease_id):
+        self.backend = backend
+        self.lease_id = lease_id
+        self.initialized_mixer = False
+        self.released = False
+        self.play_count = 0
+        self._playing_until = 0.0
+
+    def play(self, sound_handle, maxtime=0):
+        now = self.backend.clock.time()
+        duration = sound_handle.length
+        if maxtime > 0:
+            duration = maxtime / 1000 if duration is None else min(duration, maxtime / 1000)
+        elif duration is None:
+            duration = 0.0
+        self._playing_until = self.backend.clock.monotonic() + duration
+        self.play_count += 1
+        self.backend._record(self, now, sound_handle, duration)
+
+    def is_playing(self):
+        return self.backend.clock.monotonic() < self._playing_until
+
+    def stop(self):
+        self._playing_until = 0.0
+
+    def release(self):
+        """停止并归还，可以重复调用。"""
+        if not self.released:
+            self.released = True
+            self.stop()
+            self.backend._release(self)
+
+
+class NullAudioBackend:
+    """
+    只记录播放事件的音频后端。
+
+    events 是最近 PLAY_EVENT_HISTORY 次播放的 (时间, 租约编号, 路径, 播放时长秒)；
+    play_count / active_leases() 用于压力测试统计。文件不存在时 load_sound() 仍然抛出 FileNotFoundError，
+    启动阶段的错误处理与 pygame 后端相同。
+    """
+
+    name = 'null'
+    error = AudioBackendError
+
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else get_clock()
+        self._lock = threading.Lock()
+        self._lease_ids = itertools.count(1)
+        self._active = 0
+        self.play_count = 0
+        self.events = collections.deque(maxlen=PLAY_EVENT_HISTORY)
+
+    def acquire(self):
+        with self._lock:
+            self._active += 1
+            return NullLease(self, next(self._lease_ids))
+
+    def active_leases(self):
+        with self._lock:
+            return self._active
+
+    def load_sound(self, path, volume, streaming=False):
+        metadata = get_file_metadata().stat(path)
+        if metadata is None:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        return NullSoundHandle(path, metadata.real_path, volume, read_wav_info(metadata.real_path))
+
+    def flush(self, timeout=None):
+        return True
+
+    def _record(self, lease, now, sound_handle, duration):
+        with self._lock:
+            self.play_count += 1
+            self.events.append((now, lease.lease_id, sound_handle.path, duration))
+
+    def _release(self, lease):
+        with self._lock:
+            self._active -= 1
+
+
+class WavFileAudioBackend(NullAudioBackend):
+    """
+    把每次播放写成 output_dir 下的一个 WAV 文件: <租约编号>-<序号>-<原文件名>.wav，
+    内容是原文件的 PCM 数据 (按 maxtime 截断，不应用音量)。不解码音频：未压缩 PCM WAV 以外的提示音
+    (例如 FLAC) 只记录播放事件，不写文件。
+
+    play() 可能在调度器的锁内调用，所以只把写入排进队列，由后台线程写文件；flush() 等待队列写完。
+    后台写入失败时，下一次 play() 抛出 AudioBackendError。
+    """
+
+    name = 'wav'
+
+    def __init__(self, output_dir, clock=None):
+        super().__init__(clock=clock)
+        self.output_dir = output_dir
+        self._condition = threading.Condition()
+        self._pending = collections.deque() # (输出路径, 源文件路径, WavInfo, 帧数)
+        self._queued = 0 # 累计进入队列的文件数
+        self._written = 0 # 累计已处理 (写完或失败) 的文件数
+        self._error = None # 最近一次后台写入失败的 AudioBackendError，下一次 play() 时抛出
+        self._thread = None
+
+    def flush(self, timeout=None):
+        """等待目前已进入队列的文件全部写完，返回是否在 timeout 内完成。"""
+        with self._condition:
+            target = self._queued
+            return self._condition.wait_for(lambda: self._written >= target, timeout)
+
+    def _record(self, lease, now, sound_handle, duration):
+        with self._condition:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+        super()._record(lease, now, sound_handle, duration)
+        info = sound_handle.wav_info
+        if info is None:
+            return
+        output_path = os.path.join(
+            self.output_dir, f"{lease.lease_id:04d}-{lease.play_count:03d}-{os.path.basename(sound_handle.path)}"
+        )
+        with self._condition:
+            self._pending.append((output_path, sound_handle.real_path, info, int(duration * info.frequency)))
+            self._queued += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="WavFileWriter", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                output_path, source_path, info, frames = self._pending.popleft()
+            try:
+                self._write(output_path, source_path, info, frames)
+                error = None
+            except AudioBackendError as e:
+                error = e
+            with self._condition:
+                if error is not None:
+                    self._error = error
+                self._written += 1
+                self._condition.notify_all()
+
+    def _write(self, output_path, source_path, info, frames):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(source_path, 'rb') as source, wave.open(output_path, 'wb') as output:
+                output.setnchannels(info.channels)
+                output.setsampwidth(info.sample_width)
+                output.setframerate(info.frequency)
+                source.seek(info.data_offset)
+                output.writeframes(source.read(min(info.data_size, frames * info.block_align)))
+        except (OSError, wave.Error) as e:
+            raise AudioBackendError(f"无法写入 {output_path}: {e}") from e
+
+
+def create_audio_backend(spec):
+    """
+    按名称创建音频后端: 'pygame'、'null' 或 'wav:<输出目录>'。
+
+    异常:
+        ValueError: 无法识别的名称。
+    """
+    spec = (spec or 'pygame').strip()
+    if spec == 'pygame':
+        return PygameAudioBackend()
+    if spec == 'null':
+        return NullAudioBackend()
+    if spec.startswith('wav:') and spec[4:]:
+        return WavFileAudioBackend(os.path.abspath(spec[4:]))
+    raise ValueError(f"无法识别的音频后端: {spec!r} (可用: pygame、null、wav:<输出目录>)")
+
+
+_audio_backend = None
+_audio_backend_lock = threading.Lock()
+
+
+def get_audio_backend():
+    """返回进程内共享的音频后端 (首次调用时按环境变量 STUDY_TIMER_AUDIO 创建)。"""
+    global _audio_backend
+    with _audio_backend_lock:
+        if _audio_backend is None:
+            _audio_backend = create_audio_backend(os.environ.get('STUDY_TIMER_AUDIO'))
+        return _audio_backend
+
+
+def set_audio_backend(backend):
+    """替换进程内共享的音频后端 (命令行参数、压力测试)；之后开始的会话使用新的后端。"""
+    global _audio_backend
+    with _audio_backend_lock:
+        _audio_backend = backend
@@ -0,0 +1,319 @@
+# 音频服务.py
+# 进程级共享的音频资源：
+#   - MixerService: mixer 在进程内只初始化一次并做引用计数，每个会话租用一个专用声道，
+#     暂停/停止只影响自己的声道，不再调用全局的 pygame.mixer.stop()/quit()。
+#   - SoundCache: 解码后的提示音缓存 (LRU，按内存预算淘汰)。
+#   - 大的 PCM WAV (例如很长的结束音) 可以不解码，通过 流式音频.py 从内存映射的文件分段播放。
+#   - 加载前先经过 音频预处理.py：文件转换成 mixer 原生格式并归一化响度后缓存在磁盘上。
+#   - 文件元数据来自 文件监视.py 的缓存，文件被替换时对应的解码结果随之失效。
+# 会话拿到的是指向共享 Sound 的轻量句柄，音量在播放时设置到声道上，不修改共享的 Sound。
+import collections
+import errno
+import os
+import threading
+
+from 启动开销 import lazy_import # pygame 在第一次使用音频时才导入 (导入时会加载 SDL)
+from 运行指标 import MIXER_INIT_FAILURES
+from 流式音频 import StreamingSoundHandle, get_stream_feeder, open_streaming_sound
+from 音频预处理 import get_ingest_cache
+from 文件监视 import get_file_metadata # 路径和文件元数据缓存，文件变化时由目录监视失效
+
+pygame = lazy_import('pygame')
+
+
+# 默认内存预算：默认的两个提示音只有几 MB，这个预算足够同时缓存不少用户自定义文件
+DEFAULT_SOUND_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class SoundHandle:
+    """
+    会话持有的提示音句柄。
+
+    sound 是缓存中共享的 pygame.mixer.Sound，多个会话可以同时播放同一个 Sound，
+    各自的音量通过播放时的声道音量实现，所以不要对 handle.sound 调用 set_volume()。
+    """
+
+    __slots__ = ('sound', 'volume', 'path')
+
+    def __init__(self, sound, volume, path):
+        self.sound = sound
+        self.volume = volume
+        self.path = path
+
+    def get_length(self):
+        return self.sound.get_length()
+
+
+class MixerLease:
+    """
+    会话从 MixerService 租用的专用声道。
+    同一会话的常规提示音和结束音不会同时播放，所以一个声道就够了。
+    """
+
+    __slots__ = ('service', 'channel_index', 'channel', 'initialized_mixer', 'released', 'streamed')
+
+    def __init__(self, service, channel_index, initialized_mixer):
+        self.service = service
+        self.channel_index = channel_index
+        self.channel = pygame.mixer.Channel(channel_index)
+        self.initialized_mixer = initialized_mixer # 是否由本次租用触发了 mixer 初始化
+        self.released = False
+        self.streamed = False # 是否在这个声道上流式播放过 (停止时需要同时结束流)
+
+    def play(self, sound_handle, maxtime=0):
+        """
+        在专用声道上播放 (会打断本会话正在播放的声音，不影响其他会话)。
+        sound_handle 是 StreamingSoundHandle 时交给流式播放的供给线程分段排队。
+        """
+        if isinstance(sound_handle, StreamingSoundHandle):
+            self.streamed = True
+            get_stream_feeder().play(self.channel, sound_handle, maxtime=maxtime)
+            return
+        if self.streamed:
+            get_stream_feeder().stop(self.channel)
+        self.channel.play(sound_handle.sound, maxtime=maxtime)
+        self.channel.set_volume(sound_handle.volume)
+
+    def is_playing(self):
+        """
+        本会话的声道是否还在播放。
+        播放是非阻塞的，计时代码不等待声音播完，需要知道是否播完时 (例如结束音之前) 查询这里。
+        pygame 的声道结束事件 (set_endevent) 要经过 display 的事件队列，后台线程和无界面环境中不可用。
+        """
+        return self.channel.get_busy()
+
+    def stop(self):
+        """只停止本会话的声道。"""
+        if self.streamed:
+            get_stream_feeder().stop(self.channel)
+        self.channel.stop()
+
+    def release(self):
+        """停止声道并归还给 MixerService，可以重复调用。"""
+        if not self.released:
+            self.released = True
+            self.service._release(self)
+
+
+class MixerService:
+    """
+    进程级 mixer 服务。
+
+    第一次 acquire() 时初始化 mixer，之后一直保持初始化状态，会话结束时只归还声道，
+    初始化开销每个进程只付一次。声道按需扩充，分配出去的声道通过 set_reserved()
+    保留，Sound.play() 的自动分配不会抢占它们。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refcount = 0
+        self._free_channels = [] # 已归还、可以复用的声道下标
+        self._next_channel = 0 # 尚未分配过的最小声道下标
+
+    def acquire(self):
+        """
+        租用一个专用声道，必要时先初始化 mixer。
+
+        返回:
+            MixerLease
+        异常:
+            pygame.error: mixer 初始化失败。
+        """
+        with self._lock:
+            initialized_mixer = False
+            if not pygame.mixer.get_init():
+                try:
+                    pygame.mixer.init()
+                except pygame.error:
+                    MIXER_INIT_FAILURES.inc()
+                    raise
+                initialized_mixer = True
+            if self._free_channels:
+                channel_index = self._free_channels.pop()
+            else:
+                channel_index = self._next_channel
+                self._next_channel += 1
+                num_channels = pygame.mixer.get_num_channels()
+                if self._next_channel > num_channels:
+                    pygame.mixer.set_num_channels(max(self._next_channel, num_channels * 2))
+                pygame.mixer.set_reserved(self._next_channel)
+            self._refcount += 1
+            return MixerLease(self, channel_index, initialized_mixer)
+
+    def active_leases(self):
+        """当前未归还的声道数量 (即正在使用 mixer 的会话数)。"""
+        with self._lock:
+            return self._refcount
+
+    def shutdown(self):
+        """
+        没有会话在使用时关闭 mixer (例如进程退出前)，返回是否真的关闭了。
+        关闭后缓存的 Sound 全部失效，所以同时清空 SoundCache。
+        """
+        with self._lock:
+            if self._refcount or not pygame.mixer.get_init():
+                return False
+            pygame.mixer.quit()
+            self._free_channels.clear()
+            self._next_channel = 0
+        get_sound_cache().invalidate()
+        return True
+
+    def _release(self, lease):
+        lease.stop()
+        with self._lock:
+            self._free_channels.append(lease.channel_index)
+            self._refcount -= 1
+
+
+class SoundCache:
+    """
+    解码后提示音的 LRU 缓存。
+
+    键为 (真实路径, 文件修改时间, 文件大小, mixer 格式)，文件被替换或 mixer 以不同格式
+    重新初始化时自动失效。按解码后的 PCM 字节数统计内存，超过预算时淘汰最久未使用的条目。
+    被淘汰的 Sound 只是从缓存中移除，正在使用它的会话仍然持有引用，不受影响。
+    解码不持有锁：同一个文件同时被多个会话加载时只解码一次，其他的等待它的结果；
+    不同文件的解码互不阻塞，命中缓存的会话也不用等别的文件解码完。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SOUND_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict() # key -> (sound, nbytes)
+        self._inflight = {} # key -> threading.Event，正在解码的文件
+        self._generation = 0 # invalidate() 时加 1，之前开始的解码结果不再放入缓存
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        """
+        返回 path 对应的共享 Sound，未命中时解码并放入缓存。
+        调用前 mixer 必须已经初始化；解码失败时抛出 pygame.error，文件不存在时抛出 OSError。
+        """
+        mixer_format = pygame.mixer.get_init()
+        if not mixer_format:
+            raise pygame.error("mixer not initialized")
+        # 路径和元数据来自 文件监视 的缓存 (文件变化时由目录监视失效)，命中时没有文件系统调用
+        metadata = get_file_metadata().stat(path)
+        if metadata is None:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        real_path = metadata.real_path
+        key = (real_path, metadata.mtime_ns, metadata.size, mixer_format)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                in_flight = self._inflight.get(key)
+                if in_flight is None:
+                    in_flight = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    generation = self._generation
+                    break
+            in_flight.wait() # 另一个会话正在解码同一个文件，等它完成后重新检查 (解码失败时由下一个会话重试)
+
+        try:
+            sound = pygame.mixer.Sound(real_path)
+            nbytes = _decoded_size(sound, mixer_format)
+            with self._lock:
+                if generation == self._generation:
+                    # 同一路径的旧版本 (文件已被替换) 不会再命中，直接移除
+                    for old_key in [k for k in self._entries if k[0] == real_path]:
+                        self._remove(old_key)
+                    self._entries[key] = (sound, nbytes)
+                    self._total_bytes += nbytes
+                    while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                        self._remove(next(iter(self._entries)))
+            return sound
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            in_flight.set()
+
+    def invalidate(self, path=None):
+        """移除 path 对应的缓存条目；path 为 None 时清空整个缓存。"""
+        with self._lock:
+            self._generation += 1
+            if path is None:
+                self._entries.clear()
+                self._total_bytes = 0
+                return
+            real_path = os.path.realpath(path)
+            for key in [k for k in self._entries if k[0] == real_path]:
+                self._remove(key)
+
+    def stats(self):
+        """返回缓存统计: {'entries', 'bytes', 'hits', 'misses'}。"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _remove(self, key):
+        _, nbytes = self._entries.pop(key)
+        self._total_bytes -= nbytes
+
+
+def _decoded_size(sound, mixer_format):
+    # 解码后的字节数 = 时长 x 采样率 x 声道数 x 每个采样的字节数
+    # 不用 get_raw()，因为它会复制整段 PCM
+    frequency, sample_format, channels = mixer_format
+    return int(sound.get_length() * frequency * channels * (abs(sample_format) // 8))
+
+
+_mixer_service = None
+_sound_cache = None
+_singleton_lock = threading.Lock()
+
+
+def get_mixer_service():
+    """返回进程内共享的 MixerService (首次调用时创建)。"""
+    global _mixer_service
+    with _singleton_lock:
+        if _mixer_service is None:
+            _mixer_service = MixerService()
+        return _mixer_service
+
+
+def get_sound_cache():
+    """返回进程内共享的 SoundCache (首次调用时创建)。"""
+    global _sound_cache
+    with _singleton_lock:
+        if _sound_cache is None:
+            _sound_cache = SoundCache()
+            # 文件被替换或删除时立即释放解码后的旧版本 (否则要等到 LRU 淘汰)
+            get_file_metadata().add_listener(_on_sound_file_changed)
+        return _sound_cache
+
+
+def _on_sound_file_changed(path):
+    # 缓存中解码的是预处理后的文件，源文件变化时连同它转换出的旧缓存文件一起失效
+    for changed_path in [path] + get_ingest_cache().forget(path):
+        get_sound_cache().invalidate(changed_path)
+
+
+def load_sound(path, volume, streaming=False):
+    """
+    从共享缓存获取 path 对应的 Sound，并包装成带音量的 SoundHandle。
+
+    实际加载的是 音频预处理 转换后的缓存文件 (mixer 原生格式、响度归一化)，第一次加载某个文件时转换一次，
+    转换失败时加载原文件。句柄的 path 仍是配置的原路径。
+
+    streaming 为 True 时，大的 PCM WAV (超过 流式音频.STREAMING_THRESHOLD_BYTES 且格式与 mixer 相同)
+    返回 StreamingSoundHandle，播放时从内存映射的文件分段读取，不解码整个文件；其他文件仍走缓存。
+    """
+    source_path = get_ingest_cache().resolve(path)
+    if streaming:
+        handle = open_streaming_sound(source_path, volume)
+        if handle is not None:
+            handle.path = path
+            return handle
+    return SoundHandle(get_sound_cache().get(source_path), volume, path)
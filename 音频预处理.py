@@ -0,0 +1,361 @@
+# 音频预处理.py
+# 提示音的离线预处理 (导入阶段)：把用户配置的音频文件转换成 mixer 的原生格式 (采样率、位深、声道数)，
+# 按响度归一化后写入磁盘上的内容寻址缓存。之后加载的是格式与 mixer 完全相同的 WAV，
+# SDL 在加载时不再重采样或转换格式，不同文件的音量也大致一致；大文件还能直接走 流式音频.py 的流式路径。
+#
+# 缓存文件名由 源文件内容的 SHA-256 + mixer 格式 + 归一化参数 决定，同一内容只转换一次，
+# 源文件被替换后自然得到新的文件名。进程内按 (路径, 修改时间, 大小) 记住结果，重复加载不会重新计算哈希；
+# 修改时间和大小来自 文件监视.py 的缓存，源文件变化时 音频服务 让记住的结果随之丢弃。
+# 每转换出一个新文件就清理一次缓存目录：超过 CACHE_MAX_AGE_SECONDS 没有用过的文件删除，
+# 总大小超过 CACHE_MAX_BYTES 时从最久没用过的开始删除 (本进程正在使用的文件除外)。
+#
+# 响度按 RMS (dBFS) 归一化，并限制峰值不超过 PEAK_CEILING_DBFS，不会因为放大而削波。
+# 已经是 mixer 格式的 PCM WAV 不解码，直接从 data 块分段读取 (计算哈希和响度统计共用一次读取)，
+# 再分段写出，内存占用与文件大小无关；其他格式要整体解码，超过 STREAMING_THRESHOLD_BYTES 的不转换。
+# 转换需要 numpy；缺少 numpy、格式不支持、文件太大或写盘失败时直接使用原文件，不影响播放。
+#
+# 用法 (提前转换，会话开始时就不需要再转换):
+#   python 音频预处理.py 剑鸣2秒.wav Eyecatch.wav
+import hashlib
+import os
+import sys
+import threading
+import time
+import wave
+
+from 启动开销 import lazy_import # pygame 在第一次使用音频时才导入 (导入时会加载 SDL)
+from 文件监视 import file_exists, get_file_metadata # 路径和文件元数据缓存，文件变化时由目录监视失效
+from 流式音频 import STREAMING_THRESHOLD_BYTES, read_wav_info
+
+pygame = lazy_import('pygame')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(SCRIPT_DIR, '.sound_cache')
+
+TARGET_RMS_DBFS = -20.0 # 归一化后的平均响度
+PEAK_CEILING_DBFS = -1.0 # 放大时峰值不超过这个值
+_CACHE_VERSION = 1 # 转换算法变化时加 1，旧的缓存文件不再命中
+_CHUNK_SAMPLES = 1 << 20 # 分段处理，长音频转换时不会一次性复制出整段浮点数组
+CACHE_MAX_BYTES = 256 * 1024 * 1024 # 缓存目录的总大小上限
+CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600 # 这么久没有用过的缓存文件删除 (文件的修改时间在每次命中时更新)
+_TEMP_MAX_AGE_SECONDS = 3600 # 异常退出留下的临时文件
+
+# pygame mixer 格式 -> (numpy 类型, WAV 每个采样的字节数)。8 位是无符号的；float32 不能写成 PCM WAV，不处理
+_SAMPLE_TYPES = {8: ('uint8', 1), -16: ('<i2', 2), -32: ('<i4', 4)}
+
+
+def content_digest(path):
+    """源文件内容的 SHA-256 (十六进制)。"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(digest, mixer_format, target_dbfs=TARGET_RMS_DBFS, peak_ceiling_dbfs=PEAK_CEILING_DBFS):
+    """缓存文件名 (不含扩展名)：内容哈希和转换参数共同决定。"""
+    frequency, sample_format, channels = mixer_format
+    params = f"v{_CACHE_VERSION}-{frequency}-{sample_format}-{channels}-{target_dbfs:g}-{peak_ceiling_dbfs:g}"
+    return f"{digest[:32]}-{hashlib.sha256(params.encode('ascii')).hexdigest()[:12]}"
+
+
+def _sample_scale(dtype_name, sample_format):
+    """(零点, 满幅)：8 位无符号的零点是 128，有符号格式的零点是 0。"""
+    import numpy as np
+
+    info = np.iinfo(dtype_name)
+    center = (info.max + 1) / 2 if sample_format == 8 else 0.0
+    return center, info.max + 1 - center
+
+
+class _LevelMeter:
+    """分段累计 RMS 和峰值，计算归一化增益 (线性倍数)。"""
+
+    __slots__ = ('center', 'full_scale', 'sum_squares', 'peak', 'count')
+
+    def __init__(self, sample_format):
+        self.center, self.full_scale = _sample_scale(_SAMPLE_TYPES[sample_format][0], sample_format)
+        self.sum_squares = 0.0
+        self.peak = 0.0
+        self.count = 0
+
+    def add(self, chunk):
+        """chunk 是 mixer 格式的一维 numpy 数组 (不超过 _CHUNK_SAMPLES 个采样)。"""
+        import numpy as np
+
+        centered = chunk.astype(np.float64) - self.center
+        self.sum_squares += float(np.dot(centered, centered))
+        self.peak = max(self.peak, float(np.abs(centered).max(initial=0.0)))
+        self.count += len(chunk)
+
+    def gain(self, target_dbfs, peak_ceiling_dbfs):
+        if self.peak == 0.0:
+            return 1.0 # 静音文件不处理
+        rms = (self.sum_squares / self.count) ** 0.5 / self.full_scale
+        gain = 10 ** (target_dbfs / 20) / rms
+        return min(gain, 10 ** (peak_ceiling_dbfs / 20) / (self.peak / self.full_scale))
+
+
+def _array_chunks(samples):
+    for start in range(0, len(samples), _CHUNK_SAMPLES):
+        yield samples[start:start + _CHUNK_SAMPLES]
+
+
+def _wav_chunks(info, sample_format, digest=None):
+    """
+    分段读取 PCM WAV 的 data 块 (格式必须与 mixer 相同)，每段最多 _CHUNK_SAMPLES 个采样。
+    digest 不为 None 时，文件的全部字节 (包括 data 块前后的部分) 按顺序送进 digest。
+    """
+    import numpy as np
+
+    dtype_name, sample_width = _SAMPLE_TYPES[sample_format]
+    with open(info.path, 'rb') as f:
+        head = f.read(info.data_offset)
+        if digest is not None:
+            digest.update(head)
+        remaining = info.data_size
+        while remaining > 0:
+            block = f.read(min(remaining, _CHUNK_SAMPLES * sample_width))
+            if not block:
+                break
+            remaining -= len(block)
+            if digest is not None:
+                digest.update(block)
+            yield np.frombuffer(block, dtype=dtype_name, count=len(block) // sample_width)
+        if digest is not None:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+
+
+def _write_normalized(chunks, sample_format, mixer_format, gain, target_path):
+    import numpy as np
+
+    frequency, _, channels = mixer_format
+    dtype_name, sample_width = _SAMPLE_TYPES[sample_format]
+    info = np.iinfo(dtype_name)
+    center, _ = _sample_scale(dtype_name, sample_format)
+    temp_path = f"{target_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with wave.open(temp_path, 'wb') as out:
+            out.setnchannels(channels)
+            out.setsampwidth(sample_width)
+            out.setframerate(frequency)
+            for chunk in chunks:
+                scaled = np.clip(np.rint((chunk.astype(np.float64) - center) * gain + center), info.min, info.max)
+                out.writeframesraw(scaled.astype(dtype_name).tobytes())
+        os.replace(temp_path, target_path) # 原子替换，其他进程不会读到写了一半的文件
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def ingest_sound(path, cache_dir=DEFAULT_CACHE_DIR, target_dbfs=TARGET_RMS_DBFS, peak_ceiling_dbfs=PEAK_CEILING_DBFS):
+    """
+    把 path 转换成 mixer 原生格式并归一化响度，返回缓存中的 WAV 路径 (已经转换过时直接返回)。
+    调用前 mixer 必须已经初始化 (转换的目标格式就是 pygame.mixer.get_init())。
+
+    已经是 mixer 格式的 PCM WAV 分段读写，不解码；其他文件用 SDL 整体解码，所以大于
+    STREAMING_THRESHOLD_BYTES 的不转换。
+
+    异常:
+        ImportError: 没有安装 numpy。
+        ValueError: mixer 的采样格式不能写成 PCM WAV (例如 float32)，或文件需要整体解码但太大。
+        pygame.error: 源文件无法解码。
+        OSError: 读写文件失败。
+    """
+    mixer_format = pygame.mixer.get_init()
+    if not mixer_format:
+        raise pygame.error("mixer not initialized")
+    sample_format = mixer_format[1]
+    if sample_format not in _SAMPLE_TYPES:
+        raise ValueError(f"不支持的 mixer 采样格式: {sample_format}")
+
+    wav_info = read_wav_info(path)
+    native = wav_info is not None and wav_info.mixer_format == mixer_format
+    meter = None
+    if native:
+        # 计算哈希的同时累计响度统计，未命中缓存时不用再读一遍
+        digest = hashlib.sha256()
+        meter = _LevelMeter(sample_format)
+        for chunk in _wav_chunks(wav_info, sample_format, digest):
+            meter.add(chunk)
+        digest = digest.hexdigest()
+    else:
+        if os.path.getsize(path) > STREAMING_THRESHOLD_BYTES:
+            raise ValueError(f"文件太大，不在导入阶段整体解码: {path}")
+        digest = content_digest(path)
+    target_path = os.path.join(cache_dir, cache_key(digest, mixer_format, target_dbfs, peak_ceiling_dbfs) + '.wav')
+    if os.path.exists(target_path):
+        try:
+            os.utime(target_path) # 记录最近一次使用，清理时保留常用的文件
+        except OSError:
+            pass
+        return target_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if native:
+        gain = meter.gain(target_dbfs, peak_ceiling_dbfs)
+        _write_normalized(_wav_chunks(wav_info, sample_format), sample_format, mixer_format, gain, target_path)
+        return target_path
+
+    import numpy as np
+
+    # 用 SDL 解码一次：Sound 的 PCM 已经是 mixer 的格式，get_raw() 得到的字节可以直接写成 WAV
+    samples = np.frombuffer(pygame.mixer.Sound(path).get_raw(), dtype=_SAMPLE_TYPES[sample_format][0])
+    meter = _LevelMeter(sample_format)
+    for chunk in _array_chunks(samples):
+        meter.add(chunk)
+    gain = meter.gain(target_dbfs, peak_ceiling_dbfs)
+    _write_normalized(_array_chunks(samples), sample_format, mixer_format, gain, target_path)
+    return target_path
+
+
+def prune_cache(cache_dir=DEFAULT_CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age_seconds=CACHE_MAX_AGE_SECONDS, keep=()):
+    """
+    清理缓存目录：删除超过 max_age_seconds 没有用过的转换结果，总大小仍超过 max_bytes 时
+    按最近使用时间从旧到新删除。keep 中的路径 (正在使用的文件) 不删除。
+
+    返回:
+        int: 删除的文件数。
+    """
+    keep = {os.path.realpath(path) for path in keep}
+    now = time.time()
+    entries = []
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith('.tmp'):
+                    if now - stat.st_mtime > _TEMP_MAX_AGE_SECONDS:
+                        entries.append((0.0, stat.st_size, entry.path))
+                elif entry.name.endswith('.wav') and os.path.realpath(entry.path) not in keep:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except FileNotFoundError:
+        return 0
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        if now - mtime <= max_age_seconds and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue # 其他进程刚删除，或者文件正在被使用 (Windows)
+        total -= size
+        removed += 1
+    return removed
+
+
+class SoundIngestCache:
+    """
+    进程内的预处理结果表：(真实路径, 修改时间, 大小, mixer 格式) -> 缓存文件路径。
+    同一文件在进程内只计算一次哈希；转换失败的文件记住"使用原文件"，不会每次加载都重试。
+    转换 (哈希、解码、归一化、写盘) 不持有锁：同一个文件同时被多个会话加载时，
+    只有第一个转换，其他的等待它的结果；不同文件的转换互不阻塞。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._resolved = {}
+        self._inflight = {} # key -> threading.Event，正在转换的文件
+        self.failures = 0
+
+    def resolve(self, path):
+        """返回应该加载的文件：转换后的缓存文件，失败时是原文件。"""
+        try:
+            metadata = get_file_metadata().stat(path)
+        except OSError:
+            metadata = None
+        if metadata is None:
+            return path # 交给加载方报告文件不存在
+        real_path = metadata.real_path
+        key = (real_path, metadata.mtime_ns, metadata.size, pygame.mixer.get_init())
+        while True:
+            with self._lock:
+                resolved = self._resolved.get(key)
+                if resolved is not None and (resolved == real_path or file_exists(resolved)):
+                    return resolved
+                in_flight = self._inflight.get(key)
+                if in_flight is None:
+                    in_flight = self._inflight[key] = threading.Event()
+                    break
+            in_flight.wait() # 另一个会话正在转换同一个文件，等它完成后重新检查
+
+        failed = False
+        resolved = real_path
+        try:
+            resolved = ingest_sound(real_path, self.cache_dir)
+        except (ImportError, ValueError, pygame.error, OSError):
+            failed = True
+        finally:
+            with self._lock:
+                self.failures += failed
+                self._resolved[key] = resolved
+                del self._inflight[key]
+                in_use = list(self._resolved.values())
+            in_flight.set()
+        if not failed:
+            prune_cache(self.cache_dir, keep=in_use)
+        return resolved
+
+    def forget(self, path=None):
+        """
+        忘记 path (None 时为全部) 的预处理结果，下次加载时重新检查。
+
+        返回:
+            list: 被忘记的结果中的缓存文件路径 (调用方可以据此释放已经解码的旧版本)。
+        """
+        real_path = None if path is None else os.path.realpath(path)
+        with self._lock:
+            keys = [k for k in self._resolved if real_path is None or k[0] == real_path]
+            forgotten = [(key[0], self._resolved.pop(key)) for key in keys]
+        # 转换失败时记住的是原文件本身，不是缓存文件
+        return [resolved for source, resolved in forgotten if resolved != source]
+
+
+_ingest_cache = None
+_ingest_cache_lock = threading.Lock()
+
+
+def get_ingest_cache():
+    """返回进程内共享的 SoundIngestCache (首次调用时创建)。"""
+    global _ingest_cache
+    with _ingest_cache_lock:
+        if _ingest_cache is None:
+            _ingest_cache = SoundIngestCache()
+        return _ingest_cache
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="把提示音转换成 mixer 原生格式并归一化响度，写入缓存")
+    parser.add_argument('paths', nargs='+', help="音频文件")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help=f"缓存目录，默认 {DEFAULT_CACHE_DIR}")
+    args = parser.parse_args(argv)
+
+    pygame.mixer.init() # 与会话相同的默认格式
+    failed = False
+    converted = []
+    try:
+        for path in args.paths:
+            try:
+                converted.append(ingest_sound(path, args.cache_dir))
+                print(f"{path} -> {converted[-1]}")
+            except (ImportError, ValueError, pygame.error, OSError) as e:
+                print(f"{path}: 转换失败: {e}")
+                failed = True
+    finally:
+        pygame.mixer.quit()
+    prune_cache(args.cache_dir, keep=converted)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())